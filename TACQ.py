@@ -1,8 +1,132 @@
 import re
+import sys
 from datetime import datetime
-import rdflib
-from rdflib import Graph, Namespace, URIRef, BNode, Literal
-import rdflib.namespace
+
+CONVERSES = {'>' : '<', '>=' : '<='}    # comparisons replaced by their converse in canonical forms
+SYMMETRIC = ['=', '==', '!=']           # comparisons whose operands can be swapped (with a constant, in canonical forms)
+
+
+
+def intern(term):
+    """
+    Interns a term if it is a string, so that equal terms share the same object.
+
+    inputs: - term -> a string or another constant
+    output: - the interned term
+    """
+    if type(term) == str:
+        return sys.intern(term)
+    return term
+
+
+
+class Record(object):
+    """
+    Base class for compact records with fixed fields (__slots__).
+    Fields can also be read and written as in a dictionary (e.g. t['subject']), as the former dictionaries.
+    """
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if not key in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+
+
+    def __setitem__(self, key, value):
+        if not key in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, intern(value))
+
+
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+
+
+    def __eq__(self, other):
+        if isinstance(other, dict):
+            return dict(self.items()) == other
+        return type(self) == type(other) and self.values() == other.values()
+
+
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+
+    def __getstate__(self):
+        return self.values()
+
+
+
+    def __setstate__(self, state):
+        for (key, value) in zip(self.__slots__, state):
+            setattr(self, key, value)
+
+
+
+    def keys(self):
+        return list(self.__slots__)
+
+
+
+    def values(self):
+        return tuple(getattr(self, key) for key in self.__slots__)
+
+
+
+    def items(self):
+        return list(zip(self.__slots__, self.values()))
+
+
+
+    def get(self, key, default=None):
+        if not key in self.__slots__:
+            return default
+        return getattr(self, key)
+
+
+
+    def copy(self):
+        # terms are already interned
+        new = object.__new__(type(self))
+        for key in self.__slots__:
+            setattr(new, key, getattr(self, key))
+        return new
+
+
+
+class Triple(Record):
+    """
+    Class for triple patterns {subject, predicate, object, timestamp} of graph patterns.
+    The timestamp is 'any' when the triple is not timestamped.
+    """
+    __slots__ = ('subject', 'predicate', 'object', 'timestamp')
+
+    def __init__(self, subject=None, predicate=None, object=None, timestamp='any'):
+        self.subject = intern(subject)
+        self.predicate = intern(predicate)
+        self.object = intern(object)
+        self.timestamp = intern(timestamp)
+
+
+
+class Condition(Record):
+    """
+    Class for filter conditions {opl, comp, opr}.
+    """
+    __slots__ = ('opl', 'comp', 'opr')
+
+    def __init__(self, opl=None, comp=None, opr=None):
+        self.opl = intern(opl)
+        self.comp = intern(comp)
+        self.opr = intern(opr)
+
+
 
 class TACQ(object):
     """
@@ -12,19 +136,21 @@ class TACQ(object):
     # Attributes of a TACQ
     select = []     # list of output variables names
     aggregate = {}  # couple {function, variable}
-    gp = []         # list of triplets {subject, predicate, object}
-    filter = []     # list of initial filter conditions {opl, comp, opr}
+    gp = []         # list of Triples {subject, predicate, object, timestamp}
+    filter = []     # list of initial filter Conditions {opl, comp, opr}
     joins = []      # list of pairs of joining attributes (lists of couples of variables). Used for privacy query rewritting
     group_by = []   # list of grouping attributes
     size = 'inf'    # size of time windows (a string)
     step = 0        # step of time windows (a string)
 
     variables = {}  # dictionary of renamed variables {new : old}
+    newNames = {}   # reverse dictionary of renamed variables {old : first new}
     varTypes = {}   # dictionary of variable Types {var : type}
     prefix = "Q"    # prefix for variable names
     numVar = 1      # new variable number
 
     constatnts = {} # constants for freezing the graph pattern
+    constVars = {}  # reverse dictionary of constants {const : var}
     numConst = 1    # new constant number
 
     
@@ -40,11 +166,13 @@ class TACQ(object):
         self.step = 0       
 
         self.variables = {}  
+        self.newNames = {}
         self.varTypes = {}
         self.prefix = "Q"    
         self.numVar = 1
 
         self.constants = {}
+        self.constVars = {}
         self.numConst = 1
 
 
@@ -67,11 +195,13 @@ class TACQ(object):
         q.step = self.step
 
         q.variables = self.variables.copy()
+        q.newNames = self.newNames.copy()
         q.varTypes = self.varTypes.copy()
         q.prefix = self.prefix
         q.numVar = self.numVar
 
         q.constants = self.constants.copy()
+        q.constVars = self.constVars.copy()
         q.numConst = self.numConst
 
         return q
@@ -88,160 +218,39 @@ class TACQ(object):
         if not isinstance(query, str):
             raise TypeError('The parameter of parse() must be a string !')
         
-        select = []
-        aggregate = {}
-        gp = []
-        filter = []
-        joins = []
-        group_by = []
-        size = 'inf'
-        step = 0
+        # tokenize and parse the query in one pass
+        (select, aggregate, gp, filter, group_by, size, step) = Parser(query).query()
 
         #
-        # separate sub-parts of the query:
+        # check query consistency
         #
-        
-        timewindowPart = groupPart = filterPart = wherePart = selectPart = ""
 
-        
-        #  TIMEWINDOW
-        pos = query.find('TIMEWINDOW')
-        if pos >= 0:
-            timewindowPart = query[pos:]
-            query = query[:pos]
-            
-        #  GROUP
-        pos = query.find('GROUP')
-        if pos >= 0:
-            groupPart = query[pos:]
-            query = query[:pos]
-            
-        #  FILTER
-        pos = query.find('FILTER')
-        if pos >= 0:
-            filterPart = query[pos:]
-            query = query[:pos]
-            
-        #  WHERE
-        pos = query.find('WHERE')
-        if pos >= 0:
-            wherePart = query[pos:]
-            query = query[:pos]
-        else:
-            raise TACQError('WHERE clause is mandatory !')
-        
-        #  SELECT
-        pos = query.find('SELECT')
-        if pos >= 0:
-            selectPart = query[pos:]
-        else:
-            raise TACQError('The SELECT clause is madatory !')
-        
-        #
-        # parse each part of the query
-        #
+        # variables of the graph pattern
+        terms = {'?timeWindowEnd'}
+        for p in gp:
+            terms.update((p.subject, p.object, p.timestamp))
 
         #  SELECT
-        select = selectPart[6:].split()
-        # check for aggregate funtion
-        for s in select.copy():
-            # if not a variable => supposed to be aggregate
-            if s[0] != '?':
-                # check query consistency
-                if self.aggregate:
-                    raise TACQError(f"Only one aggregate function is allowed [{s}] !")
-                # transfer expression from select to aggregate
-                select.remove(s)
-                tmp = msplit('()\n ', s)
-                aggregate['function'] = tmp[0]
-                aggregate['variable'] = tmp[1]
-                if tmp[1][0] != '?':
-                    raise TACQError(f"Aggregates must be computed over a variable [{tmp[0]}({tmp[1]})] !")
-
-        #  WHERE => GP
-        tmp  = msplit('{}.', wherePart[5:])
-        for i in tmp:
-            t = msplit('(), \n', i)
-            if len(t) == 3:
-                tripple = {'subject' : t[0], 'predicate' : t[1], 'object' : t[2], 'timestamp' : 'any'}
-            elif len(t) == 4:
-                tripple = {'subject' : t[0], 'predicate' : t[1], 'object' : t[2], 'timestamp' : t[3]}
-            gp.append(tripple)
-        # check query consistency
         for s in select:
-            OK = False
-            for p in gp:
-                if  s in [p['subject'], p['object'], p['timestamp']] or s == '?timeWindowEnd':
-                    OK = True
-            if not OK:
+            if not s in terms:
                 raise TACQError(f"Output variable {s} must appear in the graph pattern !")
         if aggregate:
-            OK = False
             var = aggregate['variable']
-            for p in gp:
-                if var in [p['subject'], p['object'], p['timestamp']]:
-                    OK = True
-            if not OK:
+            if var == '?timeWindowEnd' or not var in terms:
                 raise TACQError(f"Aggregate variable {var} must appear in the graph pattern !")
 
-        #  FILTER
-        if filterPart:
-            b = filterPart.find('(')
-            e = filterPart.find(')')
-            filters = msplit('&}', filterPart[b+1:e])
-            for f in filters:
-                tmp = f.split()
-                # type left operand (date -> int -> float -> string)
-                try:
-                    opl = datetime.fromisoformat(tmp[0])
-                except ValueError:
-                    try:
-                        opl = int(tmp[0])
-                    except ValueError:
-                        try:
-                            opl = float(tmp[0])
-                        except ValueError:
-                            opl = str(tmp[0])
-                # type left operand (date -> int -> fload -> string)
-                try:
-                    opr = datetime.fromisoformat(tmp[2])
-                except ValueError:
-                    try:
-                        opr = int(tmp[2])
-                    except ValueError:
-                        try:
-                            opr = float(tmp[2])
-                        except ValueError:
-                            opr = str(tmp[2])
-                filter.append({'opl' : opl, 'comp' : tmp[1], 'opr' : opr})
-
         #  GROUP BY
-        if groupPart:
-            group_by = groupPart[8:].split()
-            # check query consistency
+        if group_by:
             for s in select:
                 if not s in group_by:
                     raise TACQError(f"Output variable {s} have to be in the GROUP BY expression !")
             for g in group_by:
-                OK = False
-                for p in gp:
-                    if g in [p['subject'], p['object'], p['timestamp']] or g == '?timeWindowEnd':
-                        OK = True
-                if not OK:
+                if not g in terms:
                     raise TACQError(f"Group variable {g} must appear in the graph pettern !")
 
             if aggregate and aggregate['variable'] in group_by:
                 raise TACQError(f"Aggregate variable {var} must not appear in the group definition !")
 
-
-        #  TIME WINDOW
-        if timewindowPart:
-            b = timewindowPart.find('(')
-            e = timewindowPart.find(')')
-            tw = msplit(' ,\n', timewindowPart[b+1:e])
-            size = tw[0]
-            step = tw[1]
-
         # set values
         self.select = select
         self.aggregate = aggregate
@@ -251,10 +260,12 @@ class TACQ(object):
         self.size = size
         self.step = step
         self.variables = {}
+        self.newNames = {}
         self.varTypes = {}
         self.prefix = "Q"
         self.numVar = 1
         self.constants = {}
+        self.constVars = {}
         self.numConst = 1
 
 
@@ -278,9 +289,10 @@ class TACQ(object):
         else:
             new = '?v_' + self.prefix + '_' 
         # create the new variable
-        new = new + str(self.numVar)
+        new = sys.intern(new + str(self.numVar))
         self.numVar = self.numVar + 1
         self.variables[new] = old
+        self.newNames.setdefault(old, new)
         self.varTypes[new] = 'unknown'
         return new
 
@@ -301,11 +313,11 @@ class TACQ(object):
         for t in self.gp:
             v = '?r_' + self.prefix + '_' + str(numR)
             numR = numR + 1
-            gp.append({'subject' : v, 'predicate' : ':subject', 'object' : t['subject'], 'timestamp' : 'any'})
-            gp.append({'subject' : v, 'predicate' : ':predicate', 'object' : t['predicate'], 'timestamp' : 'any'})
-            gp.append({'subject' : v, 'predicate' : ':object', 'object' : t['object'], 'timestamp' : 'any'})
-            if t['timestamp'] != 'any':
-                gp.append({'subject' : v, 'predicate' : ':timestamp', 'object' : t['timestamp'], 'timestamp' : 'any'})
+            gp.append(Triple(v, ':subject', t.subject))
+            gp.append(Triple(v, ':predicate', t.predicate))
+            gp.append(Triple(v, ':object', t.object))
+            if t.timestamp != 'any':
+                gp.append(Triple(v, ':timestamp', t.timestamp))
 
         self.gp = gp
 
@@ -323,6 +335,7 @@ class TACQ(object):
         
         self.prefix = prefix
         self.variables = {}
+        self.newNames = {}
         self.varTypes  = {}
 
         sel = []
@@ -345,93 +358,82 @@ class TACQ(object):
         
         # WHERE
         for t in self.gp:
-            tripple = {}
+            tripple = Triple()
             # subject is a variable
-            if t['subject'][0] == '?' and t['subject'][1] != 'r':
+            if t.subject[0] == '?' and t.subject[1] != 'r':
                 # unknown ?
-                new = [n for (n, o) in self.variables.items() if o == t['subject']]
+                new = self.newNames.get(t.subject)
                 if not new:
-                    new = self.addVar(old=t['subject'])
-                else:
-                    new = new[0]
-                tripple['subject'] = new
+                    new = self.addVar(old=t.subject)
+                tripple.subject = new
             # subject not a variable => add FILTER
             else:
                 new = self.addVar(output=True, old='Literal')
-                self.filter.append({'opl' : new, 'comp' : ' = ', 'opr' : t['subject']})
-                tripple['subject'] = new
+                self.filter.append(Condition(new, ' = ', t.subject))
+                tripple.subject = new
                 
             # predicate
-            tripple['predicate'] = t['predicate']
+            tripple.predicate = t.predicate
             
             # object is a variable
-            if t['object'][0] == '?':
+            if t.object[0] == '?':
                 # unknown ?
-                new = [n for (n, o) in self.variables.items() if o == t['object']]
+                new = self.newNames.get(t.object)
                 if not new:
-                    new = self.addVar(old=t['object'])
-                else:
-                    new = new[0]
-                tripple['object'] = new
+                    new = self.addVar(old=t.object)
+                tripple.object = new
             # object not a variable => add FILTER
             else:
                 new = self.addVar(output=True, old='Literal')
-                filters.append({'opl' : new, 'comp' : ' = ', 'opr' : t['object']})
-                tripple['object'] = new
+                filters.append(Condition(new, ' = ', t.object))
+                tripple.object = new
 
             # timestamp is a variable
-            if t['timestamp'][0] == '?':
+            if t.timestamp[0] == '?':
                 # unknown ?
-                new = [n for (n, o) in self.variables.items() if o == t['timestamp']]
+                new = self.newNames.get(t.timestamp)
                 if not new:
-                    new = self.addVar(output=True, old=t['timestamp'])
-                else:
-                    new = new[0]
-                tripple['timestamp'] = new
+                    new = self.addVar(output=True, old=t.timestamp)
+                tripple.timestamp = new
             # timestamp is not a variable => add FILTER if not 'any'
-            elif str(t['timestamp']) != 'any':
+            elif str(t.timestamp) != 'any':
                 new = self.addVar(output=True, old='Literal')
-                filters.append({'opl' : new, 'comp' : ' = ', 'opr' : t['timestamp']})
-                tripple['timestamp'] = new
+                filters.append(Condition(new, ' = ', t.timestamp))
+                tripple.timestamp = new
             else:
-                tripple['timestamp'] = 'any'
+                tripple.timestamp = 'any'
 
             gp.append(tripple)
 
         # FILTER
         for f in self.filter:
-            filt = {}
+            filt = Condition()
             # opl is a variable
-            if isinstance(f['opl'], str) and f['opl'][0] == '?':
-                new = [n for (n, o) in self.variables.items() if o == f['opl']]
-                filt['opl'] = new[0]
+            if isinstance(f.opl, str) and f.opl[0] == '?':
+                filt.opl = self.newNames[f.opl]
             #or not
             else:
-                filt['opl'] = f['opl']
+                filt.opl = f.opl
 
             # comp
-            filt['comp'] = f['comp']
+            filt.comp = f.comp
                 
             #opr is a variable
-            if isinstance(f['opr'], str) and f['opr'][0] == '?':
-                new = [n for (n, o) in self.variables.items() if o == f['opr']]
-                filt['opr'] = new[0]
+            if isinstance(f.opr, str) and f.opr[0] == '?':
+                filt.opr = self.newNames[f.opr]
             #or not
             else:
-                filt['opr'] = f['opr']
+                filt.opr = f.opr
             filters.append(filt)
 
         # JOINS
         for join in range(len(self.joins)):
             (i, j) = self.joins[join]
-            ni = [n for (n,o) in self.variables.items() if o == i]
-            nj = [n for (n,o) in self.variables.items() if o == j]
-            joins.append((ni[0], nj[0]))
+            joins.append((self.newNames[i], self.newNames[j]))
             
         # GROUP
         for g in self.group_by:
-            new = [n for (n, o) in self.variables.items() if o == g]
-            group.append(new[0])
+            group.append(self.newNames[g])
 
         # updates query
         self.select = sel
@@ -450,41 +452,101 @@ class TACQ(object):
         inputs: - None
         output: - None
         """
-        Vars = []
+        # triples may be shared with copies of the query
+        self.gp = [p.copy() for p in self.gp]
+
+        Vars = set()
         for p in self.gp:
             # subject is a variable
-            if p['subject'][0] == '?' and p['subject'][1] != 'r':
+            if p.subject[0] == '?' and p.subject[1] != 'r':
                 # unknown variable
-                if not p['subject'] in Vars:
-                    Vars.append(p['subject'])
+                if not p.subject in Vars:
+                    Vars.add(p.subject)
                 # known variable
                 else:
                     # create a new variable 
-                    new = self.addVar(old=self.variables[p['subject']])
+                    new = self.addVar(old=self.variables[p.subject])
                     # add a join condition
-                    self.joins.append((p['subject'], new))
+                    self.joins.append((p.subject, new))
                     # replace the variable
-                    p['subject'] = new
+                    p.subject = new
                     
             # object is a variable
-            if p['object'][0] == '?':
+            if p.object[0] == '?':
                 # unknown variable
-                if not p['object'] in Vars:
-                    Vars.append(p['object'])
+                if not p.object in Vars:
+                    Vars.add(p.object)
                 # known variable
                 else:
                     # create a new variable 
-                    new = self.addVar(old=self.variables[p['object']])
+                    new = self.addVar(old=self.variables[p.object])
                     # add a join condition
-                    self.joins.append((p['object'], new))
+                    self.joins.append((p.object, new))
                     # replace the variable
-                    p['object'] = new
+                    p.object = new
+
+
+
+    def minimize(self, fixed=None):
+        """
+        Replaces the graph pattern by its core: triples are removed as long as the graph pattern has a homomorphism
+        into itself without one of them, fixing constants, timestamps ('any' included) and distinguished variables.
+        The query keeps its answers. This method must be called before variable renaming.
+
+        inputs: - fixed -> variables mapped to themselves, default are the output, aggregate, group, timestamp, filter
+                           and join variables
+        output: - list of the eliminated triples
+        """
+        from homomorphism import TripleIndex, findHomomorphisms
+
+        if fixed is None:
+            fixed = set(self.select) | set(self.group_by) | set(v for j in self.joins for v in j)
+            if self.aggregate:
+                fixed.add(self.aggregate['variable'])
+            for t in self.gp:
+                fixed.add(t.timestamp)
+            for f in self.filter:
+                fixed.update(v for v in (f.opl, f.opr) if isinstance(v, str))
+        fixed = set(fixed)
+
+        # terms of the target triples are constants (marked by '#'), as fixed terms of the pattern
+        def const(t):
+            return tuple('#' + str(x) for x in t.values())
+
+        def term(x):
+            return x if x[0] == '?' and not x in fixed else '#' + str(x)
+
+        eliminated = []
+        removed = True
+        while removed and len(self.gp) > 1:
+            removed = False
+            pattern = [tuple(term(x) for x in t.values()) for t in self.gp]
+            variables = sorted(set(x for p in pattern for x in p if x[0] == '?'))
+            for n in range(len(self.gp)):
+                index = TripleIndex([const(t) for t in self.gp[:n] + self.gp[n+1:]])
+                found = findHomomorphisms(pattern, index, variables, limit=1)
+                if found:
+                    # the image of the graph pattern, without the triples outside of it
+                    binding = dict(zip(variables, found[0]))
+                    image = set(tuple(binding.get(x, x) for x in p) for p in pattern)
+                    kept = []
+                    for t in self.gp:
+                        if const(t) in image:
+                            image.discard(const(t))
+                            kept.append(t)
+                        else:
+                            eliminated.append(t)
+                    self.gp = kept
+                    removed = True
+                    break
+
+        return eliminated
 
 
 
     def typeVars(self):
         """
-        Try to determine the type of the variables, starting from filters and joins.
+        Try to determine the type of the variables, starting from filters and joins (see inferTypes()).
         This method must be called only after variable renaming, because constants are extracted from GP while renaming.
 
         inputs: - None
@@ -497,46 +559,14 @@ class TACQ(object):
 
         # Next with timestamps
         for t in self.gp:
-            if t['timestamp'][0] == '?':
-                self.varTypes[t['timestamp']] = datetime
-
-
-        # Next with filter terms comprising constants
-        for c in self.filter:
-            opl = c['opl']
-            opr = c['opr']
-           # left operand is a variable
-            if type(opl) == str and opl[0] == '?':
-                # right operand is not a string => opl has same type as opl
-                if type(opr) != str:
-                    self.varTypes[opl] = type(opr)
-                # opr is a string => opl has same type as opr too
-                elif opr[0] != '?':
-                    self.varTypes[opl] = type(opr)
-                # opr is a variable => opl and opr have the same type
-                else:
-                    if self.varTypes[opl] == 'unknown':
-                        self.varTypes[opl] = self.varTypes[opr]
-                    else:
-                        self.varTypes[opr] = self.varTypes[opl]
-            # left operand is not a variable
-            else:
-                # right operand is a variable => same type as opl
-                if type(opr) == str and opr[0] == '?':
-                    self.vraTypes[opr] = type(opl)
-                # type mismatch
-                else:
-                    raise TypeError(f"Incompatible types in filter ({opl} {c['comp']} {opr})")
-        # Continue with joins to propagate types
-        for (i,j) in self.joins:
-            try:
-                if self.varTypes[j] != 'unknown':
-                    self.varTypes[i] = self.varTypes[j]
-                if self.varTypes[i] != 'unknown':
-                    self.varTypes[j] = self.varTypes[i]
-            except KeyError:
-                self.varTypes[j] = self.varTypes[i] = 'unknown'
-        
+            if t.timestamp[0] == '?':
+                self.varTypes[t.timestamp] = datetime
+
+
+        # Next with filter terms comprising constants, and joins to propagate types
+        inferTypes(self.varTypes, self.filter, self.joins)
+
+
 
     def listGPVars(self, timestamps = True):
         """
@@ -549,14 +579,14 @@ class TACQ(object):
         vars = []
         for t in self.gp:
             # subject
-            if t['subject'][0] == '?' and t['subject'][1] != 'r' and not t['subject'] in vars:
-                vars.append(t['subject'])
+            if t.subject[0] == '?' and t.subject[1] != 'r' and not t.subject in vars:
+                vars.append(t.subject)
             # object
-            if t['object'][0] == '?' and not t['object'] in vars:
-                vars.append(t['object'])
+            if t.object[0] == '?' and not t.object in vars:
+                vars.append(t.object)
             # timestamp
-            if timestamps and t['timestamp'] != 'any' and t['timestamp'][0] == '?'and not t['timestamp'] in vars:
-                vars.append(t['timestamp'])
+            if timestamps and t.timestamp != 'any' and t.timestamp[0] == '?'and not t.timestamp in vars:
+                vars.append(t.timestamp)
 
         # build the result
         res = ''
@@ -587,8 +617,12 @@ class TACQ(object):
         res.filter = self.filter.copy() + query.filter.copy()
         res.variables = self.variables.copy()
         res.variables.update(query.variables.copy())
+        res.newNames = query.newNames.copy()
+        res.newNames.update(self.newNames)
         res.constants = self.constants.copy()
         res.constants.update(query.constants.copy())
+        res.constVars = self.constVars.copy()
+        res.constVars.update(query.constVars)
         res.varTypes = self.varTypes.copy()
         res.varTypes.update(query.varTypes.copy())
 
@@ -611,28 +645,28 @@ class TACQ(object):
         else:
             new = 'c'
         # create the new variable
-        new = new + str(self.numConst)
+        new = sys.intern(new + str(self.numConst))
         self.numConst = self.numConst + 1
         self.constants[var] = new
+        self.constVars[new] = var
         return new
 
         
 
-    def freeze(self):
+    def freezeTriples(self):
         """
         Freezes the graph pattern of the query, one constant per variable.
 
         inputs: - None
-        output: - RDFlib Graph
+        output: - list of frozen triples (tuples of strings)
         """
-        graph = Graph()
-        ns = Namespace('http://example.org/')
+        triples = []
 
         # for each tripplet in GP
         for t in self.gp:
             tripplet = {}
             # subject
-            var = t['subject']
+            var = t.subject
             if var[0] == '?':
                 if var in self.constants.keys():
                     tripplet['subject'] = self.constants[var]
@@ -642,10 +676,10 @@ class TACQ(object):
                 tripplet['subject'] = var
 
             # predicate
-            tripplet['predicate'] = t['predicate']
+            tripplet['predicate'] = t.predicate
 
             # object
-            var = t['object']
+            var = t.object
             if var[0] == '?':
                 if var in self.constants.keys():
                     tripplet['object'] = self.constants[var]
@@ -655,7 +689,7 @@ class TACQ(object):
                 tripplet['object'] = var
 
             # timestamp
-            #var = t['timestamp']
+            #var = t.timestamp
             #if var[0] == '?':
             #    if var in self.constants.keys():
             #        tripplet['timestamp'] = self.constants[var]
@@ -664,7 +698,26 @@ class TACQ(object):
             #else:
             #    tripplet['timestamp'] = var
 
-            graph.add((Literal(tripplet['subject']), ns[tripplet['predicate']], Literal(tripplet['object'])))
+            triples.append((tripplet['subject'], tripplet['predicate'], tripplet['object']))
+
+        return triples
+
+
+
+    def freeze(self):
+        """
+        Freezes the graph pattern of the query, one constant per variable.
+
+        inputs: - None
+        output: - RDFlib Graph
+        """
+        from rdflib import Graph, Namespace, Literal
+        graph = Graph()
+        ns = Namespace('http://example.org/')
+
+        # for each frozen tripplet
+        for (s, p, o) in self.freezeTriples():
+            graph.add((Literal(s), ns[p], Literal(o)))
             
         return graph
     
@@ -761,6 +814,101 @@ class TACQ(object):
         
     
 
+    def canonicalize(self):
+        """
+        Builds the canonical form of the query: variables are renamed by a canonical labeling
+        (output variables keeping their rank in the SELECT clause), comparisons with a constant are oriented
+        ('>' and '>=' become '<' and '<=', the variable comes first in (in)equalities), and triples and groups are sorted.
+        Filter conditions and joins keep their order, and comparisons between variables their orientation,
+        because types are inferred in this order (see inferTypes()).
+        Queries that differ only by variable names and by the order of triples and groups have the same canonical form.
+
+        inputs: - None
+        output: - a new TACQ, its variables being {canonical name : name in the query}
+        """
+        from canonicalLabeling import canonicalLabeling
+
+        def isVar(t):
+            return isinstance(t, str) and t.startswith('?') and t != '?timeWindowEnd'
+
+        def key(t):
+            return t if isVar(t) else repr(t)
+
+        # oriented conditions
+        conditions = []
+        for f in self.filter:
+            (opl, comp, opr) = (f.opl, f.comp, f.opr)
+            if isVar(opl) != isVar(opr):
+                if comp in CONVERSES:
+                    (opl, comp, opr) = (opr, CONVERSES[comp], opl)
+                elif comp in SYMMETRIC and not isVar(opl):
+                    (opl, opr) = (opr, opl)
+            conditions.append((opl, comp, opr))
+
+        # facts describing the query
+        facts = [('t', str(p.subject), str(p.predicate), str(p.object), str(p.timestamp)) for p in self.gp]
+        for n in range(len(conditions)):
+            (opl, comp, opr) = conditions[n]
+            facts.append(('f', n, key(opl), comp, key(opr)))
+        for n in range(len(self.joins)):
+            facts.append(('j', n) + tuple(self.joins[n]))
+        if self.aggregate:
+            facts.append(('a', self.aggregate['function'], self.aggregate['variable']))
+        facts.extend([('g', g) for g in self.group_by])
+
+        variables = set(t for f in facts for t in f[1:] if isVar(t)) | set(s for s in self.select if isVar(s))
+        colors = {}
+        for v in variables:
+            if v in self.select:
+                colors[v] = (0, self.select.index(v))
+            elif self.aggregate and v == self.aggregate['variable']:
+                colors[v] = (1, 0)
+            else:
+                colors[v] = (2, 0)
+        labels = canonicalLabeling(facts, variables, colors)
+
+        def name(t):
+            return '?v' + str(labels[t] + 1) if isVar(t) else t
+
+        # canonical query
+        res = TACQ()
+        res.select = [name(s) for s in self.select]
+        if self.aggregate:
+            res.aggregate = {'function' : self.aggregate['function'], 'variable' : name(self.aggregate['variable'])}
+        triples = set((name(p.subject), name(p.predicate), name(p.object), name(p.timestamp)) for p in self.gp)
+        res.gp = [Triple(*t) for t in sorted(triples, key=lambda t: tuple(key(x) for x in t))]
+        res.filter = [Condition(name(opl), comp, name(opr)) for (opl, comp, opr) in conditions]
+        res.joins = [(name(i), name(j)) for (i, j) in self.joins]
+        res.group_by = sorted(set(name(g) for g in self.group_by))
+        res.size = self.size
+        res.step = self.step
+        res.variables = {name(v) : v for v in variables}
+
+        return res
+
+
+
+    def certificate(self):
+        """
+        Computes a certificate of the graph pattern: its triples where variables are renamed by a canonical labeling,
+        output variables ('?o...') being marked. Graph patterns with the same certificate are isomorphic, by an
+        isomorphism mapping output variables to output variables.
+
+        inputs: - None
+        output: - a string
+        """
+        from canonicalLabeling import canonicalLabeling, rename
+
+        facts = [(str(t.subject), str(t.predicate), str(t.object), str(t.timestamp)) for t in self.gp]
+        variables = set(x for f in facts for x in f if x[0] == '?')
+        facts.extend(('output', v) for v in variables if v[1] == 'o')
+        labels = canonicalLabeling(facts, variables, {v : v[1] == 'o' for v in variables})
+
+        return ' . '.join(' '.join(f) for f in rename(facts, variables, labels))
+
+
+
+
     def toString(self, show='sawfjgt'):
         """
         Converts the TACQ into a string.
@@ -789,10 +937,10 @@ class TACQ(object):
         if 'w' in show or 'n' in show:
             res = res + 'WHERE { '
             for i in self.gp:
-                if str(i['timestamp']) != 'any' and not 'n' in show:
-                    res = res + '(' + str(i['subject']) + ' ' + str(i['predicate']) + ' ' + str(i['object']) +', ' + str(i['timestamp']) + ') . '
+                if str(i.timestamp) != 'any' and not 'n' in show:
+                    res = res + '(' + str(i.subject) + ' ' + str(i.predicate) + ' ' + str(i.object) +', ' + str(i.timestamp) + ') . '
                 else:
-                     res = res + str(i['subject']) + ' ' + str(i['predicate']) + ' ' + str(i['object']) + ' . '
+                     res = res + str(i.subject) + ' ' + str(i.predicate) + ' ' + str(i.object) + ' . '
                 
         # filter conditions
         if ('f' in show and self.filter) or ('j' in show and self.joins):
@@ -801,9 +949,9 @@ class TACQ(object):
             if 'f' in show:
                 for i in self.filter:
                     try:
-                        res = res + str(i['opl']) + ' ' + str(i['comp']) + ' ' + i['opr'].isoformat() + ' && '
+                        res = res + str(i.opl) + ' ' + str(i.comp) + ' ' + i.opr.isoformat() + ' && '
                     except:
-                        res = res + str(i['opl']) + ' ' + str(i['comp']) + ' ' + str(i['opr']) + ' && '
+                        res = res + str(i.opl) + ' ' + str(i.comp) + ' ' + str(i.opr) + ' && '
             if 'j' in show:
                 for (i, j) in self.joins:
                     res = res + str(i) + ' = ' + str(j) + ' && '
@@ -828,6 +976,53 @@ class TACQ(object):
 
 
 
+def inferTypes(varTypes, conditions=[], joins=[]):
+    """
+    Infers types of variables from filter conditions comprising constants, then propagates them along joins.
+    Conditions are taken in order, a condition between variables giving the type of the first one to the other.
+
+    inputs: - varTypes   -> mapping {var : type} updated in place (e.g. a ChainMap over shared types)
+            - conditions -> list of Conditions
+            - joins      -> list of couples of variables
+    output: - None
+    """
+    for c in conditions:
+        opl = c.opl
+        opr = c.opr
+        # left operand is a variable
+        if type(opl) == str and opl[0] == '?':
+            # right operand is not a string => opl has same type as opl
+            if type(opr) != str:
+                varTypes[opl] = type(opr)
+            # opr is a string => opl has same type as opr too
+            elif opr[0] != '?':
+                varTypes[opl] = type(opr)
+            # opr is a variable => opl and opr have the same type
+            else:
+                if varTypes[opl] == 'unknown':
+                    varTypes[opl] = varTypes[opr]
+                else:
+                    varTypes[opr] = varTypes[opl]
+        # left operand is not a variable
+        else:
+            # right operand is a variable => same type as opl
+            if type(opr) == str and opr[0] == '?':
+                varTypes[opr] = type(opl)
+            # type mismatch
+            else:
+                raise TypeError(f"Incompatible types in filter ({opl} {c.comp} {opr})")
+    # Continue with joins to propagate types
+    for (i,j) in joins:
+        try:
+            if varTypes[j] != 'unknown':
+                varTypes[i] = varTypes[j]
+            if varTypes[i] != 'unknown':
+                varTypes[j] = varTypes[i]
+        except KeyError:
+            varTypes[j] = varTypes[i] = 'unknown'
+
+
+
 def msplit(delimiters, string, maxsplit=0):
     """
     A simple function to split a string with different delimiters.
@@ -862,6 +1057,417 @@ class TACQError(Exception):
 
 
 
+# lexemes of TACQ expressions, after spaces and comments
+LEXEMES = re.compile(r"""
+    (?:\s+|\#[^\n]*)*
+    (   \?\w+                                        # variable
+      | <[^<>\s"{}|^`\\]*>                          # IRI
+      | "(?:[^"\\\n]|\\.)*" | '(?:[^'\\\n]|\\.)*'      # string
+      | !=|<=|>=|==|&&|[=<>]                         # comparison or conjunction
+      | [(){},]                                      # punctuation
+      | [\w:+-]+(?:\.[\w:+-]+)*                     # name, keyword, number or date
+      | [+-]?\d*\.\d+(?:[eE][+-]?\d+)?               # number starting with a dot
+      | \S                                           # '.' or unexpected character
+    )""", re.VERBOSE)
+
+INT = re.compile(r'[+-]?\d+')
+FLOAT = re.compile(r'[+-]?(?:\d*\.\d+(?:[eE][+-]?\d+)?|\d+[eE][+-]?\d+)')
+DATETIME = re.compile(r'\d{4}-\d{2}-\d{2}(?:T\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:\d{2})?)?')
+
+KEYWORDS = ['PREFIX', 'SELECT', 'WHERE', 'FILTER', 'GROUP', 'BY', 'TIMEWINDOW']  # names that are keywords
+
+SYMBOLS = {'(' : 'punct', ')' : 'punct', '{' : 'punct', '}' : 'punct', ',' : 'punct', '.' : 'punct', '&&' : 'and',
+           '=' : 'comp', '==' : 'comp', '!=' : 'comp', '<' : 'comp', '<=' : 'comp', '>' : 'comp', '>=' : 'comp'}  # kinds of symbols
+
+TERMS = ['var', 'name', 'iri', 'string', 'int', 'float', 'datetime']  # kinds of tokens that can be terms of triples
+
+KINDS = {}  # cache of the kinds of lexemes {lexeme : kind}
+
+
+
+def lexemeKind(lexeme):
+    """
+    Gives the kind of a lexeme: var, iri, string, int, float, datetime, name, keyword, comp, and, punct.
+    Kinds are cached, since queries of a policy share most of their lexemes.
+
+    inputs: - lexeme -> a lexeme found by LEXEMES
+    output: - the kind, None for unexpected lexemes
+    """
+    kind = KINDS.get(lexeme)
+    if kind is not None:
+        return kind
+
+    c = lexeme[0]
+    if c == '?':
+        kind = 'var'
+    elif lexeme in SYMBOLS:
+        kind = SYMBOLS[lexeme]
+    elif c == '<':
+        kind = 'iri'
+    elif c == '"' or c == "'":
+        kind = 'string'
+    elif c.isdigit() or c in '+-.':
+        if INT.fullmatch(lexeme):
+            kind = 'int'
+        elif FLOAT.fullmatch(lexeme):
+            kind = 'float'
+        elif DATETIME.fullmatch(lexeme):
+            kind = 'datetime'
+    elif c.isalpha() or c in '_:':
+        kind = 'keyword' if lexeme in KEYWORDS else 'name'
+
+    if kind is not None and len(KINDS) < 100000:
+        KINDS[lexeme] = kind
+    return kind
+
+
+
+def tokenize(text):
+    """
+    Splits a TACQ expression into tokens (see lexemeKind() for their kinds).
+    The list ends with a token of kind 'end'.
+
+    inputs: - text -> the expression
+    output: - list of tokens (kind, text)
+    """
+    if not isinstance(text, str):
+        raise TypeError('The parameter "text" of tokenize() must be a string !')
+
+    tokens = [(lexemeKind(l), l) for l in LEXEMES.findall(text)]
+    for n in range(len(tokens)):
+        if tokens[n][0] is None:
+            raise TACQError(f"Unexpected '{tokens[n][1]}' {position(text, n)} !")
+    tokens.append(('end', ''))
+    return tokens
+
+
+
+def position(text, number):
+    """
+    Describes the position of a token in a text for error messages.
+
+    inputs: - text   -> the text
+            - number -> number of the token in the text
+    output: - a string 'at line ..., column ...'
+    """
+    pos = len(text)
+    for (n, m) in enumerate(LEXEMES.finditer(text)):
+        if n == number:
+            pos = m.start(1)
+            break
+    line = text.count('\n', 0, pos) + 1
+    column = pos - text.rfind('\n', 0, pos)
+    return f"at line {line}, column {column}"
+
+
+
+class Parser(object):
+    """
+    Class for recursive-descent parsers of TACQ expressions.
+
+    query     := prefix* SELECT (var | name '(' var ')')+ WHERE '{' pattern* '}'? [GROUP BY var+] [TIMEWINDOW '(' size ','? step ')'] prefix*
+    prefix    := PREFIX name iri
+    pattern   := triple | '(' triple ','? term ')' | triple ',' term | '.' | FILTER '(' condition ('&&' condition)* ')'?
+    triple    := term term term
+    condition := operand comp operand token*
+    size      := int | 'inf'
+
+    As in the first versions of the parser, only the first FILTER is read: the rest of the WHERE clause is skipped,
+    and so are the tokens ending a condition (up to '&&', ')' or '}').
+    """
+
+    # Attributes of a Parser
+    text = ''    # parsed expression
+    tokens = []  # list of tokens (kind, text), ending with an 'end' token
+    pos = 0      # number of the next token
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+
+
+    def peek(self):
+        """
+        Gives the next token without consuming it.
+
+        inputs: - None
+        output: - a token (kind, text)
+        """
+        return self.tokens[self.pos]
+
+
+
+    def error(self, message):
+        """
+        Raises an error at the position of the next token.
+
+        inputs: - message -> description of the error
+        output: - None
+        """
+        (kind, text) = self.peek()
+        found = f"'{text}'" if kind != 'end' else 'end of query'
+        raise TACQError(f"{message}, found {found} {position(self.text, self.pos)} !")
+
+
+
+    def accept(self, kind, text=None):
+        """
+        Consumes the next token if it has a given kind (and text).
+
+        inputs: - kind -> kind of token
+                - text -> text of the token, None for any text
+        output: - the token, None if it does not match
+        """
+        token = self.tokens[self.pos]
+        if token[0] == kind and (text is None or token[1] == text):
+            self.pos = self.pos + 1
+            return token
+        return None
+
+
+
+    def expect(self, kind, text=None, what=None):
+        """
+        Consumes the next token, that must have a given kind (and text).
+
+        inputs: - kind -> kind of token
+                - text -> text of the token, None for any text
+                - what -> description of the expected token for error messages
+        output: - the token
+        """
+        token = self.accept(kind, text)
+        if token is None:
+            self.error(f"Expected {what or repr(text or kind)}")
+        return token
+
+
+
+    def atKeyword(self):
+        """
+        Tests if the next token is a keyword or the end of the query.
+
+        inputs: - None
+        output: - a boolean
+        """
+        return self.tokens[self.pos][0] in ['keyword', 'end']
+
+
+
+    def query(self):
+        """
+        Parses a whole query.
+
+        inputs: - None
+        output: - a tuple (select, aggregate, gp, filter, group_by, size, step)
+        """
+        self.prefixes()
+
+        # SELECT
+        self.expect('keyword', 'SELECT', 'SELECT clause')
+        (select, aggregate) = self.selectClause()
+
+        # WHERE => GP and FILTER
+        self.expect('keyword', 'WHERE', 'WHERE clause')
+        (gp, filter) = self.whereClause()
+
+        # GROUP BY
+        group_by = []
+        if self.accept('keyword', 'GROUP'):
+            self.expect('keyword', 'BY')
+            group_by.append(self.expect('var', what='a group variable')[1])
+            while self.peek()[0] == 'var':
+                group_by.append(self.accept('var')[1])
+
+        # TIME WINDOW
+        size = 'inf'
+        step = 0
+        if self.accept('keyword', 'TIMEWINDOW'):
+            self.expect('punct', '(')
+            size = self.accept('name', 'inf') or self.expect('int', what='the size of time windows')
+            size = size[1]
+            self.accept('punct', ',')
+            step = self.expect('int', what='the step of time windows')[1]
+            self.expect('punct', ')')
+
+        self.prefixes()
+        if self.peek()[0] != 'end':
+            self.error('Expected end of query')
+
+        return (select, aggregate, gp, filter, group_by, size, step)
+
+
+
+    def prefixes(self):
+        """
+        Skips prefix declarations.
+
+        inputs: - None
+        output: - None
+        """
+        while self.accept('keyword', 'PREFIX'):
+            self.expect('name', what='a prefix name')
+            self.expect('iri', what='an IRI')
+
+
+
+    def selectClause(self):
+        """
+        Parses output variables and the aggregate function.
+
+        inputs: - None
+        output: - a couple (select, aggregate)
+        """
+        select = []
+        aggregate = {}
+        while not self.atKeyword():
+            token = self.accept('var')
+            if token:
+                select.append(token[1])
+                continue
+            # if not a variable => aggregate
+            function = self.expect('name', what='an output variable or an aggregate')[1]
+            self.expect('punct', '(')
+            var = self.peek()[1]
+            if not self.accept('var'):
+                raise TACQError(f"Aggregates must be computed over a variable [{function}({var})] !")
+            self.expect('punct', ')')
+            # check query consistency
+            if aggregate:
+                raise TACQError(f"Only one aggregate function is allowed [{function}({var})] !")
+            aggregate['function'] = function
+            aggregate['variable'] = var
+        return (select, aggregate)
+
+
+
+    def whereClause(self):
+        """
+        Parses the graph pattern and the filter conditions.
+        The closing brace may be missing.
+
+        inputs: - None
+        output: - a couple (gp, filter) of lists of Triples and Conditions
+        """
+        gp = []
+        filter = []
+        self.expect('punct', '{')
+        while True:
+            (kind, text) = self.tokens[self.pos]
+            if kind == 'punct' and text == '.':
+                self.pos = self.pos + 1
+            elif kind == 'keyword' and text == 'FILTER':
+                self.pos = self.pos + 1
+                self.filterClause(filter)
+                self.skipWhere()
+                break
+            elif kind == 'punct' and text == '}':
+                self.pos = self.pos + 1
+                # filter after the graph pattern
+                if self.accept('keyword', 'FILTER'):
+                    self.filterClause(filter)
+                    self.skipWhere()
+                break
+            elif kind == 'keyword' or kind == 'end':
+                break
+            else:
+                gp.append(self.triple())
+        return (gp, filter)
+
+
+
+    def triple(self):
+        """
+        Parses a triple, with an optional timestamp.
+
+        inputs: - None
+        output: - a Triple
+        """
+        parenthesis = self.accept('punct', '(')
+        terms = [self.term(), self.term(), self.term()]
+        if self.accept('punct', ',') or (parenthesis and self.tokens[self.pos][0] in TERMS):
+            terms.append(self.term())
+        if parenthesis:
+            self.expect('punct', ')')
+        (kind, text) = self.tokens[self.pos]
+        if not (kind in ['keyword', 'end'] or text == '.' or text == '}'):
+            self.error("Expected '.' after a triple")
+        return Triple(*terms)
+
+
+
+    def term(self):
+        """
+        Parses a term of a triple.
+
+        inputs: - None
+        output: - the term as written in the query
+        """
+        token = self.tokens[self.pos]
+        if token[0] in TERMS:
+            self.pos = self.pos + 1
+            return token[1]
+        self.error('Expected a term of a triple')
+
+
+
+    def filterClause(self, filter):
+        """
+        Parses filter conditions separated by '&&'.
+        The closing parenthesis may be missing before the closing brace.
+
+        inputs: - filter -> list where Conditions are added
+        output: - None
+        """
+        self.expect('punct', '(')
+        while True:
+            opl = self.operand()
+            comp = self.expect('comp', what='a comparison')[1]
+            opr = self.operand()
+            filter.append(Condition(opl, comp, opr))
+            # tokens ending the condition are ignored
+            while not self.peek()[0] in ['and', 'keyword', 'end'] and not self.peek() in [('punct', ')'), ('punct', '}')]:
+                self.pos = self.pos + 1
+            if not self.accept('and'):
+                break
+        self.accept('punct', ')')
+
+
+
+    def skipWhere(self):
+        """
+        Skips the end of the WHERE clause after the first FILTER, up to GROUP BY, TIMEWINDOW or the end of the query.
+
+        inputs: - None
+        output: - None
+        """
+        while not self.peek()[0] == 'end' and not self.peek() in [('keyword', 'GROUP'), ('keyword', 'TIMEWINDOW'), ('keyword', 'PREFIX')]:
+            self.pos = self.pos + 1
+
+
+
+    def operand(self):
+        """
+        Parses an operand of a filter condition, typing literals.
+
+        inputs: - None
+        output: - a variable name, or a constant (int, float, datetime or string)
+        """
+        (kind, text) = self.peek()
+        if not kind in TERMS:
+            self.error('Expected a variable or a constant')
+        self.pos = self.pos + 1
+        if kind == 'int':
+            return int(text)
+        if kind == 'float':
+            return float(text)
+        if kind == 'datetime':
+            return datetime.fromisoformat(text)
+        return text
+
+
+
 # some simple tests
 if __name__ == '__main__':
     print('----------------')
@@ -892,6 +1498,34 @@ if __name__ == '__main__':
     print('size:     ', query.size)
     print('step:     ', query.step)
     print()
+    assert query.select == ['?a', '?timeWindowEnd']
+    assert query.aggregate == {'function': 'max', 'variable': '?c'}
+    assert [(t['subject'], t['predicate'], t['object']) for t in query.gp] == [('?a', 'ns:p', '?b'), ('?b', 'ns:q', '?c'), ('?b', 'ns:r', '"toto"')]
+    assert query.filter == [{'opl': '?a', 'comp': '>', 'opr': 2}]
+    assert query.group_by == ['?a', '?timeWindowEnd', '?b']
+    assert (query.size, query.step) == ('2', '1')
+
+    # tokenize and round trips through toString()
+    print('-------------------')
+    print('Test of tokenize():')
+    print('-------------------')
+    assert tokenize('?b > .5 .') == [('var', '?b'), ('comp', '>'), ('float', '.5'), ('punct', '.'), ('end', '')]
+    assert tokenize('?a ns:p 2.5 .?b') == [('var', '?a'), ('name', 'ns:p'), ('float', '2.5'), ('punct', '.'), ('var', '?b'), ('end', '')]
+    assert tokenize('-.25e1 2020-01-01') == [('float', '-.25e1'), ('datetime', '2020-01-01'), ('end', '')]
+    for text in ['SELECT ?a WHERE { ?a ns:p ?b . FILTER(?b > .5) }',
+                 'SELECT ?a max(?c) WHERE { ?a ns:p ?b . ?b ns:q ?c . FILTER(?a > 2 && ?c != -.25e1) } GROUP BY ?a TIMEWINDOW (inf, 1)',
+                 'SELECT ?a WHERE { (?a ns:p ?b, ?d) . ?b ns:r "toto" . FILTER(?b >= 2.5 && ?d < 2020-01-01T10:00:00Z) }']:
+        q = TACQ()
+        q.parse(text)
+        r = TACQ()
+        r.parse(q.toString())
+        print(q.toString().replace('\n', ' '))
+        for attribute in ['select', 'aggregate', 'gp', 'filter', 'group_by', 'size', 'step']:
+            assert getattr(q, attribute) == getattr(r, attribute), (text, attribute)
+    q = TACQ()
+    q.parse('SELECT ?a WHERE { ?a ns:p ?b . FILTER(?b > .5) }')
+    assert q.filter == [{'opl': '?b', 'comp': '>', 'opr': 0.5}]
+    print()
 
     # toString
     print('-------------------')
@@ -977,6 +1611,45 @@ if __name__ == '__main__':
     q3.printVariables()
     print()
 
+    # certificate
+    print('----------------------')
+    print('Test of certificate():')
+    print('----------------------')
+    q4 = TACQ()
+    q4.parse('SELECT ?c ?x WHERE { ?b ns:rrr ?c . ?x ns:qqq ?b }')
+    q4.renameVariables('q4')
+    q4.extractJoins()
+    q2.reify()
+    q4.reify()
+    print('q2:', q2.certificate())
+    print('q4:', q4.certificate())
+    print('same certificate:', q2.certificate() == q4.certificate())
+    q5 = TACQ()
+    q5.parse('SELECT ?a WHERE { ?a ns:qqq ?b . ?b ns:rrr ?c }')
+    q5.renameVariables('q5')
+    q5.extractJoins()
+    q5.reify()
+    print('q5 (?c is not an output):', q5.certificate() == q2.certificate())
+    print()
+
+    # canonicalize
+    print('-----------------------')
+    print('Test of canonicalize():')
+    print('-----------------------')
+    forms = []
+    for text in ['SELECT ?a WHERE { ?a ns:p ?b . ?b ns:q ?c . FILTER(?b > 2 && ?c < ?b) }',
+                 'SELECT ?x WHERE { ?y ns:q ?z . ?x ns:p ?y . FILTER(2 < ?y && ?z < ?y) }',   # renamed and reordered
+                 'SELECT ?x WHERE { ?y ns:q ?z . ?x ns:p ?y . FILTER(?z < ?y && 2 < ?y) }',   # conditions in another order
+                 'SELECT ?x WHERE { ?y ns:q ?z . ?x ns:p ?y . FILTER(2 < ?y && ?y > ?z) }',   # condition between variables reversed
+                 'SELECT ?b WHERE { ?a ns:p ?b . ?b ns:q ?c . FILTER(?b > 2 && ?c < ?b) }']:  # another output
+        q = TACQ()
+        q.parse(text)
+        forms.append(q.canonicalize().toString())
+    print(forms[0])
+    print('same form:', [f == forms[0] for f in forms])
+    assert [f == forms[0] for f in forms] == [True, True, False, False, False]
+    print()
+
     # freeze
     print('-----------------')
     print('Test of freeze():')
@@ -0,0 +1,273 @@
+#!/usr/bin/python3
+
+import argparse
+import contextlib
+import csv
+import io
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+"""
+Benchmarks of the compatibility checker
+
+usage: benchmark.py startup [-h|--help] [-n|--runs <N>]
+       benchmark.py scaling [-h|--help] [-V|--vary <parameter>] [-x|--values <list>] [-n|--runs <N>]
+                            [--pqs <N>] [--uqs <N>] [--gp <N>] [--filters <N>] [--joins <N>] [--outputs <ratio>]
+                            [--aggregates <ratio>] [--window <N>] [--predicates <N>] [--overlap <ratio>] [--seed <N>]
+                            [-e|--engine <engine>] [-s|--solver <solver>] [--csv <file>]
+
+commands:
+  startup : cold-start time of compatibilityChecking.py on a trivial policy pair,
+            compared to the import time of its heavy dependencies
+  scaling : time of each stage of the checker on synthetic policies (see policyGenerator.py)
+            when one parameter of the generator varies
+
+arguments:
+  -h | --help       : Show this help and exit
+  -n | --runs       : number of runs of each measure, default value is 10 (startup) or 3 (scaling)
+  -V | --vary       : parameter that varies (pqs, uqs, gp, filters, joins, outputs, aggregates, window, predicates, overlap), default value is uqs
+  -x | --values     : comma separated values of the varying parameter, default value is 5,10,20
+  --pqs             : number of privacy queries, default value is 10
+  --uqs             : number of utility queries, default value is 10
+  --gp              : number of triples in each graph pattern, default value is 3
+  --filters         : number of filter conditions in each query, default value is 1
+  --joins           : number of triples joined to a previous one, default value is gp-1
+  --outputs         : ratio of variables selected as outputs, default value is 0.5
+  --aggregates      : ratio of queries computing an aggregate, default value is 0.3
+  --window          : maximal size of time windows, default value is 12
+  --predicates      : number of predicates of the vocabulary to use (0 = all), default value is 5
+  --overlap         : ratio of privacy queries copied from utility queries, default value is 0.3
+  --seed            : seed of the random generator, default value is 1
+  -e | --engine     : engine evaluating graph patterns over freezings, default value is native
+  -s | --solver     : solver checking filter satisfiability, default value is order
+  --csv             : file where the measures are written in CSV format
+"""
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+TRIVIAL_PRIVACY = """PREFIX ns:<http://example.org/>
+
+SELECT ?a
+WHERE { ?a ns:p ?b }
+"""
+
+TRIVIAL_UTILITY = """PREFIX ns:<http://example.org/>
+
+SELECT ?a
+WHERE { ?a ns:q ?b }
+"""
+
+
+
+def timeCommand(command, runs):
+    """
+    Measures the wall time of a command.
+
+    inputs: - command -> list of command line arguments
+            - runs    -> number of runs
+    output: - list of times in seconds
+    """
+    times = []
+    for r in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True, cwd=HERE)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+
+def printTimes(name, times):
+    """
+    Prints statistics of measured times.
+
+    inputs: - name  -> name of the measure
+            - times -> list of times in seconds
+    output: - None
+    """
+    print(f"{name:40} min {min(times)*1000:8.1f} ms   median {statistics.median(times)*1000:8.1f} ms   max {max(times)*1000:8.1f} ms")
+
+
+
+def benchmarkStartup(runs):
+    """
+    Measures cold-start time of the checker on a trivial policy pair.
+
+    inputs: - runs -> number of runs of each measure
+    output: - None
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        privacy = os.path.join(tmp, 'privacy.sparql')
+        utility = os.path.join(tmp, 'utility.sparql')
+        with open(privacy, 'w') as f:
+            f.write(TRIVIAL_PRIVACY)
+        with open(utility, 'w') as f:
+            f.write(TRIVIAL_UTILITY)
+
+        print('-----------------------------------')
+        print('Cold start on a trivial policy pair')
+        print('-----------------------------------')
+        printTimes('python (empty interpreter)', timeCommand([sys.executable, '-c', 'pass'], runs))
+        for module in ['rdflib', 'constraint', 'sympy']:
+            try:
+                printTimes(f"import {module}", timeCommand([sys.executable, '-c', f"import {module}"], runs))
+            except subprocess.CalledProcessError:
+                print(f"{'import ' + module:40} not installed")
+        printTimes('compatibilityChecking.py', timeCommand([sys.executable, 'compatibilityChecking.py', '-p', privacy, '-u', utility], runs))
+        print()
+
+
+
+STAGES = ['read', 'rewriting', 'overlap', 'filter', 'aggregate1', 'aggregate2', 'other']  # stages of the checker
+
+RATIOS = ['outputs', 'aggregates', 'overlap']  # parameters that are ratios
+
+SCALING = ['pqs', 'uqs', 'gp', 'filters', 'joins', 'outputs', 'aggregates', 'window', 'predicates', 'overlap']  # parameters that may vary
+
+
+
+def writeSyntheticPolicies(directory, parameters):
+    """
+    Writes a synthetic privacy and utility policy pair.
+    Some privacy queries are copies of utility queries, so that every stage of the checker is exercised.
+
+    inputs: - directory  -> directory where policies are written
+            - parameters -> dictionary of generator parameters
+    output: - (privacy file, utility file)
+    """
+    from policyGenerator import PREFIX, generateQueries
+
+    def queries(number, seed):
+        return generateQueries(number, parameters['gp'], parameters['filters'], parameters['joins'], parameters['outputs'],
+                               parameters['aggregates'], parameters['window'], parameters['predicates'], seed)
+
+    utility = queries(parameters['uqs'], parameters['seed'])
+    privacy = queries(parameters['pqs'], parameters['seed'] + 1)
+    rand = random.Random(parameters['seed'])
+    for i in range(len(privacy)):
+        if utility and rand.random() < parameters['overlap']:
+            privacy[i] = rand.choice(utility)
+
+    files = (os.path.join(directory, 'privacy.sparql'), os.path.join(directory, 'utility.sparql'))
+    for (file, policy) in zip(files, [privacy, utility]):
+        with open(file, 'w') as f:
+            f.write(PREFIX + '\n'.join(policy))
+    return files
+
+
+
+def timeStages(privacy, utility, engine, solver):
+    """
+    Runs the checker in this process and measures the time spent in each stage, using the metrics of the checker.
+    What is not spent in a stage (e.g. printing reports) is counted as 'other'.
+
+    inputs: - privacy -> privacy policy file
+            - utility -> utility policy file
+            - engine  -> engine evaluating graph patterns
+            - solver  -> solver checking filter satisfiability
+    output: - dictionary {stage : time in seconds}, with the 'total' time
+    """
+    import compatibilityChecking as checker
+
+    args = checker.mainArgs
+    checker.mainArgs = checker.get_cmd_line_args(['-p', privacy, '-u', utility, '-e', engine, '-s', solver])
+    checker.metrics.reset()
+    try:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            checker.main()
+        total = time.perf_counter() - start
+    finally:
+        checker.mainArgs = args
+
+    stages = checker.metrics.toDict()['stages']
+    times = {stage : stages.get(stage, {'wall' : 0.0})['wall'] for stage in STAGES if stage != 'other'}
+    times['other'] = total - sum(times.values())
+    times['total'] = total
+    return times
+
+
+
+def benchmarkScaling(args):
+    """
+    Measures the time of each stage of the checker on synthetic policies, for each value of a parameter.
+    The median over the runs is kept.
+
+    inputs: - args -> Namespace of the scaling command
+    output: - None
+    """
+    parameters = {p : getattr(args, p) for p in SCALING + ['seed']}
+    rows = []
+
+    print('-' * (28 + len(args.vary)))
+    print(f"Scaling of the checker with {args.vary}")
+    print('-' * (28 + len(args.vary)))
+    print(f"{args.vary:>10}" + ''.join(f"{s:>12}" for s in STAGES + ['total']) + '   (median ms)')
+
+    for value in args.values.split(','):
+        parameters[args.vary] = float(value) if args.vary in RATIOS else int(value)
+        measures = []
+        with tempfile.TemporaryDirectory() as tmp:
+            (privacy, utility) = writeSyntheticPolicies(tmp, parameters)
+            for r in range(args.runs):
+                measures.append(timeStages(privacy, utility, args.engine, args.solver))
+        row = {args.vary : value}
+        for s in STAGES + ['total']:
+            row[s] = statistics.median(m[s] for m in measures) * 1000
+        rows.append(row)
+        print(f"{value:>10}" + ''.join(f"{row[s]:12.1f}" for s in STAGES + ['total']))
+    print()
+
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=[args.vary] + STAGES + ['total'])
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({k : (round(v, 3) if isinstance(v, float) else v) for (k, v) in row.items()})
+
+
+
+def get_cmd_line_args():
+    """
+    Parse the command line to get parameters.
+
+    input:  - none
+    output: - a Namespace containing parameter values
+    """
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest='command', required=True)
+    startup = commands.add_parser('startup', help = 'cold-start time on a trivial policy pair')
+    startup.add_argument('-n', '--runs', help = 'number of runs of each measure', type = int, default = 10)
+    scaling = commands.add_parser('scaling', help = 'time of each stage on synthetic policies')
+    scaling.add_argument('-V', '--vary', help = 'parameter that varies', choices = SCALING, default = 'uqs')
+    scaling.add_argument('-x', '--values', help = 'comma separated values of the varying parameter', default = '5,10,20')
+    scaling.add_argument('-n', '--runs', help = 'number of runs of each measure', type = int, default = 3)
+    scaling.add_argument('--pqs', help = 'number of privacy queries', type = int, default = 10)
+    scaling.add_argument('--uqs', help = 'number of utility queries', type = int, default = 10)
+    scaling.add_argument('--gp', help = 'number of triples in each graph pattern', type = int, default = 3)
+    scaling.add_argument('--filters', help = 'number of filter conditions in each query', type = int, default = 1)
+    scaling.add_argument('--joins', help = 'number of triples joined to a previous one', type = int, default = None)
+    scaling.add_argument('--outputs', help = 'ratio of variables selected as outputs', type = float, default = 0.5)
+    scaling.add_argument('--aggregates', help = 'ratio of queries computing an aggregate', type = float, default = 0.3)
+    scaling.add_argument('--window', help = 'maximal size of time windows', type = int, default = 12)
+    scaling.add_argument('--predicates', help = 'number of predicates of the vocabulary to use (0 = all)', type = int, default = 5)
+    scaling.add_argument('--overlap', help = 'ratio of privacy queries copied from utility queries', type = float, default = 0.3)
+    scaling.add_argument('--seed', help = 'seed of the random generator', type = int, default = 1)
+    scaling.add_argument('-e', '--engine', help = 'engine evaluating graph patterns', choices = ['native', 'sparql'], default = 'native')
+    scaling.add_argument('-s', '--solver', help = 'solver checking filter satisfiability', choices = ['order', 'csp'], default = 'order')
+    scaling.add_argument('--csv', help = 'file where the measures are written', default = None)
+    return parser.parse_args()
+
+
+
+if __name__ == '__main__':
+    args = get_cmd_line_args()
+    if args.command == 'startup':
+        benchmarkStartup(args.runs)
+    elif args.command == 'scaling':
+        benchmarkScaling(args)
@@ -0,0 +1,148 @@
+"""
+Canonical labeling of the variables of a set of facts.
+
+A query is seen as a set of facts (tuples of terms), some terms being
+variables. A canonical labeling numbers the variables so that two sets of
+facts that are equal up to a renaming of variables get the same renamed
+facts. Variables are first partitioned by color refinement: the color of a
+variable is refined with the colors of the facts it appears in, until the
+partition is stable. Variables that remain indistinguishable are
+individualized one after the other, and the labeling giving the smallest
+renamed facts is kept.
+"""
+
+
+LIMIT = 256   # maximal number of labelings compared (beyond it the form stays sound but may not be canonical)
+
+
+
+def refine(facts, variables, colors):
+    """
+    Refines colors of variables until the partition is stable.
+
+    inputs: - facts     -> list of tuples of terms (strings)
+            - variables -> set of terms that are variables
+            - colors    -> dictionary {variable : color (integer)}
+    output: - the refined dictionary {variable : color}, colors being ranks from 0
+    """
+    occurrences = {v : [] for v in variables}
+    for f in facts:
+        for v in set(f):
+            if v in variables:
+                occurrences[v].append(f)
+
+    number = -1
+    while True:
+        signatures = {}
+        for v in variables:
+            neighbours = []
+            for f in occurrences[v]:
+                neighbours.append(tuple(('=',) if t == v else ('v', colors[t]) if t in variables else ('c', t) for t in f))
+            neighbours.sort()
+            signatures[v] = (colors[v], neighbours)
+        ranks = {}
+        for s in sorted(set(str(s) for s in signatures.values())):
+            ranks[s] = len(ranks)
+        colors = {v : ranks[str(signatures[v])] for v in variables}
+        if len(ranks) == number:
+            return colors
+        number = len(ranks)
+
+
+
+def rename(facts, variables, colors):
+    """
+    Renames variables of facts by their color, and sorts facts.
+
+    inputs: - facts     -> list of tuples of terms
+            - variables -> set of terms that are variables
+            - colors    -> dictionary {variable : distinct color}
+    output: - sorted list of renamed facts
+    """
+    return sorted(set(tuple(f'?{colors[t]}' if t in variables else t for t in f) for f in facts))
+
+
+
+def canonicalLabeling(facts, variables, colors=None, limit=LIMIT):
+    """
+    Computes a canonical labeling of variables.
+
+    inputs: - facts     -> list of tuples of terms (strings)
+            - variables -> set of terms that are variables
+            - colors    -> dictionary {variable : initial color}, colors being comparable (e.g. output rank), default is a single color
+            - limit     -> maximal number of compared labelings
+    output: - dictionary {variable : label}, labels being distinct integers from 0
+    """
+    if not isinstance(facts, list):
+        raise TypeError('The parameter "facts" of canonicalLabeling() must be a list !')
+    variables = set(variables)
+    if colors is None:
+        colors = {}
+    initial = sorted(set(colors.get(v, '') for v in variables), key=str)
+    colors = {v : initial.index(colors.get(v, '')) for v in variables}
+
+    best = None       # (renamed facts, labeling)
+    leaves = 0
+
+    def search(colors):
+        nonlocal best, leaves
+        colors = refine(facts, variables, colors)
+        # smallest class of indistinguishable variables
+        classes = {}
+        for (v, c) in colors.items():
+            classes.setdefault(c, []).append(v)
+        ties = [c for c in sorted(classes) if len(classes[c]) > 1]
+        if not ties:
+            leaves = leaves + 1
+            form = rename(facts, variables, colors)
+            if best is None or form < best[0]:
+                best = (form, colors)
+            return
+        tie = min(ties, key=lambda c: (len(classes[c]), c))
+        for v in sorted(classes[tie]):
+            if leaves >= limit:
+                return
+            # individualize v: it comes first in its class
+            search({w : 2 * c + (0 if w == v or c != tie else 1) for (w, c) in colors.items()})
+
+    search(colors)
+    return best[1]
+
+
+
+# some simple tests
+if __name__ == '__main__':
+    print('----------------------------')
+    print('Test of canonicalLabeling():')
+    print('----------------------------')
+    # two cycles of length 3 written with different names and orders
+    f1 = [('p', '?a', '?b'), ('p', '?b', '?c'), ('p', '?c', '?a')]
+    f2 = [('p', '?z', '?x'), ('p', '?y', '?z'), ('p', '?x', '?y')]
+    l1 = canonicalLabeling(f1, {'?a', '?b', '?c'})
+    l2 = canonicalLabeling(f2, {'?x', '?y', '?z'})
+    print(l1, rename(f1, set(l1), l1))
+    print(l2, rename(f2, set(l2), l2))
+    print('same form:', rename(f1, set(l1), l1) == rename(f2, set(l2), l2))
+    assert rename(f1, set(l1), l1) == rename(f2, set(l2), l2)
+    # a transitive triangle is not a cycle
+    f3 = [('p', '?a', '?b'), ('p', '?b', '?c'), ('p', '?a', '?c')]
+    l3 = canonicalLabeling(f3, {'?a', '?b', '?c'})
+    print('cycle vs transitive triangle:', rename(f1, set(l1), l1) == rename(f3, set(l3), l3))
+    assert rename(f1, set(l1), l1) != rename(f3, set(l3), l3)
+
+    # color refinement alone does not tell two cycles of length 3 from a cycle of length 6
+    def form(facts):
+        variables = set(t for f in facts for t in f if t.startswith('?'))
+        return rename(facts, variables, canonicalLabeling(facts, variables))
+    f4 = [('p', f'?{i}', f'?{(i + 1) % 3}') for i in range(3)] + [('p', f'?{i + 3}', f'?{(i + 1) % 3 + 3}') for i in range(3)]
+    f5 = [('p', f'?{i}', f'?{(i + 1) % 6}') for i in range(6)]
+    f6 = [('p', f'?{(5 * i) % 6}', f'?{(5 * i + 5) % 6}') for i in range(6)]
+    print('two 3-cycles vs a 6-cycle:', form(f4) == form(f5))
+    print('6-cycle renamed:', form(f5) == form(f6))
+    assert form(f4) != form(f5)
+    assert form(f5) == form(f6)
+    # constants and initial colors are kept
+    assert form([('p', '?a', 'c'), ('p', '?b', 'd')]) == form([('p', '?y', 'd'), ('p', '?x', 'c')])
+    assert form([('p', '?a', 'c')]) != form([('p', '?a', 'd')])
+    l7 = canonicalLabeling([('p', '?a', '?b')], {'?a', '?b'}, {'?a' : 1, '?b' : 0})
+    assert l7 == {'?b' : 0, '?a' : 1}
@@ -1,22 +1,31 @@
 #!/usr/bin/python3
 
 import TACQ
-from TACQ import TACQ
+from TACQ import TACQ, Condition, inferTypes
+from homomorphism import FrozenPolicy, TripleIndex, findHomomorphisms
+from orderSolver import isSatisfiable
+from metrics import Metrics
 import argparse
-import constraint
-from constraint import Problem
+from collections import ChainMap
+import contextlib
+import glob
+import io
+import os
 from datetime import datetime
 import re
 # import os
 # os.system("color")
 import math
-from sympy.solvers.diophantine import *
-from sympy import *
+import operator
+
+# Heavy dependencies (RDFlib, python-constraint, sympy) are imported by the
+# stages that need them, so that simple checks start fast.
 
 """
 Comptatibility checking between Privacy and Utility policies
 
-usage: CompatibiltyChecking.py [-h|--help] [-v|--verbose [<levels>]] [-p|--privacy <file>] [-u|--utility <file>]
+usage: CompatibiltyChecking.py [-h|--help] [-v|--verbose [<levels>]] [-p|--privacy <file>] [-u|--utility <file>] [-e|--engine <engine>] [-s|--solver <solver>] [-j|--jobs <N>] [-m|--metrics <file>]
+                               [--cache] [--cache-dir <directory>] [--cache-size <N>]
 
 arguments:
   -h | --help    : Show this help and exit
@@ -29,15 +38,118 @@ arguments:
                     6 -> testing isomorphism with same aggregate and same time windows
                     7 -> testing incompatibility with same aggregate and different time windows
   -p | --privacy : file containing the privacy query, default value is 'privacy.sparql'
+                   (also a directory of .sparql files or a glob pattern, e.g. 'policies/PQ*.sparql')
   -u | --utility : file containing the utility queries, default value is 'utility.sparql'
+                   (also a directory of .sparql files or a glob pattern)
+  -e | --engine  : engine evaluating graph patterns over freezings, 'native' (default) or 'sparql' (RDFlib)
+  -s | --solver  : solver checking filter satisfiability, 'order' (default) or 'csp' (python-constraint)
+  -j | --jobs    : number of processes checking privacy queries in parallel, default value is 1
+  -m | --metrics : file where stage times and counters of the run are written in JSON
+  --cache        : reuse the verdicts of privacy queries while the utility policy, the options and the checker do not
+                   change (cached verdicts are reported without the details of the checks), off by default
+  --cache-dir    : directory of the cache of verdicts (implies --cache), default value is '.verdict-cache' in the
+                   directory of the checker
+  --cache-size   : maximal number of cached verdicts, the least recently used ones being evicted, default value is 10000
 """
 
 
+metrics = Metrics()   # stage times and counters of the run
+
+
+def policyFiles(path):
+    """
+    Lists the policy files designated by a path.
+
+    inputs: - path -> a file, a directory (all its .sparql files) or a glob pattern
+    output: - sorted list of file names
+    """
+    if not isinstance(path, str):
+        raise TypeError('The "path" parameter of policyFiles() must be a string !')
+
+    if os.path.isfile(path):
+        return [path]
+    if os.path.isdir(path):
+        files = glob.glob(os.path.join(glob.escape(path), '*.sparql'))
+    else:
+        files = glob.glob(path)
+    if not files:
+        raise FileNotFoundError(f"No policy file matches '{path}' !")
+    return sorted(files)
+
+
+
+def queryTexts(inputFile):
+    """
+    Splits a policy file into query expressions, reading it line by line.
+    A query ends where the next one starts (at 'SELECT') or at the end of the file.
+
+    inputs: - inputFile -> an open policy file
+    output: - generator of query expressions (strings)
+    """
+    query = None    # pieces of the current query, None before the first SELECT
+    for l in inputFile:
+        pieces = l.split('SELECT')
+        if query is not None:
+            query.append(pieces[0])
+        for p in pieces[1:]:
+            if query is not None:
+                yield ''.join(query)
+            query = ['SELECT', p]
+    # check that there is a SELECT in the file
+    if query is None:
+        raise Exception('No SELECT in the file !')
+    yield ''.join(query)
+
+
+
+@metrics.timed('read')
+def parseNextTACQ(texts):
+    """
+    Reads and parses the next query of a policy file.
+
+    inputs: - texts -> iterator of query expressions (see queryTexts())
+    output: - a TACQ, None at the end of the file
+    """
+    text = next(texts, None)
+    if text is None:
+        return None
+    tacq = TACQ()
+    tacq.parse(text)
+    return tacq
+
+
+
+def iterTACQs(path, prefix):
+    """
+    Extracts queries from policy files, one at a time: each query is yielded as soon as it is parsed,
+    so that it can be checked while the rest of the policy is read.
+
+    inputs: - path -> a file, a directory (all its .sparql files) or a glob pattern
+            - prefix for query names
+    output: - generator of couples (name, TACQ), queries being numbered across files
+    """
+    if not isinstance(path, str):
+        raise TypeError('The "path" parameter of iterTACQs() must be a string !')
+    if not isinstance(prefix, str):
+        raise TypeError('The "prefix" parameter of iterTACQs() must be a string !')
+
+    qNum = 1
+    for file in policyFiles(path):
+        with open(file) as inputFile:
+            texts = queryTexts(inputFile)
+            tacq = parseNextTACQ(texts)
+            while tacq is not None:
+                yield (prefix + str(qNum), tacq)
+                qNum = qNum + 1
+                tacq = parseNextTACQ(texts)
+
+
+
 def readTACQs(file, prefix):
     """
     Extracts queries from a file.
 
-    inputs: - file name
+    inputs: - file name (or directory, or glob pattern, see iterTACQs())
             - prefix for query names
     output: - dictionary of numbered TACQs
     """
@@ -46,98 +158,160 @@ def readTACQs(file, prefix):
     if not isinstance(prefix, str):
         raise TypeError('The "prefix" parameter of reqdQueries() must be a string !')
 
-    queries = []
-    TACQs = {}
-    qNum = 1
-    
-    # read the file
-    inputFile = open(file)
-    lines = inputFile.readlines()
-    # convert it into a string (easier to split)
-    content = ''
-    for l in lines:
-        content = content + ' ' + l
-    # check that there is a SELECT in the file
-    first = content.find('SELECT')
-    if first == -1:
-        raise Exception('No SELECT in the file !')
-    rest = content[first:]
-    queries = rest.split('SELECT')
-    # remove empty queries
-    while '' in queries:
-        queries.remove('')
-    # convert queries into TACQs
-    for q in queries:
-        q = 'SELECT' + str(q)
-        tacq = TACQ()
-        tacq.parse(q)
-        TACQs[prefix + str(qNum)] = tacq
-        qNum = qNum + 1
-    return TACQs
-
+    return dict(iterTACQs(file, prefix))
 
 
-def checkGraphPatternOverlap(PQ, unionUQs):
+@metrics.timed('overlap')
+def checkGraphPatternOverlap(PQ, unionUQs, engine=None, full=False):
     """
     Check inclusion of the graph pattern of GP into the one of unionUQs.
+    The result lines that cannot make PQ incompatible are pruned by the match, unless all the lines are needed
+    by the filter check: they are then enumerated once, and the other lines are selected among them.
 
     Verbose level: 3
 
     inputs: - PQ  : a privacy TACQ
-            - unionUQs : a utility TACQ
-    output: - a dictionnary { compatible, reasons } where:
+            - unionUQs : a utility TACQ, or its FrozenPolicy
+            - engine : 'native' (indexed homomorphism search) or 'sparql' (RDFlib), default is the command line choice
+            - full : if True, all the result lines are enumerated, for the filter check
+    output: - a dictionnary { compatible, reasons, results } where:
                 - compatible is a boolean
-                - reasons is a dictionary associating line numbers to a list plainations if cas of incompatibility
+                - reasons is a dictionary associating line numbers to a list plainations if cas of incompatibility,
+                  lines being numbered in the printed result (all the lines if full is True)
+                - results is the list of all result lines if full is True, None otherwise
     """
     if not isinstance(PQ, TACQ):
         raise TypeError('The parapeter "PQ" must be a rewritten privacy TACQ !')
-    if not isinstance(unionUQs, TACQ):
+    if not isinstance(unionUQs, (TACQ, FrozenPolicy)):
         raise TypeError('The parameter "UQs" must be the TACQ containing the union of Utility graph patterns !')
+    if engine is None:
+        engine = mainArgs.engine
+    if not engine in ['native', 'sparql']:
+        raise ValueError(f"Unknown graph pattern engine '{engine}' !")
 
-    # Freeze union of graph patterns
-    freezing = unionUQs.freeze()
+    vars = PQ.listGPVars(timestamps=False).split()
 
-    #-----------------------#
-    vprint(3,'   ------------------------------------------')
-    vprint(3,'   Most general freezing of the union of UQs:')
-    vprint(3,'   ------------------------------------------')
-    vprint(3,freezing.serialize(format="turtle"))
-    #-----------------------#
+    # lines mapping an output variable to a non output constant, or a join to different constants that are not
+    # both output constants, cannot make PQ incompatible (Theorem 4.1 and 4.3): the match prunes them
+    # lines using a subsumed utility query are not needed either, each one being mapped to a line as valid using the
+    # utility query subsuming it (see findSubsumedUtilityQueries()): the match skips their triples
+    outputs = [v for v in vars if v[1] == 'o']
 
-    if '3' in mainArgs.verbose:
-        unionUQs.printConstants()
-        print()
+    def valid(line):
+        if any(str(line[vars.index(v)])[0] != 'o' for v in outputs):
+            return False
+        for (l, r) in PQ.joins:
+            vl = str(line[vars.index(l)])
+            vr = str(line[vars.index(r)])
+            if vl != vr and (vl[0] != 'o' or vr[0] != 'o'):
+                return False
+        return True
+
+    # Freeze union of graph patterns (unless already done)
+    if isinstance(unionUQs, FrozenPolicy):
+        frozen = unionUQs
+    else:
+        frozen = FrozenPolicy(unionUQs)
+
+    # native engine: homomorphisms of the PQ graph pattern into the indexed freezing
+    if engine == 'native':
+        #-----------------------#
+        vprint(3,'   ------------------------------------------')
+        vprint(3,'   Most general freezing of the union of UQs:')
+        vprint(3,'   ------------------------------------------')
+        for (s, p, o) in frozen.triples:
+            vprint(3,f"{s} {p} {o} .")
+        vprint(3)
+        #-----------------------#
+
+        if '3' in mainArgs.verbose:
+            frozen.query.printConstants()
+            print()
+
+        pattern = [(p.subject, p.predicate, p.object) for p in PQ.gp]
 
-    # Execute PQ on the freezing
-    query = 'PREFIX res:<http://example.org/>\n'
-    query = query + 'SELECT ' + PQ.listGPVars(timestamps=False) + '\n'
-    query = query + 'WHERE { '
-    for p in PQ.gp:
-        query = query + p['subject'] + ' '
-        query = query + 'ns1' + p['predicate'] + ' '
-        if p['object'][0] != '?':
-            query = query + '"' + p['object'] + '" . '
+        #-----------------------#
+        vprint(3,'   -------------------------------------------------------------------------------------')
+        vprint(3,'   Homomorphisms into the freezing of the plain conjunctive part of the privacy query:')
+        vprint(3,'   -------------------------------------------------------------------------------------')
+        vprint(3,'\033[1;37mPattern:\033[0m')
+        vprint(3,PQ.toString('w')[8:-2])
+        vprint(3)
+        #-----------------------#
 
+        if full:
+            lines = findHomomorphisms(pattern, frozen.index, vars)
+            stats = None
         else:
-            query = query + p['object'] + ' . '
-    query = query[:-3] + ' }'
+            stats = {}
+            lines = findHomomorphisms(pattern, frozen.overlap, vars, outputs, PQ.joins, stats)
+            metrics.count('overlapPruned', stats['pruned'])
 
-    #-----------------------#
-    vprint(3,'   ------------------------------------------------------------------------------------')
-    vprint(3,'   SparQL execution on the freezing of the plain conjunctive part of the privacy query:')
-    vprint(3,'   ------------------------------------------------------------------------------------')
-    vprint(3,'\033[1;37mQuery:\033[0m')
-    vprint(3,query)
-    vprint(3)
-    #-----------------------#
+    # sparql engine: RDFlib query over the freezing
+    else:
+        freezing = frozen.graph()
 
-    result = freezing.query(query)
+        #-----------------------#
+        vprint(3,'   ------------------------------------------')
+        vprint(3,'   Most general freezing of the union of UQs:')
+        vprint(3,'   ------------------------------------------')
+        vprint(3,freezing.serialize(format="turtle"))
+        #-----------------------#
+
+        if '3' in mainArgs.verbose:
+            frozen.query.printConstants()
+            print()
+
+        # Execute PQ on the freezing
+        query = 'PREFIX res:<http://example.org/>\n'
+        query = query + 'SELECT ' + PQ.listGPVars(timestamps=False) + '\n'
+        query = query + 'WHERE { '
+        for p in PQ.gp:
+            query = query + p.subject + ' '
+            query = query + 'ns1' + p.predicate + ' '
+            if p.object[0] != '?':
+                query = query + '"' + p.object + '" . '
+
+            else:
+                query = query + p.object + ' . '
+        query = query[:-3]
+        allQuery = query + ' }'
+
+        # pruned lines, unless all the lines are needed
+        if full:
+            query = allQuery
+        for v in (outputs if not full else []):
+            query = query + f' . FILTER(STRSTARTS(STR({v}), "o"))'
+        for (l, r) in (PQ.joins if not full else []):
+            query = query + f' . FILTER({l} = {r} || (STRSTARTS(STR({l}), "o") && STRSTARTS(STR({r}), "o")))'
+        if not full:
+            query = query + ' }'
+
+        #-----------------------#
+        vprint(3,'   ------------------------------------------------------------------------------------')
+        vprint(3,'   SparQL execution on the freezing of the plain conjunctive part of the privacy query:')
+        vprint(3,'   ------------------------------------------------------------------------------------')
+        vprint(3,'\033[1;37mQuery:\033[0m')
+        vprint(3,query)
+        vprint(3)
+        #-----------------------#
+
+        if full:
+            lines = list(freezing.query(query))
+        else:
+            lines = frozen.graph(overlap=True).query(query)
+        stats = None
 
-    vars = PQ.listGPVars(timestamps=False).split()
     vprint(3,'\033[1;37mResults:\033[0m')
     if '3' in mainArgs.verbose:
-        printQueryResults(result, vars)
+        printQueryResults(lines, vars)
         print()
+    if frozen.skipped and not full:
+        vprint(3,f"{frozen.skipped} triple(s) of subsumed utility queries left out of the search.")
+        vprint(3)
+    if stats is not None:
+        vprint(3,f"{stats['pruned']} partial mapping(s) pruned by the output variables and the join conditions.")
+        vprint(3)
 
     if PQ.joins:
         vprint(3,f"Checking {PQ.prefix} join conditions for each line of the result by equating output constants:")
@@ -148,88 +322,185 @@ def checkGraphPatternOverlap(PQ, unionUQs):
     # Check Theorem 4.1 and 4.3
     #
 
+    # every valid line maps output variables to output constants, and join variables to the same constant
+    # or to output constants that have to be equal (lines are numbered as in the printed result)
     compatible = True
     reasons = {}
-    Reasons = []
-    # for each line of the query result
-    lineNb = 1
-    for line in result:
-        # suppose it is not compatible
-        comp = False
-        reason = {}
-        # test output variables: if no full PQ result can be obtained => comptaible
-        for v in range(len(vars)):
-            if vars[v][1] == 'o' and line[v][0] != 'o':
-                comp = True
-
-        # test all join conditions
-        if not(comp):
-            res = []
-            for (l,r) in PQ.joins:
-                #left var
-                il = vars.index(l)
-                vl = line[il]
-                # right var
-                ir = vars.index(r)
-                vr = line[ir]
-                # test join: different value and one is not an output value => compatible
-                if (vl[0] != 'o' or vr[0] != 'o') and (vl != vr):
-                    comp = True
-                elif not(comp) and vl != vr:
-                    if not lineNb in reason.keys(): 
-                        reason[lineNb] = [(vl, vr)]
-                    elif not (vl, vr) in reason[lineNb]:
-                        reason[lineNb].append((vl, vr))
-            if not(comp):
-                reasons.update(reason.copy())
-
-        Reasons = []
-
-        if not PQ.joins:
-            Reasons.append(f"The freezing returns results for {PQ.prefix}")
-        for r in reasons.keys():
-            cond = ''
-            for (v1, v2) in reasons[r]:
-                cond = cond + f"{v1} == {v2} and "
-            Reasons.append(f"A freezing where {cond[:-5]} returns results for {PQ.prefix} in line {str(r)}")
-
-        # conclusion
-        if not comp:
-            compatible = False
+    lineNb = 0
+    rows = 0
+    for line in lines:
         lineNb = lineNb + 1
+        if full and not valid(line):
+            continue
+        rows = rows + 1
+        compatible = False
+        for (l,r) in PQ.joins:
+            vl = line[vars.index(l)]
+            vr = line[vars.index(r)]
+            if vl != vr:
+                reasons.setdefault(lineNb, [])
+                if not (vl, vr) in reasons[lineNb]:
+                    reasons[lineNb].append((vl, vr))
+
+    Reasons = []
+    if rows and not PQ.joins:
+        Reasons.append(f"The freezing returns results for {PQ.prefix}")
+    for r in reasons.keys():
+        cond = ''
+        for (v1, v2) in reasons[r]:
+            cond = cond + f"{v1} == {v2} and "
+        Reasons.append(f"A freezing where {cond[:-5]} returns results for {PQ.prefix} in line {str(r)}")
+
+    metrics.count('overlapRows', rows)
+
+    return {'compatible' : compatible, 'reasons' : Reasons, 'results' : lines if full else None}
+
+COMPARATORS = {'==' : operator.eq, '!=' : operator.ne, '<' : operator.lt, '<=' : operator.le, '>' : operator.gt, '>=' : operator.ge}
+
+
+def lineTypes(Q, filter, baseTypes, uqTypes, uqReads):
+    """
+    Types the variables of the rewritten conditions of a result line, as TACQ.typeVars() would do on the whole union
+    of PQ and UQs: first ?timeWindowEnd, timestamps (in baseTypes), then PQ conditions, UQ conditions and joins.
+    UQ conditions are typed once (in uqTypes): when PQ conditions give no type to a variable read by a UQ condition
+    between variables, typing UQ conditions again would give the same types.
+
+    inputs: - Q         -> overlay of the result line (rewritten filter and joins, variables of the line)
+            - filter    -> rewritten PQ conditions
+            - baseTypes -> types of the union of PQ and UQs, with timestamps
+            - uqTypes   -> types given by UQ conditions to baseTypes
+            - uqReads   -> variables of UQ conditions between variables
+    output: - a couple (types, changed) where:
+                - types is a mapping {var : type} (a ChainMap over the shared types)
+                - changed is the set of variables whose type may differ from uqTypes over baseTypes
+    """
+    pqTypes = {}
+    for (n, o) in Q.variables.items():
+        if str(o) == '?timeWindowEnd':
+            pqTypes[n] = datetime
+    inferTypes(ChainMap(pqTypes, baseTypes), filter)
+
+    if uqReads.isdisjoint(pqTypes):
+        types = ChainMap({}, uqTypes, pqTypes, baseTypes)
+        inferTypes(types, [], Q.joins)
+        changed = set(types.maps[0]) | set(pqTypes)
+    else:
+        types = ChainMap(pqTypes, baseTypes)
+        inferTypes(types, Q.filter[len(filter):], Q.joins)
+        changed = set(pqTypes) | set(uqTypes)
+    return (types, changed)
+
+
+
+templates = {}   # numbers of the templates of shared conditions {template : number}, see conditionTemplate()
+
+
+def conditionTemplate(conditions, types):
+    """
+    Numbers the variables of the conditions shared by all result lines (the UQ conditions),
+    variables being numbered in order of appearance.
+
+    inputs: - conditions -> list of Conditions
+            - types      -> mapping {var : type} of their variables
+    output: - a dictionary {numbers, defaults, template} where:
+                - numbers is a dictionary {var : number}
+                - defaults is a dictionary {var : type name}
+                - template is the number of the conditions (up to variable names) and types in the run
+    """
+    numbers = {}
+
+    def term(t):
+        if isinstance(t, str) and t[0] == '?':
+            return ('u', numbers.setdefault(t, len(numbers)))
+        return repr(t)
+
+    template = tuple((term(f.opl), f.comp, term(f.opr)) for f in conditions)
+    defaults = {v : str(types.get(v, 'unknown')) for v in numbers}
+    template = (template, tuple(defaults.values()))
+    return {'numbers' : numbers, 'defaults' : defaults, 'template' : templates.setdefault(template, len(templates))}
+
+
+
+def constraintSignature(Q, filter, shared, changed):
+    """
+    Computes the signature of the rewritten filter and join conditions of Q: the conditions shared by all lines are
+    given by their template, other variables are numbered in order of appearance and given with their type,
+    constants are given with their type, and so are shared variables whose type differs from the template.
+    Conditions with the same signature are equal up to variable names, so they are equally satisfiable.
+
+    inputs: - Q       -> union of PQ and UQs whose filter and joins are rewritten for one result line
+            - filter  -> rewritten PQ conditions (Q.filter being followed by the shared conditions)
+            - shared  -> template of the shared conditions (see conditionTemplate())
+            - changed -> variables whose type may differ from the template
+    output: - a tuple
+    """
+    numbers = {}
+    sharedNumbers = shared['numbers']
 
-    return {'compatible' : compatible, 'reasons' : Reasons, 'results' : result}
+    def term(t):
+        if isinstance(t, str) and t[0] == '?':
+            if t in sharedNumbers:
+                return ('u', sharedNumbers[t])
+            if not t in numbers:
+                numbers[t] = len(numbers)
+            return (numbers[t], str(Q.varTypes.get(t, 'unknown')))
+        return repr(t)
 
-filterExp = ""
+    signature = [(term(f.opl), f.comp, term(f.opr)) for f in filter]
+    signature.extend((term(i), 'join', term(j)) for (i, j) in Q.joins)
+    types = []
+    for v in changed:
+        if v in sharedNumbers:
+            t = str(Q.varTypes.get(v, 'unknown'))
+            if t != shared['defaults'][v]:
+                types.append((sharedNumbers[v], t))
+    return (shared['template'], tuple(signature), tuple(sorted(types)))
 
 
-def condition(v1=0,  v2=0,  v3=0,  v4=0,  v5=0,  v6=0,  v7=0,  v8=0,  v9=0,  v10=0, 
-              v11=0, v12=0, v13=0, v14=0, v15=0, v16=0, v17=0, v18=0, v19=0, v20=0, 
-              v21=0, v22=0, v23=0, v24=0, v25=0, v26=0, v27=0, v28=0, v29=0, v30=0, 
-              v31=0, v32=0, v33=0, v34=0, v35=0, v36=0, v37=0, v38=0, v39=0, v40=0, 
-              v41=0, v42=0, v43=0, v44=0, v45=0, v46=0, v47=0, v48=0, v49=0, v50=0, 
-              v51=0, v52=0, v53=0, v54=0, v55=0, v56=0, v57=0, v58=0, v59=0, v60=0, 
-              v61=0, v62=0, v63=0, v64=0, v65=0, v66=0, v67=0, v68=0, v69=0, v70=0, 
-              v71=0, v72=0, v73=0, v74=0, v75=0, v76=0, v77=0, v78=0, v79=0, v80=0, 
-              v81=0, v82=0, v83=0, v84=0, v85=0, v86=0, v87=0, v88=0, v89=0, v90=0, 
-              v91=0, v92=0, v93=0, v94=0, v95=0, v96=0, v97=0, v98=0, v99=0, v100=0):
+
+satisfiabilityMemo = {}   # satisfiability of solved conditions {(solver, signature) : boolean}, see constraintSignature()
+
+MEMO_SIZE = 100000        # maximal number of memoized satisfiability results
+
+
+def lineClass(line, free):
     """
-    Condition function for testing satisfiability
+    Computes the equivalence class of a result line for the filter check. Free constants (see
+    checkFilterConjunctionSatisfiability()) are interchangeable: they are replaced by their number of
+    first occurrence in the line and their kind, so that lines differing only by free constants of
+    the same kind have the same class, and the same rewritten conditions up to variable names.
+
+    inputs: - line -> a result line (tuple of constants)
+            - free -> dictionary of free constants {constant : kind}
+    output: - a tuple
     """
-    global filterExp
-    return eval(filterExp)
+    numbers = {}
+    res = []
+    for cst in line:
+        cst = str(cst)
+        if cst in free:
+            if not cst in numbers:
+                numbers[cst] = (len(numbers), free[cst])
+            res.append(numbers[cst])
+        else:
+            res.append(cst)
+    return tuple(res)
 
 
 
-def checkFilterConjunctionSatisfiability(PQ, unionUQs, results):
+@metrics.timed('filter')
+def checkFilterConjunctionSatisfiability(PQ, unionUQs, results, solver=None):
     """
     Checks the satisfiability of the conjunction of filter conditions of PQ and unionUQs according to the result of PQ over the most general freezing of unionUQs.
+    Constants of the freezing whose variable is in no condition nor join are free: result lines differing
+    only by free constants are in the same class (see lineClass()), and only the first line of each class is checked.
 
     Verbose level: 4
 
     inputs: - PQ       -> a privacy query to check
-            - unionUQs -> union of utility queries GP, Filters and Joins
+            - unionUQs -> union of utility queries GP, Filters and Joins, or its FrozenPolicy
             - results  -> result of PQ evaluated on the most general freezing of unionQUs
+            - solver   -> 'order' (order constraint solver) or 'csp' (python-constraint), default is the command line choice
     output: -  a dictionnary { compatible, reasons } where:
                 - compatible is a boolean
                 - reasons is a list of result line numbers where filter satisfiability has been detected
@@ -238,15 +509,22 @@ def checkFilterConjunctionSatisfiability(PQ, unionUQs, results):
                     - mapping -> mappings of PQ variables to unionUQs variables
     """
 
-    global filterExp
+    if solver is None:
+        solver = mainArgs.solver
+    if not solver in ['order', 'csp']:
+        raise ValueError(f"Unknown filter solver '{solver}' !")
+
     reasons = []
     mappings = {}
 
-    # freeze unionQUs
-    unionUQs.freeze()
+    # freeze unionQUs (unless already done)
+    if isinstance(unionUQs, FrozenPolicy):
+        frozen = unionUQs
+    else:
+        frozen = FrozenPolicy(unionUQs)
 
     # compute union of PQ and UQs (GPs, filters and joins)
-    bigQ = PQ.union(unionUQs)
+    bigQ = PQ.union(frozen.query)
 
     #-----------------------#
     if '4' in mainArgs.verbose:
@@ -261,6 +539,35 @@ def checkFilterConjunctionSatisfiability(PQ, unionUQs, results):
     lnb = 0
     vars = PQ.listGPVars(timestamps=False).split()
 
+    # parts of bigQ shared by all result lines: UQ conditions are not renamed, and they are typed once
+    pqFilter = bigQ.filter[:len(PQ.filter)]
+    uqFilter = bigQ.filter[len(PQ.filter):]
+    pqJoins = bigQ.joins[:len(PQ.joins)]
+    uqJoins = set(bigQ.joins[len(PQ.joins):])
+    baseTypes = bigQ.varTypes.copy()
+    for t in bigQ.gp:
+        if t.timestamp[0] == '?':
+            baseTypes[t.timestamp] = datetime
+    uqTypes = {}
+    inferTypes(ChainMap(uqTypes, baseTypes), uqFilter)
+    uqReads = set()
+    for f in uqFilter:
+        if isinstance(f.opl, str) and f.opl[0] == '?' and isinstance(f.opr, str) and f.opr[0] == '?':
+            uqReads.update([f.opl, f.opr])
+    shared = conditionTemplate(uqFilter, ChainMap(uqTypes, baseTypes))
+
+    # free constants, by kind (type and output variable or not)
+    constrained = set(v for (l, r) in list(uqJoins) + pqJoins for v in (l, r))
+    for f in bigQ.filter:
+        for v in (f.opl, f.opr):
+            if isinstance(v, str) and v[0] == '?':
+                constrained.add(v)
+    free = {}
+    for (cst, var) in bigQ.constVars.items():
+        if not var in constrained and var != '?timeWindowEnd':
+            free[cst] = (baseTypes.get(var), var[1] == 'o')
+    classes = {}   # satisfiability of the checked classes of lines {class : (line number, satisfiable)}
+
     #-----------------------#
     vprint(4,'   ============================================================================================================================')
     vprint(4,'   Verifying the filter expression over each answer of privacy query over the most general freezing of union of utility queries')
@@ -285,6 +592,7 @@ def checkFilterConjunctionSatisfiability(PQ, unionUQs, results):
 
     for line in results:
         lnb = lnb + 1
+        metrics.count('filterLines')
 
         #-----------------------#
         if '9' in mainArgs.verbose:
@@ -296,28 +604,39 @@ def checkFilterConjunctionSatisfiability(PQ, unionUQs, results):
             print()
         #-----------------------#
 
-        filterExp = ""
-        problem = Problem()
-
-        # work on Q, a copy of bigQ
-        global Q
-        Q = bigQ.copy()
-         
         # parse given result to build overlap
 
         ## build variable correspondance
-        Q.variables = {}
+        variables = {}
 
         ### for each var in PQ GP
         for v in range(len(vars)):
             # get corresponding constant un result line
             cst = str(line[v])
 
-            # find corresponding variable name in UQs
-            for (i,j) in Q.constants.items():
-                if j == cst:
-                    # rename PQ variable in Q
-                   Q.variables[vars[v]] = i
+            # find corresponding variable name in UQs, and rename PQ variable
+            if cst in bigQ.constVars:
+                variables[vars[v]] = bigQ.constVars[cst]
+
+        # lines of a checked class have the same result
+        lineKey = lineClass(line, free)
+        if lineKey in classes:
+            (first, res) = classes[lineKey]
+            metrics.count('filterClassHits')
+            #-----------------------#
+            vprint(4,f"   Result line {lnb} is in the class of line {first}.")
+            vprint(4)
+            #-----------------------#
+            if res:
+                compatible = False
+                reasons.append(lnb)
+                mappings.update({ lnb : variables })
+            continue
+
+        # work on Q, an overlay of bigQ holding the rewritten filter and joins of the line
+        global Q
+        Q = TACQ()
+        Q.variables = variables
         
         #-----------------------#
         if '9' in mainArgs.verbose:
@@ -328,38 +647,23 @@ def checkFilterConjunctionSatisfiability(PQ, unionUQs, results):
             print()
         #-----------------------#
 
-        ## rename variables in filter
-        for f in range(len(Q.filter)):
-            try:
-                opl = Q.variables[str(Q.filter[f]['opl'])]
-            except KeyError:
-                opl = Q.filter[f]['opl']
-            comp = Q.filter[f]['comp']
-            try:
-                opr = Q.variables[str(Q.filter[f]['opr'])]
-            except KeyError:
-                opr = Q.filter[f]['opr']
-            Q.filter[f] = {'opl' : opl, 'comp' : comp, 'opr' : opr}
-
-        ## rename variables in joins
-        toDel = []
-        for n in range(len(Q.joins)):
-            (i,j) = Q.joins[n]
-            try:
-                i = Q.variables[i]
-            except KeyError:
-                pass
-            try:
-                j = Q.variables[j]
-            except KeyError:
-                pass
-            if not (i,j) in Q.joins and i != j:
-                Q.joins[n] = (i,j)
-            else:
-                toDel.append(n)
-        for n in reversed(toDel):
-            del Q.joins[n]
-
+        ## rename variables in filter (only PQ conditions have PQ variables)
+        filter = []
+        for f in pqFilter:
+            filter.append(Condition(Q.variables.get(str(f.opl), f.opl), f.comp, Q.variables.get(str(f.opr), f.opr)))
+        Q.filter = filter + uqFilter
+
+        ## rename variables in joins: joins left unchanged (as UQ ones) or already present are removed
+        joins = pqJoins.copy()
+        kept = []
+        for n in range(len(joins)):
+            (i,j) = joins[n]
+            i = Q.variables.get(i, i)
+            j = Q.variables.get(j, j)
+            if not (i,j) in joins and not (i,j) in uqJoins and i != j:
+                joins[n] = (i,j)
+                kept.append(n)
+        Q.joins = [joins[n] for n in kept]
 
         #-----------------------#
         if '4' in mainArgs.verbose:
@@ -371,351 +675,26 @@ def checkFilterConjunctionSatisfiability(PQ, unionUQs, results):
         #-----------------------#
         
         # set types for UQ variables
-        Q.typeVars()
+        (Q.varTypes, changed) = lineTypes(Q, filter, baseTypes, uqTypes, uqReads)
 
-        #-----------------------#
-        if '4' in mainArgs.verbose:
-            print('   =================================================')
-            print('   Using a CSP solver to check Filter satisfiability')
-            print('   =================================================')
-            print()
-        #-----------------------#
-
-        ## prepare variable domains generation
-        intVars = []
-        strVars = []
-        floatVars = []
-        dateVars = []
-        unknownVars = []
-
-        intConst = []
-        strConst = []
-        floatConst = []
-        dateConst = []
-
-        ## list variables and constants by type in filter
-        for f in Q.filter:
-            # opl is a variable
-            if isinstance(f['opl'], str) and f['opl'][0] == '?':
-                if str(Q.varTypes[f['opl']]) == "<class 'int'>":
-                    intVars.append(f['opl'])
-                if str(Q.varTypes[f['opl']]) == "<class 'str'>":
-                    strVars.append(f['opl'])
-                if str(Q.varTypes[f['opl']]) == "<class 'float'>":
-                    floatVars.append(f['opl'])
-                if str(Q.varTypes[f['opl']]) == "<class 'datetime.datetime'>" or str(Q.varTypes[f['opl']]) == "<class 'datetime'>":
-                    dateVars.append(f['opl'])
-                if str(Q.varTypes[f['opl']]) == 'unknown':
-                    unknownVars.append(f['opl'])
-            
-            # opl is a constant
-            else:
-                if isinstance(f['opl'], int):
-                    intConst.append(f['opl'])
-                elif isinstance(f['opl'], str):
-                    strConst.append(f['opl'])
-                elif isinstance(f['opl'], float):
-                    floatConst.append(f['opl'])
-                elif isinstance(f['opl'], datetime):
-                    dateConst.append(f['opl'])
-
-            # opr is a variable
-            if isinstance(f['opr'], str) and f['opr'][0] == '?':
-                if str(Q.varTypes[f['opr']]) == "<class 'int'>":
-                    intVars.append(f['opr'])
-                if str(Q.varTypes[f['opr']]) == "<class 'str'>":
-                    strVars.append(f['opr'])
-                if str(Q.varTypes[f['opr']]) == "<class 'float'>":
-                    floatVars.append(f['opr'])
-                if str(Q.varTypes[f['opl']]) == "<class 'datetime.datetime'>" or str(Q.varTypes[f['opl']]) == "<class 'datetime'>":
-                    dateVars.append(f['opr'])
-                if str(Q.varTypes[f['opr']]) == 'unknown':
-                    unknownVars.append(f['opr'])
-
-            # opr is a constant
-            else:
-                if isinstance(f['opr'], int):
-                    intConst.append(f['opr'])
-                elif isinstance(f['opr'], str):
-                    strConst.append(f['opr'])
-                elif isinstance(f['opr'], float):
-                    floatConst.append(f['opr'])
-                elif isinstance(f['opr'], datetime):
-                    dateConst.append(f['opr'])
-
-
-        # list variables by type in joins
-        for n in range(len(Q.joins)):
-            (i, j) = Q.joins[n]
-            # Left variable i
-            if str(Q.varTypes[i]) == "<class 'int'>":
-                intVars.append(i)
-            elif str(Q.varTypes[i]) == "<class 'str'>":
-                strVars.append(i)
-            elif str(Q.varTypes[i]) == "<class 'float'>":
-                floatVars.append(i)
-            elif str(Q.varTypes[i]) == "<class 'datetime.datetime'>" or str(Q.varTypes[i]) == "<class 'datetime'>":
-                dateVars.append(i)
-            else:
-                unknownVars.append(i)
-
-            # right variable j
-            if str(Q.varTypes[j]) == "<class 'int'>":
-                intVars.append(j)
-            elif str(Q.varTypes[j]) == "<class 'str'>":
-                strVars.append(j)
-            elif str(Q.varTypes[j]) == "<class 'float'>":
-                floatVars.append(j)
-            elif str(Q.varTypes[i]) == "<class 'datetime.datetime'>" or str(Q.varTypes[i]) == "<class 'datetime'>":
-                dateVars.append(j)
-            else:
-                unknownVars.append(j)
-
-
-        # elimiate duplicates in lists and sort them
-        intVars = list(set(intVars))
-        strVars = list(set(strVars))
-        floatVars = list(set(floatVars))
-        dateVars = list(set(dateVars))
-        unknownVars = list(set(unknownVars))
-
-        intConst = sorted(list(set(intConst)))
-        strConst = sorted(list(set(strConst)))
-        floatConst = sorted(list(set(floatConst)))
-        dateConst = sorted(list(set(dateConst)))
-
-
-        # generate domains for constants and variables 
-        intDomain = []
-        strDomain = []
-        floatDomain = []
-        dateDomain = []
-        unknownDomain = []
-        constants = {}
-
-        end = 0
-        begin = end
-
-        ## integer
-        pos = begin
-        for i in intConst:
-            constants[i] = pos + len(intVars)
-            pos = pos + len(intVars) + 1
-        if pos != begin:
-            end = pos + len(intVars)
-            intDomain = range(begin, end)
-            begin = end + 1
-
-        ## str
-        pos = begin
-        for i in strConst:
-            constants[i] = pos + len(strVars)
-            pos = pos + len(strVars) + 1
-        if pos != begin:
-            end = pos + len(strVars)
-            strDomain = range(begin, end)
-            begin = end + 1
-
-        ## float
-        pos = begin
-        for i in floatConst:
-            constants[i] = pos + len(floatVars)
-            pos = pos + len(floatVars) + 1
-        if pos != begin:
-            end = pos + len(floatVars)
-            floatDomain = range(begin, end)
-            begin = end + 1
-
-        ## date
-        pos = begin
-        for i in dateConst:
-            constants[i] = pos + len(dateVars)
-            pos = pos + len(dateVars) + 1
-        if pos != begin:
-            end = pos + len(dateVars)
-            dateDomain = range(begin, end)
-            begin = end + 1
-
-        ## unknown variables
-        pos = begin
-        end = begin + 2*len(unknownVars) + 1
-        unknownDomain = range(begin, end)
-
-        #-----------------------#
-        if '9' in mainArgs.verbose:
-            print("------------------")
-            print("Constants encoding")
-            print("------------------")
-            for (i,j) in constants.items():
-                print(i, "->", j)
-            print()
-
-            print("---------------------")
-            print("Variables and domains")
-            print("---------------------")
-            if intVars:
-                print("int variables    :", intVars)
-                print("    domain       :", intDomain)
-            if strVars:
-                print("str variables    :", strVars)
-                print("    domain       :", strDomain)
-            if floatVars:
-                print("float variables  :", floatVars)
-                print("      domain     :", floatDomain)
-            if dateVars:
-                print("date variables   :", dateVars)
-                print("     domain      :", dateDomain)
-            if unknownVars:
-                print("unknown variables:", unknownVars)
-                print("        domain   :", unknownDomain)
-            print()
-        #-----------------------#
-        
-        # generate filter expression
-        for f in Q.filter:
-            if f['comp'].strip() == '=':
-                comp = '=='
-            else:
-                comp = f['comp']
-
-            if str(f['opl'])[0] == '?':
-                opl = f['opl']
-            else:
-                opl = constants[f['opl']]
-
-            if str(f['opr'])[0] == '?':
-                opr = f['opr']
+        # Test satisfiability, unless the same conditions (up to variable names) were already solved
+        signature = (solver, constraintSignature(Q, filter, shared, changed))
+        if signature in satisfiabilityMemo:
+            res = satisfiabilityMemo[signature]
+            metrics.count('satisfiabilityHits')
+            #-----------------------#
+            vprint(4,"   Same conditions as a previous line (up to variable names).")
+            #-----------------------#
+        else:
+            if solver == 'order':
+                res = checkOrderSatisfiability(Q)
             else:
-                opr = constants[f['opr']]
-            filterExp = filterExp + f"{str(opl)} {comp} {str(opr)} and "
-        for (i,j) in Q.joins:
-            if i != j:
-                filterExp = filterExp + f"{i} == {j} and "
-        filterExp = filterExp[:-5]
-
-
-        # rename variables in filter expression
-        filterVariables = {}
-
-        n = 1
-        exp = filterExp.split()
-
-        #-----------------------#
-        vprint(9)
-        vprint(9,"   ------------------------------")
-        vprint(9,"   Expression to be tested by CSP")
-        vprint(9,"   ------------------------------")
-        #-----------------------#
-
-        for pos in range(len(exp)):
-            if exp[pos][0] == '?':
-                var = ''
-                for (i,j) in filterVariables.items():
-                    if j == exp[pos]:
-                        exp[pos] = i
-                        var = i
-                if var == '':
-                    var = f"v{n}"
-                    filterVariables[var] = str(exp[pos])
-                    exp[pos] = var
-                    n = n + 1
-
-        
-        # test filter
-        ## int variables
-        for v in intVars:
-            var = v
-            for (i,j) in Q.variables.items():
-                if i == v:
-                    var = j
-            for (i,j) in filterVariables.items():
-                if j == var:
-                    try:
-                        problem.addVariable(i, intDomain)
-                        #-----------------------#
-                        vprint(9,i, "int :", intDomain)
-                        #-----------------------#
-                    except ValueError:
-                        pass
-
-        ## str variables
-        for v in strVars:
-            var = v
-            for (i,j) in Q.variables.items():
-                if i == v:
-                    var = j
-            for (i,j) in filterVariables.items():
-                if j == var:
-                    try:
-                        problem.addVariable(i, strDomain)
-                        #-----------------------#
-                        vprint(9,i, "str :", strDomain)
-                        #-----------------------#
-                    except ValueError:
-                        pass
-
-        ## float variables
-        for v in floatVars:
-            var = v
-            for (i,j) in Q.variables.items():
-                if i == v:
-                    var = j
-            for (i,j) in filterVariables.items():
-                if j == var:
-                    try:
-                        problem.addVariable(i, floatDomain)
-                        #-----------------------#
-                        vprint(9,i, "float :", floatDomain)
-                        #-----------------------#
-                    except ValueError:
-                        pass
-
-        ## date variables
-        for v in dateVars:
-            var = v
-            for (i,j) in Q.variables.items():
-                if i == v:
-                    var = j
-            for (i,j) in filterVariables.items():
-                if j == var:
-                    try:
-                        problem.addVariable(i, dateDomain)
-                        #-----------------------#
-                        vprint(9,i, "date :", dateDomain)
-                        #-----------------------#
-                    except ValueError:
-                        pass
-
-        ## unknown variables
-        for v in unknownVars:
-            var = v
-            for (i,j) in Q.variables.items():
-                if i == v:
-                    var = j
-            for (i,j) in filterVariables.items():
-                if j == var:
-                    try:
-                        problem.addVariable(i, unknownDomain)
-                        #-----------------------#
-                        vprint(9,i, "unknown :", unknownDomain)
-                        #-----------------------#
-                    except ValueError:
-                        pass
-
-        filterExp = ''
-        for i in exp:
-            filterExp = filterExp + i + ' '
-
-        #-----------------------#
-        vprint(9)
-        vprint(9,'      ', filterExp)
-        vprint(9)
-        #-----------------------#
-
-
-        # Test satisfiability
-        problem.addConstraint(condition, list(filterVariables.keys()))
-        res = problem.getSolution()
+                res = checkCSPSatisfiability(Q)
+            if len(satisfiabilityMemo) >= MEMO_SIZE:
+                satisfiabilityMemo.clear()
+            satisfiabilityMemo[signature] = bool(res)
+            metrics.count('satisfiabilityMisses')
+        classes[lineKey] = (lnb, bool(res))
 
         #-----------------------#
         vprint(4,"   -----------")
@@ -730,119 +709,763 @@ def checkFilterConjunctionSatisfiability(PQ, unionUQs, results):
             reasons.append(lnb)
             mappings.update({ lnb : Q.variables })
 
+    metrics.count('filterClasses', len(classes))
+    #-----------------------#
+    vprint(4,f"   {lnb} result line(s) in {len(classes)} class(es).")
+    vprint(4)
+    #-----------------------#
+
     return {'compatible' : compatible, 'reasons' : reasons, 'mappings' : mappings}
 
 
 
-def checkIsomorphism(PQ, UQ):
+def checkOrderSatisfiability(Q):
     """
-    Check graph homomorphism between two queries.
+    Checks the satisfiability of the rewritten filter and join conditions of Q with the order constraint solver.
 
-    Verbose level: 5
+    Verbose level: 4
 
-    inputs: - PQ -> a TACQ
-            - UQ -> another TACQ
+    inputs: - Q -> union of PQ and UQs whose filter and joins are rewritten for one result line
     output: - a boolean
     """
-    if not isinstance(PQ, TACQ):
-        raise TypeError('The parameter "PQ" of checkHomomorphism() must be a TACQ !')
-    if not isinstance(UQ, TACQ):
-        raise TypeError('The parameter "UQ" of checkHomomorphism() must be a TACQ !')
-
-    # PQ and UQ must have the same size of graph pattern
-    PQnbVars = len(PQ.listGPVars().split())
-    UQnbVars = len(UQ.listGPVars().split())
-    if PQnbVars != UQnbVars:
-        return False
-
-    # check  inclusion of PQ and UQ
-    res = checkGraphPatternOverlap(PQ, UQ)
-    if res['compatible']:
-        vprint(5, f"\033[1;33m   The graph pattern of {PQ.prefix} is not included into the one of {UQ.prefix}.\033[0m")
-        vprint(5)
-        return False
-    vprint(5, f"\033[1;33m   The graph pattern of {PQ.prefix} IS INCLUDED into the one of {UQ.prefix} !\033[0m")
-    vprint(5)
-    
-    # check inclusion of UQ and UQ
-    res = checkGraphPatternOverlap(UQ, PQ)
-    if res['compatible']:
-        vprint(5, f"\033[1;33m   The graph pattern of {UQ.prefix} is not included into the one of {PQ.prefix}.\033[0m")
-        vprint(5)
-        return False
-    vprint(5, f"\033[1;33m   The graph pattern of {UQ.prefix} IS INCLUDED into the one of {PQ.prefix} !\033[0m")
-    vprint(5)
-
-    # check conjunction of filters satisfiability
-    if PQ.filter or UQ.filter:
-        res = checkFilterConjunctionSatisfiability(PQ, UQ, res['results'])
-        if res['compatible']:
-            vprint(5,f"\033[1;33m   The conjunction of Filter of {PQ.prefix} and {UQ.prefix} is not satisfiable.\033[0m")
-            vprint(5)
-            return False
-        vprint(5,f"\033[1;33m   The conjunction of Filter of {PQ.prefix} and {UQ.prefix} IS SATISFIABLE !\033[0m")
-        vprint(5)
-
-    return True
+    #-----------------------#
+    if '4' in mainArgs.verbose:
+        print('   ================================================================')
+        print('   Using the order constraint solver to check Filter satisfiability')
+        print('   ================================================================')
+        print()
+    #-----------------------#
 
+    conditions = [(f['opl'], f['comp'], f['opr']) for f in Q.filter]
+    for (i, j) in Q.joins:
+        if i != j:
+            conditions.append((i, '=', j))
+    metrics.count('orderConditions', len(conditions))
+    return isSatisfiable(conditions, Q.varTypes)
 
 
 
-def checkAggregateCompatibility1UQ(PQ, UQ):
+def checkCSPSatisfiability(Q):
     """
-    Checks compatibility of one PQ and one UQ computing the same aggregate.
+    Checks the satisfiability of the rewritten filter and join conditions of Q with a CSP solver.
 
-    Verbose level: 6
+    Verbose level: 4
 
-    inputs: - PQ -> original privacy TACQ with prefix
-            - UQ -> renamed and reified utility TACQ
-    output: - a dictionary { compatible, reasons }
-                - compatible: boolean
-                - reason: a summary of the explaination if incompatible
-                - toCheck: a boolean meaning that this UQ has to be tested with other UQs
+    inputs: - Q -> union of PQ and UQs whose filter and joins are rewritten for one result line
+    output: - a solution of the CSP, None if there is no solution
     """
-    if not isinstance(PQ, TACQ):
-        raise TypeError('The parameter PQ must be a TACQ !')
-    if not isinstance(UQ, TACQ):
-        raise TypeError('The parameter UQ must be a TACQ !')
+    from constraint import Problem
+    problem = Problem()
 
-    compatible = True
-    toCheck = False
+    #-----------------------#
+    if '4' in mainArgs.verbose:
+        print('   =================================================')
+        print('   Using a CSP solver to check Filter satisfiability')
+        print('   =================================================')
+        print()
+    #-----------------------#
 
+    ## prepare variable domains generation
+    intVars = []
+    strVars = []
+    floatVars = []
+    dateVars = []
+    unknownVars = []
+
+    intConst = []
+    strConst = []
+    floatConst = []
+    dateConst = []
+
+    ## list variables and constants by type in filter
+    for f in Q.filter:
+        # opl is a variable
+        if isinstance(f['opl'], str) and f['opl'][0] == '?':
+            if str(Q.varTypes[f['opl']]) == "<class 'int'>":
+                intVars.append(f['opl'])
+            if str(Q.varTypes[f['opl']]) == "<class 'str'>":
+                strVars.append(f['opl'])
+            if str(Q.varTypes[f['opl']]) == "<class 'float'>":
+                floatVars.append(f['opl'])
+            if str(Q.varTypes[f['opl']]) == "<class 'datetime.datetime'>" or str(Q.varTypes[f['opl']]) == "<class 'datetime'>":
+                dateVars.append(f['opl'])
+            if str(Q.varTypes[f['opl']]) == 'unknown':
+                unknownVars.append(f['opl'])
+        
+        # opl is a constant
+        else:
+            if isinstance(f['opl'], int):
+                intConst.append(f['opl'])
+            elif isinstance(f['opl'], str):
+                strConst.append(f['opl'])
+            elif isinstance(f['opl'], float):
+                floatConst.append(f['opl'])
+            elif isinstance(f['opl'], datetime):
+                dateConst.append(f['opl'])
+
+        # opr is a variable
+        if isinstance(f['opr'], str) and f['opr'][0] == '?':
+            if str(Q.varTypes[f['opr']]) == "<class 'int'>":
+                intVars.append(f['opr'])
+            if str(Q.varTypes[f['opr']]) == "<class 'str'>":
+                strVars.append(f['opr'])
+            if str(Q.varTypes[f['opr']]) == "<class 'float'>":
+                floatVars.append(f['opr'])
+            if str(Q.varTypes[f['opl']]) == "<class 'datetime.datetime'>" or str(Q.varTypes[f['opl']]) == "<class 'datetime'>":
+                dateVars.append(f['opr'])
+            if str(Q.varTypes[f['opr']]) == 'unknown':
+                unknownVars.append(f['opr'])
+
+        # opr is a constant
+        else:
+            if isinstance(f['opr'], int):
+                intConst.append(f['opr'])
+            elif isinstance(f['opr'], str):
+                strConst.append(f['opr'])
+            elif isinstance(f['opr'], float):
+                floatConst.append(f['opr'])
+            elif isinstance(f['opr'], datetime):
+                dateConst.append(f['opr'])
+
+
+    # list variables by type in joins
+    for n in range(len(Q.joins)):
+        (i, j) = Q.joins[n]
+        # Left variable i
+        if str(Q.varTypes[i]) == "<class 'int'>":
+            intVars.append(i)
+        elif str(Q.varTypes[i]) == "<class 'str'>":
+            strVars.append(i)
+        elif str(Q.varTypes[i]) == "<class 'float'>":
+            floatVars.append(i)
+        elif str(Q.varTypes[i]) == "<class 'datetime.datetime'>" or str(Q.varTypes[i]) == "<class 'datetime'>":
+            dateVars.append(i)
+        else:
+            unknownVars.append(i)
+
+        # right variable j
+        if str(Q.varTypes[j]) == "<class 'int'>":
+            intVars.append(j)
+        elif str(Q.varTypes[j]) == "<class 'str'>":
+            strVars.append(j)
+        elif str(Q.varTypes[j]) == "<class 'float'>":
+            floatVars.append(j)
+        elif str(Q.varTypes[i]) == "<class 'datetime.datetime'>" or str(Q.varTypes[i]) == "<class 'datetime'>":
+            dateVars.append(j)
+        else:
+            unknownVars.append(j)
+
+
+    # elimiate duplicates in lists and sort them
+    intVars = list(set(intVars))
+    strVars = list(set(strVars))
+    floatVars = list(set(floatVars))
+    dateVars = list(set(dateVars))
+    unknownVars = list(set(unknownVars))
+
+    intConst = sorted(list(set(intConst)))
+    strConst = sorted(list(set(strConst)))
+    floatConst = sorted(list(set(floatConst)))
+    dateConst = sorted(list(set(dateConst)))
+
+
+    # generate domains for constants and variables 
+    intDomain = []
+    strDomain = []
+    floatDomain = []
+    dateDomain = []
+    unknownDomain = []
+    constants = {}
+
+    end = 0
+    begin = end
+
+    ## integer
+    pos = begin
+    for i in intConst:
+        constants[i] = pos + len(intVars)
+        pos = pos + len(intVars) + 1
+    if pos != begin:
+        end = pos + len(intVars)
+        intDomain = range(begin, end)
+        begin = end + 1
+
+    ## str
+    pos = begin
+    for i in strConst:
+        constants[i] = pos + len(strVars)
+        pos = pos + len(strVars) + 1
+    if pos != begin:
+        end = pos + len(strVars)
+        strDomain = range(begin, end)
+        begin = end + 1
+
+    ## float
+    pos = begin
+    for i in floatConst:
+        constants[i] = pos + len(floatVars)
+        pos = pos + len(floatVars) + 1
+    if pos != begin:
+        end = pos + len(floatVars)
+        floatDomain = range(begin, end)
+        begin = end + 1
+
+    ## date
+    pos = begin
+    for i in dateConst:
+        constants[i] = pos + len(dateVars)
+        pos = pos + len(dateVars) + 1
+    if pos != begin:
+        end = pos + len(dateVars)
+        dateDomain = range(begin, end)
+        begin = end + 1
+
+    ## unknown variables
+    pos = begin
+    end = begin + 2*len(unknownVars) + 1
+    unknownDomain = range(begin, end)
 
-    # PQ and UQ without time windows must be incompatible
+    #-----------------------#
+    if '9' in mainArgs.verbose:
+        print("------------------")
+        print("Constants encoding")
+        print("------------------")
+        for (i,j) in constants.items():
+            print(i, "->", j)
+        print()
 
-    ## work on copies of PQ
-    PQ = PQ.copy()
-    incompPQ = PQ.copy()
+        print("---------------------")
+        print("Variables and domains")
+        print("---------------------")
+        if intVars:
+            print("int variables    :", intVars)
+            print("    domain       :", intDomain)
+        if strVars:
+            print("str variables    :", strVars)
+            print("    domain       :", strDomain)
+        if floatVars:
+            print("float variables  :", floatVars)
+            print("      domain     :", floatDomain)
+        if dateVars:
+            print("date variables   :", dateVars)
+            print("     domain      :", dateDomain)
+        if unknownVars:
+            print("unknown variables:", unknownVars)
+            print("        domain   :", unknownDomain)
+        print()
+    #-----------------------#
+    
+    # compile conditions: one closure per comparison, over variables or encoded constants
+    conditions = []
+    for f in Q.filter:
+        comp = f['comp'].strip()
+        if comp == '=':
+            comp = '=='
+
+        if str(f['opl'])[0] == '?':
+            opl = f['opl']
+        else:
+            opl = constants[f['opl']]
 
-    PQ.renameVariables(prefix=PQ.prefix)
-    PQ.extractJoins()
-    PQ.reify()
+        if str(f['opr'])[0] == '?':
+            opr = f['opr']
+        else:
+            opr = constants[f['opr']]
+        conditions.append((opl, comp, opr))
+    for (i,j) in Q.joins:
+        if i != j:
+            conditions.append((i, '==', j))
 
-    ## testing graph inclusion
-    res = checkGraphPatternOverlap(PQ, UQ)
+    #-----------------------#
+    vprint(9)
+    vprint(9,"   ------------------------------")
+    vprint(9,"   Expression to be tested by CSP")
+    vprint(9,"   ------------------------------")
+    #-----------------------#
 
-    if res['compatible']:
+    # variables of the conditions, with the domain of their type (first type wins)
+    domains = {}
+    for (vs, domain, name) in [(intVars, intDomain, 'int'), (strVars, strDomain, 'str'), (floatVars, floatDomain, 'float'),
+                               (dateVars, dateDomain, 'date'), (unknownVars, unknownDomain, 'unknown')]:
+        for v in vs:
+            var = Q.variables.get(v, v)
+            if not var in domains:
+                domains[var] = (domain, name)
+
+    filterVariables = []
+    for (opl, comp, opr) in conditions:
+        for op in [opl, opr]:
+            if str(op)[0] == '?' and not op in filterVariables:
+                filterVariables.append(op)
+
+    for var in filterVariables:
+        if var in domains:
+            (domain, name) = domains[var]
+            try:
+                problem.addVariable(var, domain)
+                metrics.count('cspVariables')
+                metrics.count('cspDomainSize', len(domain))
+                #-----------------------#
+                vprint(9,var, name, ":", domain)
+                #-----------------------#
+            except ValueError:
+                pass
+
+    #-----------------------#
+    vprint(9)
+    vprint(9,'      ', ' and '.join([f"{opl} {comp} {opr}" for (opl, comp, opr) in conditions]))
+    vprint(9)
+    #-----------------------#
+
+    # register each comparison on its own variables, so that the solver prunes early
+    checks = [0]   # number of (partial) assignments tested by the solver
+
+    def compare(test, l, r):
+        checks[0] = checks[0] + 1
+        return test(l, r)
+
+    satisfiable = True
+    for (opl, comp, opr) in conditions:
+        test = COMPARATORS[comp]
+        lvar = str(opl)[0] == '?'
+        rvar = str(opr)[0] == '?'
+        if lvar and rvar and opl != opr:
+            problem.addConstraint(lambda l, r, test=test: compare(test, l, r), [opl, opr])
+        elif lvar and rvar:
+            problem.addConstraint(lambda v, test=test: compare(test, v, v), [opl])
+        elif lvar:
+            problem.addConstraint(lambda v, test=test, c=opr: compare(test, v, c), [opl])
+        elif rvar:
+            problem.addConstraint(lambda v, test=test, c=opl: compare(test, c, v), [opr])
+        elif not test(opl, opr):
+            satisfiable = False
+
+    # Test satisfiability
+    if not satisfiable:
+        return None
+    res = problem.getSolution()
+    metrics.count('cspAssignments', checks[0])
+
+    return res
+
+
+
+
+certificates = {}    # certificates of reified graph patterns {triples : certificate}, see patternCertificate()
+
+isomorphicUQs = {}   # names of utility queries by certificate of their reified graph pattern {certificate : set of names}
+
+uqPredicates = {}    # names of utility queries by predicate of their reified graph pattern {predicate : set of names}
+
+uqPositions = {}     # variables of utility queries by position in their reified graph pattern
+                     # {(predicate, position, output) : set of variables}, output meaning only output variables
+
+subsumedUQs = {}     # utility queries whose graph pattern is subsumed by the one of another {name : name of the other}
+
+unsatisfiableUQs = set()   # names of utility queries whose filter alone is unsatisfiable
+
+
+def patternCertificate(Q):
+    """
+    Computes (once) the certificate of the reified graph pattern of Q, see TACQ.certificate().
+
+    inputs: - Q -> a reified TACQ
+    output: - a string
+    """
+    triples = tuple(t.values() for t in Q.gp)
+    if not triples in certificates:
+        if len(certificates) >= MEMO_SIZE:
+            certificates.clear()
+        certificates[triples] = Q.certificate()
+    return certificates[triples]
+
+
+
+def indexUtilityQueries(UQs):
+    """
+    Indexes utility queries by the certificate of their reified graph pattern, by the predicates it uses,
+    indexes their variables by position, and finds the subsumed ones (see findSubsumedUtilityQueries()) and
+    the ones whose filter alone is unsatisfiable.
+
+    inputs: - UQs -> dictionary of rewritten and reified utility TACQs
+    output: - None
+    """
+    isomorphicUQs.clear()
+    uqPredicates.clear()
+    uqPositions.clear()
+    subsumedUQs.clear()
+    unsatisfiableUQs.clear()
+    frozenUnions.clear()
+    for (q, UQ) in UQs.items():
+        isomorphicUQs.setdefault(patternCertificate(UQ), set()).add(UQ.prefix)
+        predicates = {}
+        for t in UQ.gp:
+            if t.predicate == ':predicate':
+                uqPredicates.setdefault(t.object, set()).add(q)
+                predicates[t.subject] = t.object
+        for t in UQ.gp:
+            if t.subject in predicates and t.predicate != ':predicate' and t.object[0] == '?':
+                uqPositions.setdefault((predicates[t.subject], t.predicate, False), set()).add(t.object)
+                if t.object[1] == 'o':
+                    uqPositions.setdefault((predicates[t.subject], t.predicate, True), set()).add(t.object)
+    subsumedUQs.update(findSubsumedUtilityQueries(UQs))
+
+    # filters typed as in the filter check, where they are in the conjunction of every result line
+    for (q, UQ) in UQs.items():
+        if UQ.filter:
+            types = ChainMap({}, UQ.varTypes)
+            inferTypes(types, UQ.filter)
+            if not isSatisfiable([(f.opl, f.comp, f.opr) for f in UQ.filter], types):
+                unsatisfiableUQs.add(q)
+
+
+
+def subsumes(UQ1, UQ2):
+    """
+    Checks whether the reified graph pattern of UQ2 can be mapped into the one of UQ1, constants to themselves and
+    output variables to output variables. Then every result line of the overlap check using UQ2 is mapped to a line
+    using UQ1 instead, whose output variables and joins are as valid.
+
+    inputs: - UQ1 -> a reified utility TACQ
+            - UQ2 -> another reified utility TACQ
+    output: - a boolean
+    """
+    # terms of UQ1 are constants: constants of the queries are marked by '#', output variables start with 'o'
+    def const(x):
+        if x[0] != '?':
+            return '#' + x
+        return ('o' if x[1] == 'o' else 'v') + x
+
+    index = TripleIndex([tuple(const(x) for x in t.values()) for t in UQ1.gp])
+    pattern = [tuple(x if x[0] == '?' else '#' + x for x in t.values()) for t in UQ2.gp]
+    variables = sorted(set(x for p in pattern for x in p if x[0] == '?'))
+    outputs = [v for v in variables if v[1] == 'o']
+    return len(findHomomorphisms(pattern, index, variables, outputs, limit=1)) > 0
+
+
+
+def findSubsumedUtilityQueries(UQs):
+    """
+    Finds the utility queries whose graph pattern is subsumed by the one of another utility query (see subsumes()).
+    They add no valid result line to the overlap check, so it can leave them out. Queries subsuming each other
+    are equivalent for this check, only the first one is kept.
+
+    inputs: - UQs -> dictionary of rewritten and reified utility TACQs
+    output: - a dictionary {name : name of a subsuming utility query that is kept}
+    """
+    predicates = {}
+    for (q, UQ) in UQs.items():
+        predicates[q] = set(t.object for t in UQ.gp if t.predicate == ':predicate')
+    order = {q : n for (n, q) in enumerate(UQs.keys())}
+
+    subsumed = {}
+    for q2 in UQs.keys():
+        for q1 in UQs.keys():
+            # a subsuming utility query uses all the predicates of the subsumed one
+            if q1 == q2 or not predicates[q2] <= predicates[q1]:
+                continue
+            # an equivalent query only replaces the later ones
+            if subsumes(UQs[q1], UQs[q2]) and (order[q1] < order[q2] or not subsumes(UQs[q2], UQs[q1])):
+                subsumed[q2] = q1
+                break
+
+    # the subsuming query can be left out too, a query subsuming it is kept
+    for q in subsumed.keys():
+        while subsumed[q] in subsumed:
+            subsumed[q] = subsumed[subsumed[q]]
+    return subsumed
+
+
+
+def tripleKinds(Q):
+    """
+    Computes the maximal kinds of the reified triples of Q. A triple can only be mapped to a triple with the same
+    predicate, having a variable where it has one, and an output variable where it has one (see checkGraphPatternOverlap()).
+    So graph patterns that are included into each other have the same maximal kinds.
+
+    inputs: - Q -> a reified TACQ
+    output: - a frozenset of kinds (predicate, subject, object, timestamp), the subject, the object and the timestamp
+              being 0 when absent, 1 for a variable and 2 for an output variable
+    """
+    positions = {':subject' : 1, ':object' : 2, ':timestamp' : 3}
+    triples = {}
+    for t in Q.gp:
+        kind = triples.setdefault(t.subject, [None, 0, 0, 0])
+        if t.predicate == ':predicate':
+            kind[0] = t.object
+        elif t.predicate in positions:
+            kind[positions[t.predicate]] = 2 if t.object[1] == 'o' else 1
+    kinds = set(tuple(k) for k in triples.values())
+
+    def below(k1, k2):
+        return k1 != k2 and k1[0] == k2[0] and all(k1[i] <= k2[i] for i in range(1, 4))
+
+    return frozenset(k for k in kinds if not any(below(k, other) for other in kinds))
+
+
+
+def checkIsomorphism(PQ, UQ, engine=None, certificate=None):
+    """
+    Check graph homomorphism between two queries.
+    Isomorphic graph patterns are found by their certificates (see indexUtilityQueries()), other graph patterns
+    are checked for inclusion into each other.
+
+    Verbose level: 5
+
+    inputs: - PQ -> a TACQ
+            - UQ -> another TACQ
+            - engine -> graph pattern engine used by checkGraphPatternOverlap()
+            - certificate -> certificate of the graph pattern of PQ, if already computed (see patternCertificate())
+    output: - a boolean
+    """
+    if not isinstance(PQ, TACQ):
+        raise TypeError('The parameter "PQ" of checkHomomorphism() must be a TACQ !')
+    if not isinstance(UQ, TACQ):
+        raise TypeError('The parameter "UQ" of checkHomomorphism() must be a TACQ !')
+
+    # PQ and UQ must have the same size of graph pattern
+    PQnbVars = len(PQ.listGPVars().split())
+    UQnbVars = len(UQ.listGPVars().split())
+    if PQnbVars != UQnbVars:
+        return False
+
+    # isomorphic graph patterns have the same certificate
+    if certificate is None:
+        certificate = patternCertificate(PQ)
+    if not (PQ.joins or UQ.joins) and UQ.prefix in isomorphicUQs.get(certificate, ()):
+        metrics.count('certificateHits')
+        vprint(5, f"\033[1;33m   The graph patterns of {PQ.prefix} and {UQ.prefix} have the same certificate: they ARE ISOMORPHIC !\033[0m")
+        vprint(5)
+        if not (PQ.filter or UQ.filter):
+            return True
+        # results of UQ over the freezing of PQ for the filter check
+        res = checkGraphPatternOverlap(UQ, PQ, engine, full=True)
+
+    # other graph patterns can still be included into each other (e.g. with redundant triples)
+    else:
+        if tripleKinds(PQ) != tripleKinds(UQ):
+            vprint(5, f"\033[1;33m   The graph patterns of {PQ.prefix} and {UQ.prefix} have different kinds of triples.\033[0m")
+            vprint(5)
+            return False
+        metrics.count('certificateFallbacks')
+
+        # check  inclusion of PQ and UQ
+        res = checkGraphPatternOverlap(PQ, UQ, engine)
+        if res['compatible']:
+            vprint(5, f"\033[1;33m   The graph pattern of {PQ.prefix} is not included into the one of {UQ.prefix}.\033[0m")
+            vprint(5)
+            return False
+        vprint(5, f"\033[1;33m   The graph pattern of {PQ.prefix} IS INCLUDED into the one of {UQ.prefix} !\033[0m")
+        vprint(5)
+    
+        # check inclusion of UQ and UQ (all its results for the filter check)
+        res = checkGraphPatternOverlap(UQ, PQ, engine, full=bool(PQ.filter or UQ.filter))
+        if res['compatible']:
+            vprint(5, f"\033[1;33m   The graph pattern of {UQ.prefix} is not included into the one of {PQ.prefix}.\033[0m")
+            vprint(5)
+            return False
+        vprint(5, f"\033[1;33m   The graph pattern of {UQ.prefix} IS INCLUDED into the one of {PQ.prefix} !\033[0m")
+        vprint(5)
+
+    # check conjunction of filters satisfiability
+    if PQ.filter or UQ.filter:
+        res = checkFilterConjunctionSatisfiability(PQ, UQ, res['results'])
+        if res['compatible']:
+            vprint(5,f"\033[1;33m   The conjunction of Filter of {PQ.prefix} and {UQ.prefix} is not satisfiable.\033[0m")
+            vprint(5)
+            return False
+        vprint(5,f"\033[1;33m   The conjunction of Filter of {PQ.prefix} and {UQ.prefix} IS SATISFIABLE !\033[0m")
+        vprint(5)
+
+    return True
+
+
+
+# stages of checkAggregateCompatibility1UQ(), by increasing cost
+AGGREGATE_STAGES = ['function',      # O(1) comparison of aggregate functions
+                    'variable',      # positions of the aggregate variables in the graph patterns
+                    'isomorphism',   # certificates of the graph patterns (overlaps only when they differ)
+                    'overlap',       # homomorphisms of PQ into the freezing of UQ
+                    'filter',        # satisfiability of the filter conditions for each result line
+                    'mapping',       # mapping of the aggregate variables in satisfiable result lines
+                    'window']        # time window arithmetic, once all other stages pass
+
+
+
+def aggregateDecision(stage, compatible=True, reason='', toCheck=False):
+    """
+    Counts the stage of checkAggregateCompatibility1UQ() deciding a pair of PQ and UQ, and builds its result.
+
+    inputs: - stage      -> name of the deciding stage (see AGGREGATE_STAGES)
+            - compatible -> boolean
+            - reason     -> explanation if incompatible
+            - toCheck    -> boolean meaning that the UQ has to be tested with other UQs
+    output: - a dictionary { compatible, reason, toCheck }
+    """
+    metrics.count('aggregateStage' + stage.capitalize())
+    return {'compatible' : compatible, 'reason' : reason, 'toCheck' : toCheck}
+
+
+
+def gpPositions(Q, var):
+    """
+    Lists the positions of a variable in the graph pattern of a query (reified or not).
+
+    inputs: - Q   -> a TACQ
+            - var -> a variable
+    output: - set of couples (predicate, position), position being ':subject', ':object' or ':timestamp'
+    """
+    positions = set()
+    predicates = {t.subject : t.object for t in Q.gp if t.predicate == ':predicate'}
+    for t in Q.gp:
+        if t.subject in predicates:
+            if t.object == var and t.predicate != ':predicate':
+                positions.add((predicates[t.subject], t.predicate))
+        else:
+            for (position, term) in [(':subject', t.subject), (':object', t.object), (':timestamp', t.timestamp)]:
+                if term == var:
+                    positions.add((t.predicate, position))
+    return positions
+
+
+
+class PreparedQuery(object):
+    """
+    Class storing the forms of a privacy query used by checkAggregateCompatibility1UQ(), computed once
+    and shared by the checks against all utility queries.
+    """
+
+    # Attributes of a PreparedQuery
+    query = None        # original TACQ (with its prefix)
+    rewritten = None    # renamed, reified TACQ with extracted joins, for the overlap and filter checks
+    isomorphic = None   # renamed and reified TACQ without extracted joins, for checkIsomorphism()
+    certificate = ''    # certificate of the graph pattern of isomorphic (see patternCertificate())
+    positions = set()   # positions of the aggregate variable with a constant predicate (see gpPositions())
+
+    @metrics.timed('aggregate1')
+    def __init__(self, query, rewritten=None):
+        """
+        inputs: - query     -> original privacy TACQ with prefix
+                - rewritten -> the renamed, reified TACQ with extracted joins, if already computed
+        """
+        if not isinstance(query, TACQ):
+            raise TypeError('The parameter "query" of PreparedQuery() must be a TACQ !')
+        self.query = query
+
+        if rewritten is None:
+            rewritten = query.copy()
+            rewritten.renameVariables(prefix=query.prefix)
+            rewritten.extractJoins()
+            rewritten.reify()
+        # the filter check needs at least one condition (the overlap check ignores them)
+        if not rewritten.filter:
+            v = list(rewritten.variables.keys())[0]
+            rewritten.filter = [Condition(v, '=', v)]
+        self.rewritten = rewritten
+
+        self.isomorphic = query.copy()
+        self.isomorphic.renameVariables(query.prefix)
+        self.isomorphic.reify()
+        self.certificate = patternCertificate(self.isomorphic)
+
+        self.positions = set()
+        if query.aggregate:
+            self.positions = {p for p in gpPositions(query, query.aggregate['variable']) if p[0][0] != '?'}
+
+
+
+@metrics.timed('aggregate1')
+def checkAggregateCompatibility1UQ(PQ, UQ):
+    """
+    Checks compatibility of one PQ and one UQ computing the same aggregate.
+    The stages of the check run by increasing cost (see AGGREGATE_STAGES): the first stage proving that PQ and UQ
+    are compatible decides the pair.
+
+    Verbose level: 6
+
+    inputs: - PQ -> original privacy TACQ with prefix, or its PreparedQuery
+            - UQ -> renamed and reified utility TACQ
+    output: - a dictionary { compatible, reasons }
+                - compatible: boolean
+                - reason: a summary of the explaination if incompatible
+                - toCheck: a boolean meaning that this UQ has to be tested with other UQs
+    """
+    if isinstance(PQ, TACQ):
+        PQ = PreparedQuery(PQ)
+    if not isinstance(PQ, PreparedQuery):
+        raise TypeError('The parameter PQ must be a TACQ or a PreparedQuery !')
+    if not isinstance(UQ, TACQ):
+        raise TypeError('The parameter UQ must be a TACQ !')
+
+    prepared = PQ
+    PQ = prepared.query
+
+    toCheck = False
+
+
+    # the cheap stages compare aggregates (utility queries without aggregate are decided by their overlap)
+    if UQ.aggregate:
+
+        # PQ and UQ must compute the same aggregate
+
+        ## Same function
+        if PQ.aggregate['function'] != UQ.aggregate['function']:
+            #-----------------------#
+            vprint(6, f"   {PQ.prefix} and {UQ.prefix} compute different aggregate functions.\033[0m")
+            vprint(6)
+            #-----------------------#
+            return aggregateDecision('function')
+
+        ## Same variable: the aggregate variable of PQ must have a position of the aggregate variable of UQ
+        ## (only positions with a constant predicate, that homomorphisms preserve)
+        positions = prepared.positions
+        if positions and positions.isdisjoint(gpPositions(UQ, UQ.aggregate['variable'])):
+            #-----------------------#
+            vprint(6, f"   {PQ.prefix} and {UQ.prefix} compute the same '{PQ.aggregate['function']}' aggregate on variables at different positions.\033[0m")
+            vprint(6)
+            #-----------------------#
+            return aggregateDecision('variable')
+
+
+        # PQ and UQ graph patterns must be isomorphic
+
+        res = checkIsomorphism(prepared.isomorphic, UQ, certificate=prepared.certificate)
+        if res:
+            #-----------------------#
+            vprint(6,f"   {PQ.prefix} and {UQ.prefix} graph patterns are isomorphic.\033[0m")
+            vprint(6)
+            #-----------------------#
+        else:
+            #-----------------------#
+            vprint(6,f"   But {PQ.prefix} and {UQ.prefix} graph patterns are not isomorphic.\033[0m")
+            vprint(6)
+            #-----------------------#
+            return aggregateDecision('isomorphism')
+
+
+    # PQ and UQ without time windows must be incompatible
+
+    PQ = prepared.rewritten
+
+    ## testing graph inclusion (all the results for the filter check)
+    res = checkGraphPatternOverlap(PQ, UQ, full=True)
+
+    if res['compatible']:
         #-----------------------#
         vprint(6, f"   The conjunctive parts of {PQ.prefix} and {UQ.prefix} are compatible.\033[0m")
         vprint(6)
         #-----------------------#
-        return { 'compatible' : compatible, 'reason' : '', 'toCheck' : toCheck }
+        return aggregateDecision('overlap')
 
     ## testing filter condition satisfiability
-    if not PQ.filter:
-        v = list(PQ.variables.keys())[0]
-        PQ.filter = [{'opl' : v, 'comp' : '=', 'opr' : v}]
-        
     res = checkFilterConjunctionSatisfiability(PQ, UQ, res['results'])
 
     if res['compatible']:
         #-----------------------#
-        vprint(6, f"   The conjunctive parts of {PQ.prefix} and {UQ.prefix} compatible.\033[0m")
+        vprint(6, f"   The conjunctive parts of {PQ.prefix} and {UQ.prefix} are compatible.\033[0m")
         vprint(6)
         #-----------------------#
-        return { 'compatible' : compatible, 'reason' : '', 'toCheck' : toCheck }
+        return aggregateDecision('filter')
 
     #-----------------------#
     vprint(6, f"   The conjunctive parts of {PQ.prefix} and {UQ.prefix} are incompatible.\033[0m")
@@ -850,22 +1473,9 @@ def checkAggregateCompatibility1UQ(PQ, UQ):
     vprint(6)
     #-----------------------#
 
-
-    # PQ and UQ must compute the same aggregate
-
-    ## Same function
-    if PQ.aggregate['function'] != UQ.aggregate['function']:
-        #-----------------------#
-        vprint(6, f"   But {PQ.prefix} and {UQ.prefix} compute diffetrent aggregate functions.\033[0m")
-        vprint(6)
-        #-----------------------#
-        return { 'compatible' : compatible, 'reason' : '', 'toCheck' : toCheck }
-
-    ## Same variable
+    ## Test if aggregate variable of PQ can be mapped to aggregate variable of UQ
     ok = True
     mappings = res['mappings']
-
-    ### Test if aggregate variable of PQ can be mapped to aggregate variable of UQ
     for l in mappings.keys():
         if UQ.aggregate['variable'] == mappings[l][PQ.aggregate['variable']]:
             ok = False
@@ -874,7 +1484,7 @@ def checkAggregateCompatibility1UQ(PQ, UQ):
         vprint(6, f"   But {PQ.prefix} and {UQ.prefix} compute the same '{PQ.aggregate['function']}' aggregate  on different variables.\033[0m")
         vprint(6)
         #-----------------------#
-        return { 'compatible' : compatible, 'reason' : '', 'toCheck' : toCheck }
+        return aggregateDecision('mapping')
 
     #-----------------------#
     vprint(6,f"   Furthermore, {PQ.prefix} and {UQ.prefix} compute the same '{PQ.aggregate['function']}' aggregate on the same variable.\033[0m")
@@ -883,22 +1493,6 @@ def checkAggregateCompatibility1UQ(PQ, UQ):
     #-----------------------#
 
 
-    # PQ and UQ graph patterns must be isomorphic
-    incompPQ.renameVariables(PQ.prefix)
-    incompPQ.reify()
-    res = checkIsomorphism(incompPQ, UQ)
-    if res:
-        #-----------------------#
-        vprint(6,f"   In fact, {PQ.prefix} and {UQ.prefix} graph patterns are isomorphic.\033[0m")
-       #-----------------------#
-    else:
-        #-----------------------#
-        vprint(6,f"   But {PQ.prefix} and {UQ.prefix} graph patterns are not isomorphic.\033[0m")
-        vprint(6)
-        return {'compatible' : True, 'reason' : '', 'toCheck' : toCheck }
-        #-----------------------#
-
-
     # PQ and UQ have the same time window definition
 
     if PQ.size == UQ.size and PQ.step == UQ.step:
@@ -907,7 +1501,7 @@ def checkAggregateCompatibility1UQ(PQ, UQ):
         vprint(6)
         #-----------------------#
 
-        return { 'compatible' : False, 'reason' : f"Results for all time windows of {PQ.prefix} can be built from results for time windows of {UQ.prefix}.", 'toCheck' : toCheck }
+        return aggregateDecision('window', False, f"Results for all time windows of {PQ.prefix} can be built from results for time windows of {UQ.prefix}.", toCheck)
 
 
     # PQ and UQ have different time window definitions
@@ -925,7 +1519,7 @@ def checkAggregateCompatibility1UQ(PQ, UQ):
                 vprint(6,f"   But no time window of {PQ.prefix} can be built by disjoint union of time windows of {UQ.prefix}.\033[0m")
                 vprint(6)
                 #-----------------------#
-                return { 'compatible' : True, 'reason' : '', 'toCheck' : toCheck }
+                return aggregateDecision('window', True, '', toCheck)
 
             m = int(UQ.size) / int(UQ.step)
             if m-int(m) != 0:
@@ -933,14 +1527,14 @@ def checkAggregateCompatibility1UQ(PQ, UQ):
                 vprint(6,f"   But no time window of {PQ.prefix} can be built by disjoint union of time windows of {UQ.prefix}.\033[0m")
                 vprint(6)
                 #-----------------------#
-                return { 'compatible' : True, 'reason' : '', 'toCheck' : toCheck }
+                return aggregateDecision('window', True, '', toCheck)
 
             if PQ.size == 'inf':
                 #-----------------------#
                 vprint(6,f"   Finally, the time window of {PQ.prefix} can be built by disjoint union of time windows of {UQ.prefix}.\033[0m")
                 vprint(6)
                 #-----------------------#
-                return { 'compatible' : False, 'reason' : f"Aggregate results computed over every time window of {PQ.prefix} can be built from aggregate results of time windows of {UQ.prefix}.", 'toCheck' : toCheck }
+                return aggregateDecision('window', False, f"Aggregate results computed over every time window of {PQ.prefix} can be built from aggregate results of time windows of {UQ.prefix}.", toCheck)
 
             n = int(PQ.size) / int(UQ.size)
             if n - int(n) != 0:
@@ -948,13 +1542,13 @@ def checkAggregateCompatibility1UQ(PQ, UQ):
                 vprint(6, f"   But no time window of {PQ.prefix} can be built by disjoint union of time windows of {UQ.prefix}.\033[0m")
                 vprint(6)
                 #-----------------------#
-                return { 'compatible' : True, 'reason' : '', 'toCheck' : toCheck }
+                return aggregateDecision('window', True, '', toCheck)
             
             #-----------------------#
             vprint(6, f"   Finally, all the time windows of {PQ.prefix} can be built by disjoint union of time windows of {UQ.prefix}.\033[0m")
             vprint(6)
             #-----------------------#
-            return { 'compatible' : False, 'reason' : f"Aggregate results computed over every time window of {PQ.prefix} can be built from aggregate results of time windows of {UQ.prefix}.", 'toCheck' : toCheck }
+            return aggregateDecision('window', False, f"Aggregate results computed over every time window of {PQ.prefix} can be built from aggregate results of time windows of {UQ.prefix}.", toCheck)
 
 
         ## MIN or MAX
@@ -964,7 +1558,7 @@ def checkAggregateCompatibility1UQ(PQ, UQ):
                 vprint(6,f"   But no time window of {PQ.prefix} can be built by union of time windows of {UQ.prefix}.\033[0m")
                 vprint(6)
                 #-----------------------#
-                return { 'compatible' : True, 'reason' : '', 'toCheck' : toCheck }
+                return aggregateDecision('window', True, '', toCheck)
 
             m = int(UQ.size) < int(UQ.step)
             if m-int(m) != 0:
@@ -972,14 +1566,14 @@ def checkAggregateCompatibility1UQ(PQ, UQ):
                 vprint(6,f"   But no time window of {PQ.prefix} can be built by union of time windows of {UQ.prefix}.\033[0m")
                 vprint(6)
                 #-----------------------#
-                return { 'compatible' : True, 'reason' : '', 'toCheck' : toCheck }
+                return aggregateDecision('window', True, '', toCheck)
 
             if PQ.size == 'inf':
                 #-----------------------#
                 vprint(6,f"   Finally, the time window of {PQ.prefix} can be built by union of time windows of {UQ.prefix}.\033[0m")
                 vprint(6)
                 #-----------------------#
-                return { 'compatible' : False, 'reason' : f"Aggregate results computed over every time window of {PQ.prefix} can be built from aggregate results of time windows of {UQ.prefix}.", 'toCheck' : toCheck }
+                return aggregateDecision('window', False, f"Aggregate results computed over every time window of {PQ.prefix} can be built from aggregate results of time windows of {UQ.prefix}.", toCheck)
 
             n = (int(PQ.size) - int(UQ.size)) / int(UQ.size)
             if n - int(n) != 0:
@@ -987,17 +1581,24 @@ def checkAggregateCompatibility1UQ(PQ, UQ):
                 vprint(6, f"   But no time window of {PQ.prefix} can be built by union of time windows of {UQ.prefix}.\033[0m")
                 vprint(6)
                 #-----------------------#
-                return { 'compatible' : True, 'reason' : '', 'toCheck' : toCheck }
+                return aggregateDecision('window', True, '', toCheck)
             
             #-----------------------#
             vprint(6, f"   Finally, all the time windows of {PQ.prefix} can be built by union of time windows of {UQ.prefix}.\033[0m")
             vprint(6)
             #-----------------------#
-            return { 'compatible' : False, 'reason' : f"Aggregate results computed over every time window of {PQ.prefix} can be built from aggregate results of time windows of {UQ.prefix}.", 'toCheck' : toCheck }
+            return aggregateDecision('window', False, f"Aggregate results computed over every time window of {PQ.prefix} can be built from aggregate results of time windows of {UQ.prefix}.", toCheck)
 
+        ## other functions
+        #-----------------------#
+        vprint(6,f"   But no time window of {PQ.prefix} can be built from time windows of {UQ.prefix} for '{PQ.aggregate['function']}'.\033[0m")
+        vprint(6)
+        #-----------------------#
+        return aggregateDecision('window', True, '', toCheck)
 
 
 
+@metrics.timed('aggregate2')
 def checkAggregateCompatibility2UQ(PQ, UQ1, UQ2):
     """
     Checks compatibility of one PQ and two UQs computing the same aggregate.
@@ -1052,6 +1653,8 @@ def checkAggregateCompatibility2UQ(PQ, UQ1, UQ2):
         return {'compatible' : True, 'reason' : ''}           
         
     ## Finding the integer solution for variables using diophantine equation solver 
+    from sympy import symbols
+    from sympy.solvers.diophantine import diophantine
     sigma_uq2 = int(UQ2.step)/math.gcd(int(PQ.step), int(UQ2.step))
     x,y       = symbols("x, y", integer=True)
     int_sol   = diophantine((int(UQ1.step)*x) - (int(sigma_p)*int(UQ2.step)*y) - (int(PQ.size)-int(UQ1.size)))
@@ -1060,12 +1663,20 @@ def checkAggregateCompatibility2UQ(PQ, UQ1, UQ2):
     sol = str(int_sol)
     k = sol.split(",", 1)[1].split(")", 1)[0]
 
-    kp_min = -1
-    i = 0
-    while kp_min < 0:
-        l = k.replace('t_0', str(i))
-        k0 = eval(l)
-        kp_min= int(k0) * int(sigma_uq2)
+    k0 = eval(k.replace('t_0', '0'))
+    if k0 < 0 and 't_0' in k:
+        # k is linear in t_0: take its smallest non negative value
+        a = eval(k.replace('t_0', '1')) - k0
+        if a != 0:
+            k0 = k0 % abs(a)
+    kp_min = int(k0) * int(sigma_uq2)
+
+    if kp_min < 0:
+        #-----------------------#
+        vprint(7, f"   No time window of {PQ.prefix} can be built by disjoint union of time windows of {UQ1.prefix} and {UQ2.prefix}.\033[0m")
+        vprint(7)
+        #-----------------------#
+        return {'compatible' : True, 'reason' : ''}
 
     ## Computing smallest time window for PQ that can be built from the disjoint union of time windows of utility queries      
     tw = kp_min+1
@@ -1078,147 +1689,798 @@ def checkAggregateCompatibility2UQ(PQ, UQ1, UQ2):
 
     
 
-def printQueryResults(results, vars):
+@metrics.timed('precheck')
+def precheckPrivacyQuery(PQ):
     """
-    Prints the result of q SAPRQL query (RDFlib)
-
-    inputs: - results -> query results
-            - vars    -> list of var names
-    output: - None
+    Tests necessary conditions for the graph pattern of PQ to be included into the union of graph patterns of utility
+    queries (see checkGraphPatternOverlap()), with the indexes of utility queries (see indexUtilityQueries()):
+        - predicates: each predicate of PQ is used by a utility query,
+        - outputs: each variable of PQ can be mapped to a variable of utility queries having the same positions
+          (predicate and subject, object or timestamp), an output variable to an output variable,
+        - joins: the variables of each join of PQ can be mapped to the same variable, or both to output variables.
+    When one of them fails, PQ is compatible with the utility policy.
+
+    inputs: - PQ -> rewritten and reified privacy TACQ
+    output: - a couple (failed condition, explanation), None if all conditions hold
     """
-    if not isinstance(vars, list):
-        raise TypeError('The parameter "vars" of printQueryResults() must be a list of var names !')
+    predicates = {}
+    for t in PQ.gp:
+        if t.predicate == ':predicate':
+            # a variable predicate can be mapped to any predicate
+            if t.object[0] == '?':
+                return None
+            predicates[t.subject] = t.object
 
-    # size of line numbers
-    lnb = len(str(len(results)))
-        
-    # size of var names
-    lv = [len(v) for v in vars]
+    for p in predicates.values():
+        if not p in uqPredicates:
+            return ('predicates', f"The predicate {p} is used by no utility query")
 
-    # header
-    header1 = '+-' + '-'*lnb + '-+-'
-    header2 = '| ' + f"{'#':{lnb}}" + ' | '
-    for v in range(len(vars)):
-        header1 = header1 + '-' * lv[v] + '-+-'
-        header2 = header2 + f"{vars[v]:{lv[v]}}" +' | '
-    print(header1[:-1])
-    print(header2[:-1])
-    print(header1[:-1])
+    candidates = {}   # variables of utility queries a variable of PQ can be mapped to {variable : set of variables}
+    for t in PQ.gp:
+        if t.subject in predicates and t.predicate != ':predicate' and t.object[0] == '?':
+            v = t.object
+            terms = uqPositions.get((predicates[t.subject], t.predicate, v[1] == 'o'), set())
+            candidates[v] = candidates[v] & terms if v in candidates else terms
+            if not candidates[v]:
+                return ('outputs', f"{v} cannot be mapped to {'an output variable' if v[1] == 'o' else 'a variable'} of utility queries")
 
-    # content
-    nb = 1
-    for res in results:
-        line = '| ' + f"{nb:{lnb}}" + ' | '
-        for v in range(len(vars)):
-            line = line + f"{res[v]:{lv[v]}}" + ' | '
-        print(line[:-1])
-        nb = nb +1
-    print(header1[:-1])
+    def output(terms):
+        return any(v[1] == 'o' for v in terms)
 
+    for (l, r) in PQ.joins:
+        if l in candidates and r in candidates and candidates[l].isdisjoint(candidates[r]) \
+           and not (output(candidates[l]) and output(candidates[r])):
+            return ('joins', f"{l} and {r} cannot be mapped to the same variable, nor to output variables, of utility queries")
 
+    return None
 
-def get_cmd_line_args():
-    """
-    Parse the command line to get parameters.
-    
-    input:  - none
-    output: - a Namespace containing parameter values
-    """
-    parser = argparse.ArgumentParser()
-    parser.add_argument('-p', '--privacy', help = 'file containing the privacy queries', default = 'privacy.sparql')
-    parser.add_argument('-u', '--utility', help = 'file containing the utility queries', default = 'utility.sparql')
-    parser.add_argument('-v', '--verbose', help = 'levels of details', default="0")
-    return parser.parse_args()
 
 
+frozenUnions = {}   # freezings of unions of some utility queries {tuple of names : FrozenPolicy}, see relevantPolicy()
 
-def vprint(filter='0', *args):
-    """
-    Prints arguments if Verbose is on.
+UNIONS_SIZE = 100   # maximal number of kept freezings of unions
 
-    inputs: - something to print
-    output: - None
+
+def relevantPolicy(PQ, UQs, frozenUQs):
     """
-    if str(filter) in mainArgs.verbose or str(filter) == '0':
-        for i in list(args):
-            print(str(i), end=" ")
-        print()
+    Restricts the utility policy to the utility queries using predicates of PQ. Variables of utility queries are
+    renamed apart, so the graph pattern of PQ can only be mapped into the triples of these utility queries.
+    The union of their graph patterns is frozen once for all the privacy queries using the same utility queries.
+    The filter check conjoins the filters of all the utility queries: the policy is not restricted when the filter
+    of another utility query is unsatisfiable, other filters having no variable in common with these conditions.
 
-    
-mainArgs = get_cmd_line_args()
+    Verbose level: 3
 
-def main():
+    inputs: - PQ        -> rewritten and reified privacy TACQ
+            - UQs       -> dictionary of rewritten and reified utility TACQs
+            - frozenUQs -> FrozenPolicy of the union of all utility queries
+    output: - a FrozenPolicy
     """
-    Main function implementing the chain of tests
+    names = set()
+    for t in PQ.gp:
+        if t.predicate == ':predicate':
+            # a variable predicate can be mapped to any predicate
+            if t.object[0] == '?':
+                return frozenUQs
+            names.update(uqPredicates.get(t.object, ()))
+    metrics.count('relevantUQs', len(names))
+    if len(names) == len(UQs) or not unsatisfiableUQs <= names:
+        return frozenUQs
+
+    key = tuple(q for q in UQs.keys() if q in names)
+    #-----------------------#
+    vprint(3, f"   Utility queries using predicates of {PQ.prefix}: {', '.join(key) if key else 'none'}")
+    vprint(3)
+    #-----------------------#
+    if not key in frozenUnions:
+        union = TACQ()
+        for q in key:
+            union = union.union(UQs[q])
+        # utility queries may have been frozen alone by the aggregate checks
+        union.constants = {}
+        union.constVars = {}
+        if len(frozenUnions) >= UNIONS_SIZE:
+            frozenUnions.clear()
+        # a utility query subsuming one of them uses its predicates, so it is one of them
+        frozenUnions[key] = FrozenPolicy(union, [t for q in key if q in subsumedUQs for t in UQs[q].gp])
+    return frozenUnions[key]
+
+
+
+def checkPrivacyQuery(q, PQ, origPQ, UQs, frozenUQs, details=None):
+    """
+    Checks the compatibility of one privacy query with the utility policy.
+
+    inputs: - q         -> name of the privacy query
+            - PQ        -> rewritten and reified privacy TACQ
+            - origPQ    -> original privacy TACQ
+            - UQs       -> dictionary of rewritten and reified utility TACQs
+            - frozenUQs -> FrozenPolicy of the union of utility queries
+            - details   -> dictionary where the reasons (list of strings) and the mappings
+                           of the filter check ({line : mapping}) are stored, if given
+    output: - 'True', 'Maybe' or 'False'
     """
+    if details is None:
+        details = {}
+    details['reasons'] = []
+    details['mappings'] = {}
+
+    metrics.startQuery(q)
+    metrics.count('reifiedTriples', len(PQ.gp))
+    comp = 'True'
+    #-----------------------#
+    vprint(1,'\033[33m  ','='*(len(q)+14),'\033[0m')
+    vprint(1,'\033[33m  ','Testing query',q,'\033[0m')
+    vprint(1,'\033[33m  ','='*(len(q)+14),'\033[0m')
+    vprint(1)
+    #-----------------------#
+
+    ## Check inclusion of graph patterns
 
-    # Arguments
-    
     #-----------------------#
-    vprint(0,'\033[1;34m----------\033[0m')
-    vprint(0,'\033[1;34mArguments:\033[0m')
-    vprint(0,'\033[1;34m----------\033[0m')
-    vprint(0,'Privacy file:', mainArgs.privacy)
-    vprint(0,'Utility file:', mainArgs.utility)
-    if mainArgs.verbose != '0':
-        vprint(0,f"Verbose is {mainArgs.verbose}.")
-    else:
-        vprint(0,'Verbose is off.')
-    vprint(0)
+    vprint(3,'\033[1;34m   ==========================================================================\033[0m')
+    vprint(3,'\033[1;34m   Checking inclusion of PQ graph pattern into the union of UQ graph patterns\033[0m')
+    vprint(3,'\033[1;34m   ==========================================================================\033[0m')
+    vprint(3)
     #-----------------------#
 
-    # Privacy queries
-    PQs = readTACQs(mainArgs.privacy, 'PQ')
+    # fast necessary conditions first
+    precheck = precheckPrivacyQuery(PQ)
+    metrics.count('precheckQueries')
+    if precheck is not None:
+        metrics.count('precheck' + precheck[0].capitalize())
+        #-----------------------#
+        vprint(3, f"   {precheck[1]}.")
+        vprint(3)
+        #-----------------------#
+        res = {'compatible' : True, 'reasons' : [], 'results' : []}
+    else:
+        frozen = relevantPolicy(PQ, UQs, frozenUQs)
+        # the filter check reads all the result lines of a privacy query that is not plain conjunctive
+        res = checkGraphPatternOverlap(PQ, frozen, full=not PQ.isConjunctive())
+    details['reasons'].extend(res['reasons'])
 
-    origPQs = {}
-    for q in PQs.keys():
-        origPQs.update({q : PQs[q].copy()})
+    if res['compatible']:
+        vprint(1,f"\033[1;33m   The graph pattern of privacy query {PQ.prefix} is not included into the union of graph patterns of utility queries.\033[0m")
+        vprint(1)
+        vprint(1,f"\033[1;32m   Privacy query {q} is compatible with the utility policy.\033[1;37\033[0m")
+        vprint(1)
+    else:
+        # conjunctive query => full characterization
+        if PQ.isConjunctive():
+            #-----------------------#
+            for r in res['reasons']:
+                vprint(3,'\033[1;33m  ',r,'\033[0m')
+            vprint(1)
+            vprint(1,f"\033[1;33m   The graph pattern of the plain conjunctive privacy query {PQ.prefix} can be included into the union of graph patterns of utility queries by joining some output variables.\033[0m")
+            vprint(1)
+            vprint(1,f"\033[1;31m   Privacy query {q} IS NOT COMPATIBLE with utility policy !\033[0m")
+            vprint(1)
+            #-----------------------#
+            comp = 'False'
+        # TACQ => sufficient condition
+        else:
+            #-----------------------#
+            for r in res['reasons']:
+                vprint(3,'\033[1;33m  ',r,'\033[0m')
+            vprint(1,f"\033[1;33m   The graph pattern of privacy query {PQ.prefix} can be included into the union of graph patterns of utility queries by union of some output variables.\033[0m")
+            vprint(1)
+            vprint(1,f"\033[33m   Privacy query {q} MAY NOT BE COMPATIBLE with utility policy !\033[0m")
+            vprint(1,'\033[33m   Filter conditions have to be checked...\033[0m')
+            vprint(1)
+            #-----------------------#
+            if comp != 'False':
+                comp = 'Maybe'
 
     #-----------------------#
-    vprint(1,'\033[1;34m----------------\033[0m')
-    vprint(1,'\033[1;34mPrivacy queries:\033[0m')
-    vprint(1,'\033[1;34m----------------\033[0m')
-    for q in PQs.keys():
-        vprint(1,q, ':')
-        vprint(1,PQs[q].toString())
-        vprint(1)
+    vprint(3)
     #-----------------------#
 
-    # Rename variables and extract joins from privacy queries
-    for q in PQs.keys():
-        PQs[q].renameVariables(prefix=q)
-        PQs[q].extractJoins()
-    
+    ## Check Filter conjunction
+    if comp == 'Maybe':
+        comp = 'True'
+
+        #-----------------------#
+        vprint(4,'\033[1;34m   ================================================================================================\033[0m')
+        vprint(4,'\033[1;34m   Satisfiability checking of conjunction of Filter conditions of privacy query and utility queries\033[0m')
+        vprint(4,'\033[1;34m   ================================================================================================\033[0m')
+        vprint(4)
+        #-----------------------#
+
+        if not PQ.filter:
+            v = list(PQ.variables.keys())[0]
+            PQ.filter = [Condition(v, '=', v)]
+            
+        res = checkFilterConjunctionSatisfiability(PQ, frozen, res['results'])
+        details['mappings'] = res['mappings']
+        if res['compatible']:
+            #-----------------------#
+            vprint(1,"\033[1;33m   The filter expression is not satisfiable.\033[0m")
+            vprint(1)
+            vprint(1,f"\033[1;32m   Privacy query {q} is compatible with utility policy.\033[0m ")
+            vprint(1)
+            #-----------------------#
+        else:
+            #-----------------------#
+            line = ''
+            for n in res['reasons']:
+                line = line + str(n) +", "
+            if '4' in mainArgs.verbose:
+                vprint(1,"\033[1;33m   The filter expression is satisfiable for result line(s)", line[:-2], '.\033[0m')
+            else:
+                vprint(1,"\033[1;33m   The filter expression is satisfiable.\033[0m")
+            vprint(1)
+            if PQ.aggregate:
+                #-----------------------#
+                vprint(1,f"\033[33m   Privacy query {q}, containing aggregates computation, MAY NOT BE COMPATIBLE with utility policy !\033[0m")
+                vprint(1,"\033[33m   Aggregate functions and time windows have to be checked...\033[0m")
+                vprint(1)
+                #-----------------------#
+                if comp != 'False':
+                    comp = 'Maybe'
+            else:
+                #-----------------------#
+                vprint(1,f"\033[1;31m   Privacy query {q}, containing no aggregate computation, IS WEAKLY INCOMPATIBLE with utility policy !\033[0m")
+                vprint(1)
+                #-----------------------#
+                comp = 'False'
+
+
+    ## Check aggregate and time windows with each utility query
+
+    UQsToCheck = []         # list of UQs to be checked two by two (or more ?)
+
+    if comp == 'Maybe':
+        comp = 'True'
+        #-----------------------#
+        vprint(6, "\033[1;34m   ==================================================================================================\033[0m")
+        vprint(6, "\033[1;34m   Checking compatibility of aggregate computation and time window definition with each utility query\033[0m")
+        vprint(6, "\033[1;34m   ==================================================================================================\033[0m")
+        vprint(6)
+        #-----------------------#
+
+        ## original PQ, prepared once for all UQs
+        origPQ.prefix = q
+        prepared = PreparedQuery(origPQ, PQ)
+        PQ = origPQ
+
+        # For each UQ
+        for uq in UQs.keys():
+            vprint(6, '   \033[1;33m----------------------\033[0m')
+            vprint(6,f"   \033[1;33mTesting {q} versus {uq}\033[0m")
+            vprint(6, '   \033[1;33m----------------------\033[0m')
+            vprint(6)
+
+            UQ = UQs[uq]
+            metrics.count('uqChecked')
+            res = checkAggregateCompatibility1UQ(prepared, UQ)
+            if not res['compatible']:
+                details['reasons'].append(res['reason'])
+                #-----------------------#
+              #if not '6' in mainArgs.verbose:
+                vprint(1, '\033[1;33m   ' + res['reason'])
+                vprint(1)
+                vprint(1, f"\033[1;31m   Privacy query {PQ.prefix} IS NOT COMPATIBLE with utility query {UQ.prefix} !\033[0m")
+                vprint(1)
+                #-----------------------#
+                comp = 'False'
+            else:
+                if res['toCheck']:
+                    UQsToCheck.append(UQ)
+                #-----------------------#
+                vprint(6, f"\033[1;32m   Privacy query {PQ.prefix} and utility query {UQ.prefix} are compatible.\033[0m")
+                vprint(6)
+                #-----------------------#
+        
+        if comp == 'True':
+            if len(UQsToCheck) < 2:
+                #-----------------------#
+                vprint(1, f"\033[1;32m   Privacy query {PQ.prefix} is compatible with the utility policy.\033[0m")
+                vprint(1)
+                #-----------------------#
+            else:
+                #-----------------------#
+                vprint(1, f"\033[1;33m   Privacy query {PQ.prefix} is compatible with each utility query individually.\033[0m")
+                vprint(1)
+                vprint(1, f"\033[33m   But it has to be checked against each pairs of relevant utility queries...\033[0m")
+                vprint(1)
+                #-----------------------#
+
+                #-----------------------#
+                vprint(7, "\033[1;34m   ============================================================================================================\033[0m")
+                vprint(7, "\033[1;34m   Checking compatibility of aggregate computation and time window definition with each pair of utility queries\033[0m")
+                vprint(7, "\033[1;34m   ============================================================================================================\033[0m")
+                vprint(7)
+                #-----------------------#
+
+
+                # Loop for taking two utility queries as an input
+                for i1 in range(0, len(UQsToCheck)-1):
+                    for i2 in range(i1+1, len(UQsToCheck)):
+                        UQ1 = UQsToCheck[i1]
+                        UQ2 = UQsToCheck[i2]
+                        #-----------------------#
+                        vprint(7, '   \033[1;33m------------------------------------------------------\033[0m')
+                        vprint(7,f"   \033[1;33mTesting {q} versus the pair {UQ1.prefix} and {UQ2.prefix}\033[0m")
+                        vprint(7, '   \033[1;33m------------------------------------------------------\033[0m')
+                        vprint(7)
+                        #-----------------------#
+                        metrics.count('uqPairs')
+                        res = checkAggregateCompatibility2UQ(PQ, UQ1, UQ2)
+                        if not res['compatible']:
+                            details['reasons'].append(res['reason'])
+                            #-----------------------#
+                            vprint(1, '\033[1;33m   ' + res['reason'])
+                            vprint(1)
+                            vprint(1, f"\033[1;31m   Privacy query {PQ.prefix} IS NOT COMPATIBLE with the utility policy !\033[0m")
+                            vprint(1)
+                            #-----------------------#
+                            comp = 'False'
+                        else:
+                            #-----------------------#
+                            vprint(7, f"\033[1;32m   Privacy query {PQ.prefix} is compatible with utility queries {UQ1.prefix} and {UQ2.prefix}.\033[0m")
+                            vprint(7)
+                            #-----------------------#    
+                if comp == 'True':
+                    #-----------------------#
+                    vprint(1, f"\033[1;32m   Privacy query {PQ.prefix} is compatible with the utility policy.\033[0m")
+                    vprint(1)
+                    #-----------------------#
+
+    metrics.stopQuery(comp)
+    return comp
+
+
+
+workerState = {}   # utility policy shared by the privacy query checks of a worker process
+
+
+def initWorker(args, UQs, frozenUQs):
+    """
+    Initializes a worker process checking privacy queries.
+
+    inputs: - args      -> command line arguments of the main process
+            - UQs       -> dictionary of rewritten and reified utility TACQs
+            - frozenUQs -> FrozenPolicy of the union of utility queries
+    output: - None
+    """
+    global mainArgs
+    mainArgs = args
+    workerState['UQs'] = UQs
+    workerState['frozenUQs'] = frozenUQs
+    indexUtilityQueries(UQs)
+
+
+
+def checkPrivacyQueryJob(q, PQ, origPQ):
+    """
+    Checks one privacy query in a worker process, capturing the printed report and the measures.
+
+    inputs: - q      -> name of the privacy query
+            - PQ     -> rewritten and reified privacy TACQ
+            - origPQ -> original privacy TACQ
+    output: - a tuple (verdict, report, measures, details), see checkPrivacyQuery() for details
+    """
+    metrics.reset()
+    report = io.StringIO()
+    details = {}
+    with contextlib.redirect_stdout(report):
+        comp = checkPrivacyQuery(q, PQ, origPQ, workerState['UQs'], workerState['frozenUQs'], details)
+    return (comp, report.getvalue(), metrics.toDict(), details)
+
+
+
+def checkPrivacyQueries(PQs, UQs, frozenUQs):
+    """
+    Checks privacy queries one after the other, unless their verdict is cached or they are aliases.
+
+    inputs: - PQs       -> iterable of tuples (name, rewritten and reified privacy TACQ, original privacy TACQ, alias), see preparePrivacyQueries()
+            - UQs       -> dictionary of rewritten and reified utility TACQs
+            - frozenUQs -> FrozenPolicy of the union of utility queries
+    output: - generator of verdicts ('True', 'Maybe' or 'False')
+    """
+    verdicts = {}   # verdicts of checked privacy queries, for their aliases
+    for (q, PQ, origPQ, alias) in PQs:
+        if alias is not None:
+            comp = aliasVerdict(q, alias, verdicts[alias])
+        else:
+            (key, comp) = cachedVerdict(q, PQ)
+            if comp is None:
+                details = {}
+                comp = checkPrivacyQuery(q, PQ, origPQ, UQs, frozenUQs, details)
+                storeVerdict(key, q, comp, details)
+            verdicts[q] = comp
+        yield comp
+
+
+
+def checkPrivacyQueriesInParallel(PQs, UQs, frozenUQs):
+    """
+    Checks privacy queries with a pool of processes, unless their verdict is cached or they are aliases.
+    Reports are printed and verdicts are returned in the order of the privacy queries.
+    Privacy queries are submitted as they are read, at most two per process being pending.
+    Measures of the workers are merged into the metrics of the run.
+
+    inputs: - PQs       -> iterable of tuples (name, rewritten and reified privacy TACQ, original privacy TACQ, alias), see preparePrivacyQueries()
+            - UQs       -> dictionary of rewritten and reified utility TACQs
+            - frozenUQs -> FrozenPolicy of the union of utility queries
+    output: - generator of verdicts ('True', 'Maybe' or 'False')
+    """
+    from collections import deque
+    from concurrent.futures import Future, ProcessPoolExecutor
+
+    verdicts = {}   # verdicts of checked privacy queries, for their aliases
+
+    def result(q, key, job, alias):
+        # aliases come after the query they share the verdict of
+        if alias is not None:
+            return aliasVerdict(q, alias, verdicts[alias])
+        (comp, report, measures, details) = job.result()
+        print(report, end='')
+        if measures is not None:
+            metrics.merge(measures)
+            storeVerdict(key, q, comp, details)
+        verdicts[q] = comp
+        return comp
+
+    with ProcessPoolExecutor(max_workers=mainArgs.jobs, initializer=initWorker, initargs=(mainArgs, UQs, frozenUQs)) as pool:
+        jobs = deque()
+        for (q, PQ, origPQ, alias) in PQs:
+            key = job = None
+            if alias is None:
+                # cached verdicts are reported in turn, as done jobs
+                report = io.StringIO()
+                with contextlib.redirect_stdout(report):
+                    (key, comp) = cachedVerdict(q, PQ)
+                if comp is None:
+                    job = pool.submit(checkPrivacyQueryJob, q, PQ, origPQ)
+                else:
+                    job = Future()
+                    job.set_result((comp, report.getvalue(), None, None))
+            jobs.append((q, key, job, alias))
+            if len(jobs) > 2 * mainArgs.jobs:
+                yield result(*jobs.popleft())
+        while jobs:
+            yield result(*jobs.popleft())
+
+
+
+verdictCache = None   # VerdictCache of the run, None if verdicts are not cached
+
+CHECK_SOURCES = ['compatibilityChecking.py', 'TACQ.py', 'homomorphism.py', 'orderSolver.py', 'canonicalLabeling.py']
+                      # source files of the checks, whose changes invalidate cached verdicts
+
+UNCACHED_OPTIONS = ['privacy', 'utility', 'verbose', 'jobs', 'metrics', 'cache', 'cache_dir', 'cache_size']
+                      # command line options that do not change verdicts, the other ones are in the cache context
+
+
+def generalizeName(text, q):
+    """
+    Replaces the name of a privacy query (also in its variables, e.g. ?o_PQ1_2) by a placeholder.
+
+    inputs: - text -> a string
+            - q    -> name of the privacy query
+    output: - the string with '{PQ}' instead of q
+    """
+    return re.sub(rf"(?<![A-Za-z0-9]){re.escape(q)}(?![0-9])", '{PQ}', text)
+
+
+
+def specializeName(text, q):
+    """
+    Replaces the placeholder of generalizeName() by the name of a privacy query.
+
+    inputs: - text -> a string
+            - q    -> name of the privacy query
+    output: - the string with q instead of '{PQ}'
+    """
+    return text.replace('{PQ}', q)
+
+
+
+def cacheDirectory():
+    """
+    Gives the directory of the cache of verdicts, the cache being used only if asked for.
+
+    inputs: - None
+    output: - the directory, None if verdicts are not cached
+    """
+    if mainArgs.cache_dir is not None:
+        return mainArgs.cache_dir
+    if mainArgs.cache:
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), '.verdict-cache')
+    return None
+
+
+
+def cachedVerdict(q, PQ):
+    """
+    Looks for the verdict of a privacy query in the cache, and reports it if found.
+
+    inputs: - q  -> name of the privacy query
+            - PQ -> rewritten and reified privacy TACQ
+    output: - a couple (key, verdict), the verdict being None if unknown (the key too if there is no cache)
+    """
+    if verdictCache is None:
+        return (None, None)
+
+    key = verdictCache.key(generalizeName(PQ.toString(), q))
+    entry = verdictCache.get(key)
+    if entry is None:
+        metrics.count('cacheMisses')
+        return (key, None)
+
+    metrics.startQuery(q)
+    metrics.count('cacheHits')
     #-----------------------#
-    vprint(1,'--------------------------')
-    vprint(1,'Rewritten privacy queries:')
-    vprint(1,'--------------------------')
-    for q in PQs.keys():
-        vprint(1,q, ':')
-        vprint(1,PQs[q].toString())
-        if '1' in mainArgs.verbose:
-            PQs[q].printVariables()
-        vprint(1,)
+    vprint(0,f"Verdict of {q} read from the cache, without checking it.")
     #-----------------------#
+    comp = entry['verdict']
+    reasons = [specializeName(r, q) for r in entry['reasons']]
+    mappings = {line : {specializeName(v, q) : w for (v, w) in mapping.items()} for (line, mapping) in entry['mappings'].items()}
+    reportKnownVerdict(q, comp, 'cached verdict', reasons, mappings)
+    metrics.stopQuery(comp)
+    return (key, comp)
+
 
-    # Reify privacy queries
 
+def aliasVerdict(q, alias, comp):
+    """
+    Reports the verdict of a privacy query that has the same canonical form as a previous one.
+
+    inputs: - q     -> name of the privacy query
+            - alias -> name of the previous privacy query
+            - comp  -> verdict of the previous privacy query
+    output: - the verdict
+    """
+    metrics.startQuery(q)
+    reportKnownVerdict(q, comp, f"verdict of {alias}")
+    metrics.stopQuery(comp)
+    return comp
+
+
+
+def reportKnownVerdict(q, comp, origin, reasons=[], mappings={}):
+    """
+    Reports a verdict that is not computed by checking the privacy query.
+
+    Verbose level: 1, 3 and 4
+
+    inputs: - q        -> name of the privacy query
+            - comp     -> verdict ('True', 'Maybe' or 'False')
+            - origin   -> where the verdict comes from
+            - reasons  -> list of reasons of the verdict
+            - mappings -> mappings found by the filter check {line : mapping}
+    output: - None
+    """
     #-----------------------#
-    vprint(1,'------------------------')
-    vprint(1,'Reified privacy queries:')
-    vprint(1,'------------------------')
+    vprint(1,'\033[33m  ','='*(len(q)+14),'\033[0m')
+    vprint(1,'\033[33m  ','Testing query',q,'\033[0m')
+    vprint(1,'\033[33m  ','='*(len(q)+14),'\033[0m')
+    vprint(1)
+    for r in reasons:
+        vprint(3,'\033[1;33m  ',r,'\033[0m')
+    for (line, mapping) in mappings.items():
+        vprint(4,f"   Line {line}:", mapping)
+    if comp == 'True':
+        vprint(1,f"\033[1;32m   Privacy query {q} is compatible with the utility policy ({origin}).\033[0m")
+    elif comp == 'Maybe':
+        vprint(1,f"\033[33m   Privacy query {q} MAY NOT BE COMPATIBLE with utility policy ({origin}) !\033[0m")
+    else:
+        vprint(1,f"\033[1;31m   Privacy query {q} IS NOT COMPATIBLE with utility policy ({origin}) !\033[0m")
+    vprint(1)
     #-----------------------#
 
-    for q in PQs.keys():
-        PQs[q].reify()
 
-    #-----------------------#
-    for q in PQs.keys():
+
+def storeVerdict(key, q, comp, details):
+    """
+    Stores the verdict of a privacy query in the cache.
+
+    inputs: - key     -> key given by cachedVerdict()
+            - q       -> name of the privacy query
+            - comp    -> verdict
+            - details -> reasons and mappings of the checks (see checkPrivacyQuery())
+    output: - None
+    """
+    if verdictCache is None:
+        return
+    reasons = [generalizeName(str(r), q) for r in details['reasons']]
+    mappings = {str(line) : {generalizeName(str(v), q) : str(w) for (v, w) in mapping.items()}
+                for (line, mapping) in details['mappings'].items()}
+    verdictCache.put(key, comp, reasons, mappings)
+
+
+
+def printQueryResults(results, vars):
+    """
+    Prints the result of q SAPRQL query (RDFlib)
+
+    inputs: - results -> query results
+            - vars    -> list of var names
+    output: - None
+    """
+    if not isinstance(vars, list):
+        raise TypeError('The parameter "vars" of printQueryResults() must be a list of var names !')
+
+    # size of line numbers
+    lnb = len(str(len(results)))
+        
+    # size of var names
+    lv = [len(v) for v in vars]
+
+    # header
+    header1 = '+-' + '-'*lnb + '-+-'
+    header2 = '| ' + f"{'#':{lnb}}" + ' | '
+    for v in range(len(vars)):
+        header1 = header1 + '-' * lv[v] + '-+-'
+        header2 = header2 + f"{vars[v]:{lv[v]}}" +' | '
+    print(header1[:-1])
+    print(header2[:-1])
+    print(header1[:-1])
+
+    # content
+    nb = 1
+    for res in results:
+        line = '| ' + f"{nb:{lnb}}" + ' | '
+        for v in range(len(vars)):
+            line = line + f"{res[v]:{lv[v]}}" + ' | '
+        print(line[:-1])
+        nb = nb +1
+    print(header1[:-1])
+
+
+
+def get_cmd_line_args(args=None):
+    """
+    Parse the command line to get parameters.
+    
+    input:  - args -> list of arguments, default is the command line
+    output: - a Namespace containing parameter values
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-p', '--privacy', help = 'file, directory or glob pattern of the privacy queries', default = 'privacy.sparql')
+    parser.add_argument('-u', '--utility', help = 'file, directory or glob pattern of the utility queries', default = 'utility.sparql')
+    parser.add_argument('-v', '--verbose', help = 'levels of details', default="0")
+    parser.add_argument('-j', '--jobs', help = 'number of processes checking privacy queries in parallel', type = int, default = 1)
+    parser.add_argument('-e', '--engine', help = 'engine evaluating graph patterns over freezings', choices = ['native', 'sparql'], default = 'native')
+    parser.add_argument('-s', '--solver', help = 'solver checking filter satisfiability', choices = ['order', 'csp'], default = 'order')
+    parser.add_argument('-m', '--metrics', help = 'file where stage times and counters are written in JSON', default = None)
+    parser.add_argument('--cache', help = 'reuse the verdicts of privacy queries stored by previous runs', action = 'store_true')
+    parser.add_argument('--cache-dir', help = 'directory of the cache of verdicts (implies --cache)', default = None)
+    parser.add_argument('--cache-size', help = 'maximal number of cached verdicts', type = int, default = 10000)
+    return parser.parse_args(args)
+
+
+
+def vprint(filter='0', *args):
+    """
+    Prints arguments if Verbose is on.
+
+    inputs: - something to print
+    output: - None
+    """
+    if str(filter) in mainArgs.verbose or str(filter) == '0':
+        for i in list(args):
+            print(str(i), end=" ")
+        print()
+
+
+# default arguments when imported as a module (e.g. by benchmarks)
+mainArgs = get_cmd_line_args(None if __name__ == '__main__' else [])
+
+def preparePrivacyQueries(path):
+    """
+    Reads privacy queries one at a time, and rewrites and reifies each one as soon as it is read.
+
+    Verbose level: 1
+
+    Privacy queries that have the same canonical form as a previous one (i.e. that differ only by
+    variable names and by the order of triples and conditions) are not rewritten: they are aliases
+    of the previous query and share its verdict. Graph patterns of privacy queries without aggregate
+    are replaced by their core (see TACQ.minimize()) before rewriting.
+
+    inputs: - path -> privacy policy file, directory or glob pattern (see iterTACQs())
+    output: - generator of tuples (name, rewritten and reified privacy TACQ, original privacy TACQ, alias), where
+              alias is the name of the previous query with the same canonical form (and the rewritten TACQ is None), or None
+    """
+    forms = {}   # dictionary {canonical form : name of the first privacy query having it}
+    for (q, PQ) in iterTACQs(path, 'PQ'):
+        metrics.start('rewriting')
+        origPQ = PQ.copy()
+
+        #-----------------------#
         vprint(1,q, ':')
-        vprint(1,PQs[q].toString())
+        vprint(1,PQ.toString())
         vprint(1)
-    #-----------------------#
+        #-----------------------#
+
+        # Equivalent queries are checked once
+        form = PQ.canonicalize().toString()
+        if form in forms:
+            #-----------------------#
+            vprint(1,f"{q} has the same canonical form as {forms[form]}.")
+            vprint(1)
+            #-----------------------#
+            metrics.stop('rewriting')
+            metrics.count('privacyQueries')
+            metrics.count('aliasQueries')
+            yield (q, None, origPQ, forms[form])
+            continue
+        forms[form] = q
+
+        # Remove redundant triples (aggregate checks compare graph patterns as written, see checkIsomorphism())
+        if not PQ.aggregate:
+            eliminated = PQ.minimize()
+            metrics.count('eliminatedPQTriples', len(eliminated))
+            #-----------------------#
+            if eliminated:
+                vprint(1,f"Core of {q}: {len(eliminated)} redundant triple(s) eliminated.")
+                vprint(1)
+            #-----------------------#
+
+        # Rename variables and extract joins
+        PQ.renameVariables(prefix=q)
+        PQ.extractJoins()
+
+        #-----------------------#
+        vprint(1,'Rewritten', q, ':')
+        vprint(1,PQ.toString())
+        if '1' in mainArgs.verbose:
+            PQ.printVariables()
+        vprint(1)
+        #-----------------------#
+
+        # Reify
+        PQ.reify()
+
+        #-----------------------#
+        vprint(1,'Reified', q, ':')
+        vprint(1,PQ.toString())
+        vprint(1)
+        #-----------------------#
+
+        metrics.stop('rewriting')
+        metrics.count('privacyQueries')
+        yield (q, PQ, origPQ, None)
+
+
+
+def main():
+    """
+    Main function implementing the chain of tests
+    """
+
+    # Arguments
     
+    #-----------------------#
+    vprint(0,'\033[1;34m----------\033[0m')
+    vprint(0,'\033[1;34mArguments:\033[0m')
+    vprint(0,'\033[1;34m----------\033[0m')
+    vprint(0,'Privacy file:', mainArgs.privacy)
+    vprint(0,'Utility file:', mainArgs.utility)
+    vprint(0,'Graph pattern engine:', mainArgs.engine)
+    vprint(0,'Filter solver:', mainArgs.solver)
+    if mainArgs.jobs > 1:
+        vprint(0,'Parallel jobs:', mainArgs.jobs)
+    if mainArgs.metrics:
+        vprint(0,'Metrics file:', mainArgs.metrics)
+    if cacheDirectory():
+        vprint(0,'Verdict cache:', cacheDirectory())
+    if mainArgs.verbose != '0':
+        vprint(0,f"Verbose is {mainArgs.verbose}.")
+    else:
+        vprint(0,'Verbose is off.')
+    vprint(0)
+    #-----------------------#
+
+    # satisfiability results and certificates are memoized for this run only
+    satisfiabilityMemo.clear()
+    templates.clear()
+    certificates.clear()
+
+    metrics.start('rewriting')
+
     # Utility queries
     UQs = readTACQs(mainArgs.utility, 'UQ')
 
@@ -1232,6 +2494,17 @@ def main():
         vprint(1)
     #-----------------------#
 
+    # Remove duplicate triples of utility queries: their variables are all kept, because the filter check
+    # rewrites the conditions of PQs with the variables of UQs that each result line gives
+    for q in UQs.keys():
+        eliminated = UQs[q].minimize(fixed=[x for t in UQs[q].gp for x in t.values()])
+        metrics.count('eliminatedUQTriples', len(eliminated))
+        #-----------------------#
+        if eliminated:
+            vprint(1,f"Core of {q}: {len(eliminated)} duplicate triple(s) eliminated.")
+            vprint(1)
+        #-----------------------#
+
     # Rename variables of utility queries
     for q in UQs.keys():
         UQs[q].renameVariables(prefix=q)
@@ -1263,6 +2536,16 @@ def main():
     #-----------------------#
 
 
+    # Index utility queries by certificate of their graph pattern, and find the subsumed ones
+    indexUtilityQueries(UQs)
+
+    #-----------------------#
+    for q in subsumedUQs.keys():
+        vprint(1,f"{q} is subsumed by {subsumedUQs[q]}: its graph pattern is left out of the overlap check.")
+    if subsumedUQs:
+        vprint(1)
+    #-----------------------#
+
     # Compute union of utility query graph patterns
     unionUQs = TACQ()
     for q in UQs.keys():
@@ -1276,218 +2559,78 @@ def main():
     vprint(2)
     #-----------------------#
 
+    # Freeze the union once, shared by all privacy queries
+    frozenUQs = FrozenPolicy(unionUQs, [t for q in subsumedUQs.keys() for t in UQs[q].gp])
+
+    metrics.stop('rewriting')
+    metrics.count('utilityQueries', len(UQs))
+    metrics.count('frozenTriples', len(frozenUQs.triples))
+    metrics.count('subsumedUQs', len(subsumedUQs))
+    metrics.count('skippedTriples', frozenUQs.skipped)
+
+    #-----------------------#
+    vprint(1,'\033[1;34m----------------\033[0m')
+    vprint(1,'\033[1;34mPrivacy queries:\033[0m')
+    vprint(1,'\033[1;34m----------------\033[0m')
+    #-----------------------#
+
+    # Verdicts already known for this utility policy and these options
+    global verdictCache
+    if cacheDirectory():
+        from verdictCache import VerdictCache, sourceStamp
+        sources = [os.path.join(os.path.dirname(os.path.abspath(__file__)), f) for f in CHECK_SOURCES]
+        for f in sources:
+            if not os.path.isfile(f):
+                vprint(0,f"\033[33mSource file {f} is missing: it is left out of the stamp of cached verdicts.\033[0m")
+        options = [f"{o} = {v}" for (o, v) in sorted(vars(mainArgs).items()) if not o in UNCACHED_OPTIONS]
+        context = '\n'.join([sourceStamp(sources)] + options + [uq + ' : ' + UQs[uq].toString() for uq in UQs.keys()])
+        verdictCache = VerdictCache(cacheDirectory(), context, mainArgs.cache_size)
+
+    # For each pricavy query, checked as soon as it is read
+    PQs = preparePrivacyQueries(mainArgs.privacy)
+    if mainArgs.jobs > 1:
+        verdicts = checkPrivacyQueriesInParallel(PQs, UQs, frozenUQs)
+    else:
+        verdicts = checkPrivacyQueries(PQs, UQs, frozenUQs)
 
-    # For each pricavy query
     compatibility = 'True'
-    for q in PQs.keys():
-        comp = 'True'
+    for comp in verdicts:
+        # Prepare conclusion
+        if comp == 'Maybe':
+            compatibility = 'Maybe'
+        elif comp == 'False':
+            compatibility = 'False'
+
+    if verdictCache is not None:
+        verdictCache.close()
+        verdictCache = None
+      
+    # Privacy queries proved compatible by pre-checks
+    prechecked = metrics.counters.get('precheckQueries', 0)
+    if prechecked:
+        hits = {test : metrics.counters.get('precheck' + test.capitalize(), 0) for test in ['predicates', 'outputs', 'joins']}
         #-----------------------#
-        vprint(1,'\033[33m  ','='*(len(q)+14),'\033[0m')
-        vprint(1,'\033[33m  ','Testing query',q,'\033[0m')
-        vprint(1,'\033[33m  ','='*(len(q)+14),'\033[0m')
         vprint(1)
+        vprint(1,f"Pre-checks proved {sum(hits.values())} of {prechecked} checked privacy queries compatible",
+                 f"(predicates: {hits['predicates']}, outputs: {hits['outputs']}, joins: {hits['joins']}).")
         #-----------------------#
 
-        ## Check inclusion of graph patterns
-
+    # Utility queries left out of the overlap check
+    if subsumedUQs:
         #-----------------------#
-        vprint(3,'\033[1;34m   ==========================================================================\033[0m')
-        vprint(3,'\033[1;34m   Checking inclusion of PQ graph pattern into the union of UQ graph patterns\033[0m')
-        vprint(3,'\033[1;34m   ==========================================================================\033[0m')
-        vprint(3)
+        vprint(1)
+        vprint(1,f"Subsumption left {len(subsumedUQs)} of {len(UQs)} utility queries ({frozenUQs.skipped} of {len(frozenUQs.triples)} frozen triples)",
+                 "out of the overlap check.")
         #-----------------------#
 
-        res = checkGraphPatternOverlap(PQs[q], unionUQs)
-
-        if res['compatible']:
-            vprint(1,f"\033[1;33m   The graph pattern of privacy query {PQs[q].prefix} is not included into the union of graph patterns of utility queries.\033[0m")
-            vprint(1)
-            vprint(1,f"\033[1;32m   Privacy query {q} is compatible with the utility policy.\033[1;37\033[0m")
-            vprint(1)
-        else:
-            # conjunctive query => full characterization
-            if PQs[q].isConjunctive():
-                #-----------------------#
-                for r in res['reasons']:
-                    vprint(3,'\033[1;33m  ',r,'\033[0m')
-                vprint(1)
-                vprint(1,f"\033[1;33m   The graph pattern of the plain conjunctive privacy query {PQs[q].prefix} can be included into the union of graph patterns of utility queries by joining some output variables.\033[0m")
-                vprint(1)
-                vprint(1,f"\033[1;31m   Privacy query {q} IS NOT COMPATIBLE with utility policy !\033[0m")
-                vprint(1)
-                #-----------------------#
-                comp = 'False'
-            # TACQ => sufficient condition
-            else:
-                #-----------------------#
-                for r in res['reasons']:
-                    vprint(3,'\033[1;33m  ',r,'\033[0m')
-                vprint(1,f"\033[1;33m   The graph pattern of privacy query {PQs[q].prefix} can be included into the union of graph patterns of utility queries by union of some output variables.\033[0m")
-                vprint(1)
-                vprint(1,f"\033[33m   Privacy query {q} MAY NOT BE COMPATIBLE with utility policy !\033[0m")
-                vprint(1,'\033[33m   Filter conditions have to be checked...\033[0m')
-                vprint(1)
-                #-----------------------#
-                if comp != 'False':
-                    comp = 'Maybe'
-
+    # Triples eliminated by core minimization
+    eliminated = [metrics.counters.get('eliminated' + p + 'Triples', 0) for p in ['PQ', 'UQ']]
+    if sum(eliminated):
         #-----------------------#
-        vprint(3)
+        vprint(1)
+        vprint(1,f"Core minimization eliminated {eliminated[0]} triple(s) of privacy queries and {eliminated[1]} of utility queries.")
         #-----------------------#
 
-        ## Check Filter conjunction
-        if comp == 'Maybe':
-            comp = 'True'
-
-            #-----------------------#
-            vprint(4,'\033[1;34m   ================================================================================================\033[0m')
-            vprint(4,'\033[1;34m   Satisfiability checking of conjunction of Filter conditions of privacy query and utility queries\033[0m')
-            vprint(4,'\033[1;34m   ================================================================================================\033[0m')
-            vprint(4)
-            #-----------------------#
-
-            if not PQs[q].filter:
-                v = list(PQs[q].variables.keys())[0]
-                PQs[q].filter = [{'opl' : v, 'comp' : '=', 'opr' : v}]
-                
-            res = checkFilterConjunctionSatisfiability(PQs[q], unionUQs, res['results'])
-            if res['compatible']:
-                #-----------------------#
-                vprint(1,"\033[1;33m   The filter expression is not satisfiable.\033[0m")
-                vprint(1)
-                vprint(1,f"\033[1;32m   Privacy query {q} is compatible with utility policy.\033[0m ")
-                vprint(1)
-                #-----------------------#
-            else:
-                #-----------------------#
-                line = ''
-                for n in res['reasons']:
-                    line = line + str(n) +", "
-                if '4' in mainArgs.verbose:
-                    vprint(1,"\033[1;33m   The filter expression is satisfiable for result line(s)", line[:-2], '.\033[0m')
-                else:
-                    vprint(1,"\033[1;33m   The filter expression is satisfiable.\033[0m")
-                vprint(1)
-                if PQs[q].aggregate:
-                    #-----------------------#
-                    vprint(1,f"\033[33m   Privacy query {q}, containing aggregates computation, MAY NOT BE COMPATIBLE with utility policy !\033[0m")
-                    vprint(1,"\033[33m   Aggregate functions and time windows have to be checked...\033[0m")
-                    vprint(1)
-                    #-----------------------#
-                    if comp != 'False':
-                        comp = 'Maybe'
-                else:
-                    #-----------------------#
-                    vprint(1,f"\033[1;31m   Privacy query {q}, containing no aggregate computation, IS WEAKLY INCOMPATIBLE with utility policy !\033[0m")
-                    vprint(1)
-                    #-----------------------#
-                    comp = 'False'
-
-
-        ## Check aggregate and time windows with each utility query
-
-        UQsToCheck = []         # list of UQs to be checked two by two (or more ?)
-
-        if comp == 'Maybe':
-            comp = 'True'
-            #-----------------------#
-            vprint(6, "\033[1;34m   ==================================================================================================\033[0m")
-            vprint(6, "\033[1;34m   Checking compatibility of aggregate computation and time window definition with each utility query\033[0m")
-            vprint(6, "\033[1;34m   ==================================================================================================\033[0m")
-            vprint(6)
-            #-----------------------#
-
-            ## original PQ
-            PQ = origPQs[q]
-            PQ.prefix = q
-
-            # For each UQ
-            for uq in UQs.keys():
-                vprint(6, '   \033[1;33m----------------------\033[0m')
-                vprint(6,f"   \033[1;33mTesting {q} versus {uq}\033[0m")
-                vprint(6, '   \033[1;33m----------------------\033[0m')
-                vprint(6)
-
-                UQ = UQs[uq]
-                res = checkAggregateCompatibility1UQ(PQ, UQ)
-                if not res['compatible']:
-                    #-----------------------#
-                  #if not '6' in mainArgs.verbose:
-                    vprint(1, '\033[1;33m   ' + res['reason'])
-                    vprint(1)
-                    vprint(1, f"\033[1;31m   Privacy query {PQ.prefix} IS NOT COMPATIBLE with utility query {UQ.prefix} !\033[0m")
-                    vprint(1)
-                    #-----------------------#
-                    comp = 'False'
-                else:
-                    if res['toCheck']:
-                        UQsToCheck.append(UQ)
-                    #-----------------------#
-                    vprint(6, f"\033[1;32m   Privacy query {PQ.prefix} and utility query {UQ.prefix} are compatible.\033[0m")
-                    vprint(6)
-                    #-----------------------#
-            
-            if comp == 'True':
-                if len(UQsToCheck) < 2:
-                    #-----------------------#
-                    vprint(1, f"\033[1;32m   Privacy query {PQ.prefix} is compatible with the utility policy.\033[0m")
-                    vprint(1)
-                    #-----------------------#
-                else:
-                    #-----------------------#
-                    vprint(1, f"\033[1;33m   Privacy query {PQ.prefix} is compatible with each utility query individually.\033[0m")
-                    vprint(1)
-                    vprint(1, f"\033[33m   But it has to be checked against each pairs of relevant utility queries...\033[0m")
-                    vprint(1)
-                    #-----------------------#
-
-                    #-----------------------#
-                    vprint(7, "\033[1;34m   ============================================================================================================\033[0m")
-                    vprint(7, "\033[1;34m   Checking compatibility of aggregate computation and time window definition with each pair of utility queries\033[0m")
-                    vprint(7, "\033[1;34m   ============================================================================================================\033[0m")
-                    vprint(7)
-                    #-----------------------#
-
-
-                    # Loop for taking two utility queries as an input
-                    for i1 in range(0, len(UQsToCheck)-1):
-                        for i2 in range(i1+1, len(UQsToCheck)):
-                            UQ1 = UQsToCheck[i1]
-                            UQ2 = UQsToCheck[i2]
-                            #-----------------------#
-                            vprint(7, '   \033[1;33m------------------------------------------------------\033[0m')
-                            vprint(7,f"   \033[1;33mTesting {q} versus the pair {UQ1.prefix} and {UQ2.prefix}\033[0m")
-                            vprint(7, '   \033[1;33m------------------------------------------------------\033[0m')
-                            vprint(7)
-                            #-----------------------#
-                            res = checkAggregateCompatibility2UQ(PQ, UQ1, UQ2)
-                            if not res['compatible']:
-                                #-----------------------#
-                                vprint(1, '\033[1;33m   ' + res['reason'])
-                                vprint(1)
-                                vprint(1, f"\033[1;31m   Privacy query {PQ.prefix} IS NOT COMPATIBLE with the utility policy !\033[0m")
-                                vprint(1)
-                                #-----------------------#
-                                comp = 'False'
-                            else:
-                                #-----------------------#
-                                vprint(7, f"\033[1;32m   Privacy query {PQ.prefix} is compatible with utility queries {UQ1.prefix} and {UQ2.prefix}.\033[0m")
-                                vprint(7)
-                                #-----------------------#    
-                    if comp == 'True':
-                        #-----------------------#
-                        vprint(1, f"\033[1;32m   Privacy query {PQ.prefix} is compatible with the utility policy.\033[0m")
-                        vprint(1)
-                        #-----------------------#
-
-
-        # Prepare conclusion
-        if comp == 'Maybe':
-            compatibility = 'Maybe'
-        elif comp == 'False':
-            compatibility = 'False'
-
-      
     # Conclusion
     vprint(1)
     vprint(1,'\033[1;34m===========\033[0m')
@@ -1504,6 +2647,10 @@ def main():
         print('\033[1;31mPrivacy and utility policies ARE NOT COMPATIBLE !\033[0m')
 
     print()
+
+    # Measures of the run
+    if mainArgs.metrics:
+        metrics.write(mainArgs.metrics, arguments=vars(mainArgs), compatibility=compatibility)
         
 
 if __name__ == '__main__':
@@ -0,0 +1,324 @@
+"""
+Native homomorphism engine over frozen graph patterns.
+
+The frozen graph pattern of a TACQ is a set of triples of constants. Finding
+the answers of a (reified) graph pattern over it amounts to enumerating the
+homomorphisms of the pattern into the frozen triples. This module indexes the
+frozen triples by position and enumerates the homomorphisms by backtracking,
+always extending the partial mapping with the most constrained pattern triple.
+"""
+
+
+class TripleIndex(object):
+    """
+    Class indexing frozen triples by subject, predicate and object.
+    """
+
+    # Attributes of a TripleIndex
+    triples = []    # list of indexed triples (tuples of constants)
+    positions = []  # one dictionary per position {term : list of triple numbers}
+
+    def __init__(self, triples=[]):
+        self.triples = []
+        self.positions = [{}, {}, {}]
+        for t in triples:
+            self.add(t)
+
+
+
+    def add(self, triple):
+        """
+        Adds a triple to the index.
+
+        inputs: - triple -> a tuple of constants
+        output: - None
+        """
+        if not isinstance(triple, tuple):
+            raise TypeError('The parameter "triple" of add() must be a tuple !')
+
+        # grow the index for longer tuples (e.g. with timestamps)
+        while len(self.positions) < len(triple):
+            self.positions.append({})
+
+        nb = len(self.triples)
+        self.triples.append(triple)
+        for pos in range(len(triple)):
+            self.positions[pos].setdefault(triple[pos], []).append(nb)
+
+
+
+    def candidates(self, pattern, binding):
+        """
+        Lists the numbers of the triples that may match a pattern triple under a partial mapping.
+        The smallest index list among the bound positions is returned.
+
+        inputs: - pattern -> a tuple of terms, variables start with '?'
+                - binding -> dictionary of already mapped variables {variable : constant}
+        output: - a list of triple numbers
+        """
+        best = None
+        for pos in range(len(pattern)):
+            term = pattern[pos]
+            if term[0] == '?':
+                if not term in binding:
+                    continue
+                term = binding[term]
+            if pos >= len(self.positions):
+                return []
+            found = self.positions[pos].get(term, [])
+            if best is None or len(found) < len(best):
+                best = found
+                if not best:
+                    break
+        if best is None:
+            return range(len(self.triples))
+        return best
+
+
+
+class FrozenPolicy(object):
+    """
+    Class storing the most general freezing of a TACQ, usually the union of the utility queries.
+    It is built once and then shared read-only by all the checks against the policy.
+    """
+
+    # Attributes of a FrozenPolicy
+    query = None     # frozen TACQ
+    triples = []     # list of frozen triples (tuples of constants)
+    constants = {}   # dictionary of constants {variable : constant}
+    index = None     # TripleIndex of the frozen triples
+    overlap = None   # TripleIndex of the frozen triples searched by the overlap check (without the skipped ones)
+    skipped = 0      # number of frozen triples left out of the overlap check
+
+    def __init__(self, query, skipped=()):
+        # freeze the query (constants are stored into the query itself)
+        self.query = query
+        self.triples = query.freezeTriples()
+        self.constants = query.constants.copy()
+        self.index = TripleIndex(self.triples)
+        # triples of the query left out of the overlap check (e.g. of subsumed utility queries)
+        skipped = set(tuple(t.values()) for t in skipped)
+        self.skipped = 0
+        if skipped:
+            kept = []
+            for (t, frozen) in zip(query.gp, self.triples):
+                if tuple(t.values()) in skipped:
+                    self.skipped = self.skipped + 1
+                else:
+                    kept.append(frozen)
+            self.overlap = TripleIndex(kept)
+        else:
+            self.overlap = self.index
+        self._graph = None
+        self._overlapGraph = None
+
+
+
+    def __getstate__(self):
+        # the RDFlib graph is rebuilt on demand (e.g. in worker processes)
+        state = self.__dict__.copy()
+        state['_graph'] = None
+        state['_overlapGraph'] = None
+        return state
+
+
+
+    def graph(self, overlap=False):
+        """
+        Builds (once) the RDFlib graph of the freezing.
+
+        inputs: - overlap -> only the triples searched by the overlap check if True
+        output: - RDFlib Graph
+        """
+        if overlap and self.skipped:
+            if self._overlapGraph is None:
+                self._overlapGraph = self.buildGraph(self.overlap.triples)
+            return self._overlapGraph
+        if self._graph is None:
+            self._graph = self.buildGraph(self.triples)
+        return self._graph
+
+
+
+    def buildGraph(self, triples):
+        """
+        Builds the RDFlib graph of some frozen triples.
+
+        inputs: - triples -> list of frozen triples (tuples of constants)
+        output: - RDFlib Graph
+        """
+        from rdflib import Graph, Namespace, Literal
+        graph = Graph()
+        ns = Namespace('http://example.org/')
+        # prefix of the predicates in the queries, bound even if there is no triple
+        graph.bind('ns1', Namespace('http://example.org/:'))
+        for (s, p, o) in triples:
+            graph.add((Literal(s), ns[p], Literal(o)))
+        return graph
+
+
+
+def findHomomorphisms(pattern, index, variables, outputs=(), joins=(), stats=None, limit=None):
+    """
+    Enumerates the homomorphisms of a graph pattern into indexed frozen triples.
+    Each homomorphism gives one result line, projected on the given variables, as a SPARQL SELECT would do.
+    Partial mappings are pruned as soon as an output variable is mapped to a non output constant (not starting
+    with 'o'), or a join maps its variables to different constants that are not both output constants.
+
+    inputs: - pattern   -> list of tuples of terms, variables start with '?'
+            - index     -> a TripleIndex
+            - variables -> list of variables to project the homomorphisms on
+            - outputs   -> variables that must be mapped to output constants
+            - joins     -> list of pairs of variables that must be mapped to the same constant or to output constants
+            - stats     -> dictionary where the number of pruned partial mappings is added ('pruned'), if given
+            - limit     -> maximal number of result lines (None = all)
+    output: - list of result lines (tuples of constants)
+    """
+    if not isinstance(pattern, list):
+        raise TypeError('The parameter "pattern" of findHomomorphisms() must be a list of tuples !')
+    if not isinstance(index, TripleIndex):
+        raise TypeError('The parameter "index" of findHomomorphisms() must be a TripleIndex !')
+    if not isinstance(variables, list):
+        raise TypeError('The parameter "variables" of findHomomorphisms() must be a list !')
+
+    results = []
+    binding = {}
+    remaining = list(range(len(pattern)))
+    pruned = 0
+
+    # constraints checked when a variable is mapped
+    outputs = set(outputs)
+    partners = {}
+    for (l, r) in joins:
+        partners.setdefault(l, []).append(r)
+        partners.setdefault(r, []).append(l)
+
+    def allowed(var, cst):
+        if var in outputs and cst[0] != 'o':
+            return False
+        for other in partners.get(var, ()):
+            if other in binding and binding[other] != cst and (cst[0] != 'o' or binding[other][0] != 'o'):
+                return False
+        return True
+
+    def extend():
+        nonlocal pruned
+
+        # all pattern triples mapped => one result line (True stops the search)
+        if not remaining:
+            results.append(tuple(binding[v] for v in variables))
+            return limit is not None and len(results) >= limit
+
+        # most constrained pattern triple first
+        best = None
+        bestCandidates = None
+        for r in range(len(remaining)):
+            cand = index.candidates(pattern[remaining[r]], binding)
+            if best is None or len(cand) < len(bestCandidates):
+                best = r
+                bestCandidates = cand
+                if not cand:
+                    return False
+        p = remaining.pop(best)
+        tp = pattern[p]
+
+        # try each candidate triple
+        for c in bestCandidates:
+            triple = index.triples[c]
+            if len(triple) != len(tp):
+                continue
+            new = []
+            ok = True
+            for pos in range(len(tp)):
+                term = tp[pos]
+                if term[0] == '?':
+                    if term in binding:
+                        ok = binding[term] == triple[pos]
+                    elif allowed(term, triple[pos]):
+                        binding[term] = triple[pos]
+                        new.append(term)
+                    else:
+                        ok = False
+                        pruned = pruned + 1
+                else:
+                    ok = term == triple[pos]
+                if not ok:
+                    break
+            if ok and extend():
+                return True
+            for v in new:
+                del binding[v]
+
+        remaining.insert(best, p)
+        return False
+
+    # unknown projected variables cannot be bound
+    for v in variables:
+        if not any(v in t for t in pattern):
+            return results
+
+    extend()
+    if stats is not None:
+        stats['pruned'] = stats.get('pruned', 0) + pruned
+    return results
+
+
+
+# some simple tests
+if __name__ == '__main__':
+    print('----------------------------')
+    print('Test of findHomomorphisms():')
+    print('----------------------------')
+    index = TripleIndex([('c1', ':subject', 'oc2'), ('c1', ':predicate', 'ns:p'), ('c1', ':object', 'oc3'),
+                         ('c4', ':subject', 'oc3'), ('c4', ':predicate', 'ns:q'), ('c4', ':object', 'c5')])
+    pattern = [('?r1', ':subject', '?a'), ('?r1', ':predicate', 'ns:p'), ('?r1', ':object', '?b'),
+               ('?r2', ':subject', '?b'), ('?r2', ':predicate', 'ns:q'), ('?r2', ':object', '?c')]
+    results = findHomomorphisms(pattern, index, ['?a', '?b', '?c'])
+    print(results)
+    assert results == [('oc2', 'oc3', 'c5')]
+    assert findHomomorphisms(pattern, index, ['?c', '?a']) == [('c5', 'oc2')]
+    assert findHomomorphisms(pattern[:3] + [('?r2', ':predicate', 'ns:r')], index, ['?a']) == []
+    print()
+
+    print('---------------------------------------------------')
+    print('Test of findHomomorphisms() with outputs and joins:')
+    print('---------------------------------------------------')
+    # ?c is mapped to c5, which is not an output constant
+    stats = {}
+    results = findHomomorphisms(pattern, index, ['?a', '?b', '?c'], outputs=['?a', '?c'], stats=stats)
+    print(results, stats)
+    assert (results, stats) == ([], {'pruned' : 1})
+    assert findHomomorphisms(pattern, index, ['?a', '?b', '?c'], outputs=['?a', '?b']) == [('oc2', 'oc3', 'c5')]
+    # ?a and ?b are mapped to output constants, ?b and ?c are not
+    stats = {}
+    results = findHomomorphisms(pattern, index, ['?a', '?b', '?c'], joins=[('?a', '?b'), ('?b', '?c')], stats=stats)
+    print(results, stats)
+    assert (results, stats) == ([], {'pruned' : 1})
+    assert findHomomorphisms(pattern, index, ['?a', '?b', '?c'], joins=[('?a', '?b')]) == [('oc2', 'oc3', 'c5')]
+    print()
+
+    print('-------------------------------------------------')
+    print('Test of findHomomorphisms() against all mappings:')
+    print('-------------------------------------------------')
+    import itertools
+    import random
+    generator = random.Random(1)
+    for n in range(200):
+        constants = ['c1', 'c2', 'oc3', 'oc4']
+        triples = list(set((generator.choice(constants), generator.choice('pq'), generator.choice(constants)) for i in range(12)))
+        terms = ['?x', '?y', '?z', 'c1', 'oc3']
+        pattern = [(generator.choice(terms), generator.choice('pq'), generator.choice(terms)) for i in range(3)]
+        variables = sorted(set(t for p in pattern for t in p if t[0] == '?'))
+        outputs = [v for v in variables if generator.random() < 0.3]
+        joins = [(v, w) for (v, w) in itertools.combinations(variables, 2) if generator.random() < 0.3]
+        expected = []
+        for values in itertools.product(constants, repeat=len(variables)):
+            mapping = dict(zip(variables, values))
+            if all(tuple(mapping.get(t, t) for t in p) in triples for p in pattern) \
+               and all(mapping[v][0] == 'o' for v in outputs) \
+               and all(mapping[v] == mapping[w] or mapping[v][0] == mapping[w][0] == 'o' for (v, w) in joins):
+                expected.append(values)
+        results = findHomomorphisms(pattern, TripleIndex(triples), variables, outputs, joins)
+        assert sorted(results) == sorted(expected), (triples, pattern, outputs, joins)
+        assert len(findHomomorphisms(pattern, TripleIndex(triples), variables, outputs, joins, limit=1)) == min(len(expected), 1)
+    print('200 random patterns: same result lines as the enumeration of all mappings')
@@ -0,0 +1,261 @@
+"""
+Instrumentation of the compatibility checker.
+
+Stages of the checker (reading, rewriting, overlap, filter and aggregate
+checks) are timed in wall and CPU time. Times are exclusive: when a stage
+runs inside another one (e.g. the overlap check done by an aggregate check),
+the outer stage is paused, so that the times of all stages add up. Counters
+(result lines, CSP variables, pairs of utility queries...) are kept for the
+whole run and for the privacy query being checked.
+"""
+
+import functools
+import json
+import time
+
+
+
+class Metrics(object):
+    """
+    Class collecting stage times and counters of a run.
+    """
+
+    # Attributes of a Metrics
+    stages = {}     # dictionary {stage : {'wall', 'cpu', 'calls'}}
+    counters = {}   # dictionary {counter : value}
+    queries = {}    # dictionary {privacy query : {'wall', 'cpu', 'verdict', 'stages', 'counters'}}
+    current = None  # name of the privacy query being checked
+
+    def __init__(self):
+        self.reset()
+
+
+
+    def reset(self):
+        """
+        Forgets all measures.
+
+        inputs: - None
+        output: - None
+        """
+        self.stages = {}
+        self.counters = {}
+        self.queries = {}
+        self.current = None
+        self._running = []              # stack of running stages
+        self._last = self._now()        # last time charged to a stage
+        self._start = self._last        # beginning of the measures
+        self._queryStart = None         # beginning of the check of the current query
+
+
+
+    def _now(self):
+        return (time.perf_counter(), time.process_time())
+
+
+
+    def _charge(self):
+        # charge the time elapsed since the last event to the running stage
+        now = self._now()
+        if self._running:
+            stage = self._running[-1]
+            targets = [self.stages]
+            if self.current is not None:
+                targets.append(self.queries[self.current]['stages'])
+            for t in targets:
+                m = t.setdefault(stage, {'wall' : 0.0, 'cpu' : 0.0, 'calls' : 0})
+                m['wall'] = m['wall'] + now[0] - self._last[0]
+                m['cpu'] = m['cpu'] + now[1] - self._last[1]
+        self._last = now
+
+
+
+    def start(self, stage):
+        """
+        Starts a stage, pausing the running one.
+
+        inputs: - stage -> name of the stage
+        output: - None
+        """
+        self._charge()
+        self._running.append(stage)
+        targets = [self.stages]
+        if self.current is not None:
+            targets.append(self.queries[self.current]['stages'])
+        for t in targets:
+            t.setdefault(stage, {'wall' : 0.0, 'cpu' : 0.0, 'calls' : 0})['calls'] += 1
+
+
+
+    def stop(self, stage):
+        """
+        Stops a stage, resuming the one it was started from.
+
+        inputs: - stage -> name of the stage
+        output: - None
+        """
+        if not self._running or self._running[-1] != stage:
+            raise ValueError(f"Stage '{stage}' is not running !")
+        self._charge()
+        self._running.pop()
+
+
+
+    def timed(self, stage):
+        """
+        Decorator timing each call of a function as a stage.
+
+        inputs: - stage -> name of the stage
+        output: - the decorator
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                self.start(stage)
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.stop(stage)
+            return wrapper
+        return decorator
+
+
+
+    def count(self, counter, value=1):
+        """
+        Increments a counter, for the run and for the current privacy query.
+
+        inputs: - counter -> name of the counter
+                - value   -> increment
+        output: - None
+        """
+        self.counters[counter] = self.counters.get(counter, 0) + value
+        if self.current is not None:
+            counters = self.queries[self.current]['counters']
+            counters[counter] = counters.get(counter, 0) + value
+
+
+
+    def startQuery(self, query):
+        """
+        Starts measuring the check of a privacy query.
+
+        inputs: - query -> name of the privacy query
+        output: - None
+        """
+        self._charge()
+        self.current = query
+        self.queries[query] = {'wall' : 0.0, 'cpu' : 0.0, 'verdict' : None, 'stages' : {}, 'counters' : {}}
+        self._queryStart = self._now()
+
+
+
+    def stopQuery(self, verdict):
+        """
+        Stops measuring the check of the current privacy query.
+
+        inputs: - verdict -> 'True', 'Maybe' or 'False'
+        output: - None
+        """
+        self._charge()
+        now = self._now()
+        q = self.queries[self.current]
+        q['wall'] = now[0] - self._queryStart[0]
+        q['cpu'] = now[1] - self._queryStart[1]
+        q['verdict'] = verdict
+        self.current = None
+
+
+
+    def merge(self, other):
+        """
+        Adds measures of another run (e.g. of a worker process) to these ones.
+
+        inputs: - other -> a dictionary built by toDict()
+        output: - None
+        """
+        for (stage, m) in other['stages'].items():
+            mine = self.stages.setdefault(stage, {'wall' : 0.0, 'cpu' : 0.0, 'calls' : 0})
+            for k in mine:
+                mine[k] = mine[k] + m[k]
+        for (counter, value) in other['counters'].items():
+            self.counters[counter] = self.counters.get(counter, 0) + value
+        self.queries.update(other['queries'])
+
+
+
+    def toDict(self):
+        """
+        Exports measures, times being in seconds.
+
+        inputs: - None
+        output: - a dictionary {elapsed, stages, counters, queries}
+        """
+        self._charge()
+        now = self._now()
+        return {'elapsed' : {'wall' : now[0] - self._start[0], 'cpu' : now[1] - self._start[1]},
+                'stages' : self.stages,
+                'counters' : self.counters,
+                'queries' : self.queries}
+
+
+
+    def write(self, file, **info):
+        """
+        Writes measures as JSON.
+
+        inputs: - file -> name of the output file
+                - info -> other entries of the JSON object (e.g. arguments)
+        output: - None
+        """
+        measures = dict(info)
+        measures.update(self.toDict())
+        with open(file, 'w') as f:
+            json.dump(measures, f, indent=2, default=str)
+            f.write('\n')
+
+
+
+# some simple tests
+if __name__ == '__main__':
+    print('------------------')
+    print('Test of Metrics():')
+    print('------------------')
+    metrics = Metrics()
+
+    @metrics.timed('inner')
+    def inner():
+        metrics.count('calls')
+        return sum(range(100000))
+
+    @metrics.timed('outer')
+    def outer():
+        sum(range(100000))
+        return inner()
+
+    metrics.startQuery('PQ1')
+    outer()
+    outer()
+    metrics.stopQuery('True')
+    measures = metrics.toDict()
+    print(json.dumps(measures, indent=2))
+    assert {s : m['calls'] for (s, m) in measures['stages'].items()} == {'outer' : 2, 'inner' : 2}
+    assert measures['counters'] == {'calls' : 2}
+    assert measures['queries']['PQ1']['verdict'] == 'True'
+    assert measures['queries']['PQ1']['counters'] == {'calls' : 2}
+    # times are exclusive, so that the stages add up to at most the elapsed time
+    assert sum(m['wall'] for m in measures['stages'].values()) <= measures['elapsed']['wall']
+    assert sum(m['wall'] for m in measures['stages'].values()) <= measures['queries']['PQ1']['wall']
+    print()
+
+    print('----------------')
+    print('Test of merge():')
+    print('----------------')
+    worker = Metrics()
+    worker.start('outer')
+    worker.count('calls', 3)
+    worker.stop('outer')
+    metrics.merge(worker.toDict())
+    print(metrics.stages['outer'], metrics.counters)
+    assert metrics.stages['outer']['calls'] == 3
+    assert metrics.counters == {'calls' : 5}
@@ -0,0 +1,270 @@
+"""
+Satisfiability of conjunctions of comparisons over ordered terms.
+
+Filter conditions of TACQs are comparisons (=, !=, <, <=, >, >=) between
+variables and int, float, string or datetime constants. Values of each type
+form a dense linear order, types being ordered as int < str < float <
+datetime < unknown, as in the integer encoding used by the CSP solver.
+
+Ints are treated as dense, as in the CSP encoding, which leaves room for every
+variable between two constants: ?a > 1 && ?a < 2 is satisfiable for an int ?a.
+This over-approximates satisfiability on purpose, so that both solvers give the
+same verdicts; it must not be "fixed" in one solver only.
+
+A conjunction is decided in polynomial time as for the point algebra:
+equalities are merged with a union-find structure, comparisons become edges
+of a graph over the merged terms (strict for < and >), and constants are
+chained in increasing order. The conjunction is satisfiable if and only if no
+strongly connected component contains a strict edge or both sides of a !=.
+"""
+
+from datetime import datetime
+
+
+TYPES = [int, str, float, datetime, 'unknown']  # order of types
+
+COMPARISONS = {'=' : '=', '==' : '=', '!=' : '!=', '<' : '<', '<=' : '<=', '>' : '>', '>=' : '>='}
+
+
+
+def isVariable(term):
+    """
+    Tests if a term of a condition is a variable.
+
+    inputs: - term -> a variable name or a constant
+    output: - a boolean
+    """
+    return isinstance(term, str) and term[:1] == '?'
+
+
+
+def typeRank(typ):
+    """
+    Gives the position of a type in the order of types.
+
+    inputs: - typ -> a Python type or 'unknown'
+    output: - an integer
+    """
+    if typ in TYPES:
+        return TYPES.index(typ)
+    # datetime may have been recorded with its name only
+    if str(typ) in ["<class 'datetime'>", "<class 'datetime.datetime'>"]:
+        return TYPES.index(datetime)
+    return TYPES.index('unknown')
+
+
+
+class UnionFind(object):
+    """
+    Class for union-find structures over hashable terms.
+    """
+
+    # Attributes of a UnionFind
+    parent = {}  # dictionary {term : parent term}
+
+    def __init__(self):
+        self.parent = {}
+
+
+
+    def find(self, term):
+        """
+        Finds the representative of a term.
+
+        inputs: - term -> a hashable term
+        output: - the representative term
+        """
+        root = term
+        while self.parent.setdefault(root, root) != root:
+            root = self.parent[root]
+        # path compression
+        while term != root:
+            self.parent[term], term = root, self.parent[term]
+        return root
+
+
+
+    def union(self, t1, t2):
+        """
+        Merges the classes of two terms.
+
+        inputs: - t1, t2 -> hashable terms
+        output: - None
+        """
+        r1 = self.find(t1)
+        r2 = self.find(t2)
+        if r1 != r2:
+            self.parent[r2] = r1
+
+
+
+def isSatisfiable(conditions, types):
+    """
+    Decides the satisfiability of a conjunction of comparisons.
+
+    inputs: - conditions -> list of triples (opl, comp, opr), variables being strings starting with '?'
+            - types      -> dictionary of variable types {var : type}, missing variables being 'unknown'
+    output: - a boolean
+    """
+    if not isinstance(conditions, list):
+        raise TypeError('The parameter "conditions" of isSatisfiable() must be a list !')
+
+    # nodes: ('v', name) for variables, ('c', rank, value) for constants
+    def node(term):
+        if isVariable(term):
+            return ('v', term)
+        return ('c', typeRank(type(term)), term)
+
+    uf = UnionFind()
+    edges = []        # (from, to, strict) meaning from < to or from <= to
+    different = []    # pairs of nodes that must differ
+    constants = set()
+    variables = set()
+
+    for (opl, comp, opr) in conditions:
+        c = COMPARISONS.get(str(comp).strip())
+        if c is None:
+            raise ValueError(f"Unknown comparison '{comp}' !")
+        l = node(opl)
+        r = node(opr)
+        for n in [l, r]:
+            if n[0] == 'c':
+                constants.add(n)
+            else:
+                variables.add(n)
+        if c == '=':
+            uf.union(l, r)
+        elif c == '!=':
+            different.append((l, r))
+        elif c == '<':
+            edges.append((l, r, True))
+        elif c == '<=':
+            edges.append((l, r, False))
+        elif c == '>':
+            edges.append((r, l, True))
+        else:
+            edges.append((r, l, False))
+
+    # constants are strictly ordered (type first, then value)
+    ordered = sorted(constants, key=lambda n: (n[1], n[2]))
+    for i in range(len(ordered) - 1):
+        edges.append((ordered[i], ordered[i+1], True))
+
+    # known types of each class of equal terms: values of different types are never equal
+    ranks = {}
+    unknown = typeRank('unknown')
+    for n in constants:
+        ranks.setdefault(uf.find(n), set()).add(n[1])
+    for v in variables:
+        rank = typeRank(types.get(v[1], 'unknown'))
+        if rank != unknown:
+            ranks.setdefault(uf.find(v), set()).add(rank)
+    for r in ranks.values():
+        if len(r) > 1:
+            return False
+
+    # classes stay between the constants of lower and upper types, in the intersection of the intervals of the
+    # types of their variables
+    bounds = {}       # {class : (lower constant, upper constant)}
+    position = {n : i for (i, n) in enumerate(ordered)}
+    for v in variables:
+        rank = typeRank(types.get(v[1], 'unknown'))
+        lower = [n for n in ordered if n[1] < rank]
+        upper = [n for n in ordered if n[1] > rank]
+        c = uf.find(v)
+        (l, u) = bounds.get(c, (None, None))
+        if lower and (l is None or position[lower[-1]] > position[l]):
+            l = lower[-1]
+        if upper and (u is None or position[upper[0]] < position[u]):
+            u = upper[0]
+        bounds[c] = (l, u)
+    for (c, (l, u)) in bounds.items():
+        if l is not None:
+            edges.append((l, c, True))
+        if u is not None:
+            edges.append((c, u, True))
+
+    # graph over classes of equal terms
+    graph = {}
+    for n in constants | variables:
+        graph.setdefault(uf.find(n), [])
+    for (f, t, strict) in edges:
+        graph[uf.find(f)].append(uf.find(t))
+
+    # strongly connected components (iterative Tarjan)
+    component = {}
+    low = {}
+    num = {}
+    stack = []
+    onStack = set()
+    counter = 0
+    for root in graph:
+        if root in num:
+            continue
+        work = [(root, 0)]
+        while work:
+            (n, i) = work.pop()
+            if i == 0:
+                num[n] = low[n] = counter
+                counter = counter + 1
+                stack.append(n)
+                onStack.add(n)
+            if i < len(graph[n]):
+                work.append((n, i+1))
+                m = graph[n][i]
+                if not m in num:
+                    work.append((m, 0))
+                elif m in onStack:
+                    low[n] = min(low[n], num[m])
+                continue
+            # all successors done
+            if low[n] == num[n]:
+                while True:
+                    m = stack.pop()
+                    onStack.discard(m)
+                    component[m] = n
+                    if m == n:
+                        break
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[n])
+
+    # a strict comparison inside a component is a contradiction
+    for (f, t, strict) in edges:
+        if strict and component[uf.find(f)] == component[uf.find(t)]:
+            return False
+
+    # terms that must differ cannot be forced to be equal
+    for (l, r) in different:
+        if component[uf.find(l)] == component[uf.find(r)]:
+            return False
+
+    return True
+
+
+
+# some simple tests
+if __name__ == '__main__':
+    print('------------------------')
+    print('Test of isSatisfiable():')
+    print('------------------------')
+    # (conditions, types of the variables, expected satisfiability)
+    tests = [([('?a', '>', 1), ('?a', '=', 1)], {'?a' : int}, False),
+             ([('?a', '>', 1), ('?a', '<', 2)], {'?a' : int}, True),   # ints are dense, as in the CSP encoding
+             ([('?a', '<=', '?b'), ('?b', '<=', '?a'), ('?a', '!=', '?b')], {}, False),
+             ([('?a', '<=', '?b'), ('?b', '<=', '?a')], {}, True),
+             ([('?a', '<', '?b'), ('?b', '<', '?c'), ('?c', '<', '?a')], {}, False),
+             ([('?a', '>=', 3), ('?a', '<=', 3), ('?a', '!=', 3)], {'?a' : int}, False),
+             ([('?a', '>=', 3), ('?a', '<=', 3)], {'?a' : int}, True),
+             ([('?a', '>', 2.5), ('?a', '<', 2.5)], {'?a' : float}, False),
+             ([('?s', '>', 'abc'), ('?s', '<', 'abd')], {'?s' : str}, True),
+             ([('?d', '>', datetime(2020, 1, 1)), ('?d', '<', datetime(2021, 1, 1))], {'?d' : datetime}, True),
+             ([('?d', '>', datetime(2021, 1, 1)), ('?d', '<', datetime(2020, 1, 1))], {'?d' : datetime}, False),
+             ([('?y', '=', '?z'), ('?y', '>', 5), ('?z', '<', 'abc')], {'?y' : int, '?z' : str}, False),
+             ([('?y', '=', '?z')], {'?y' : int, '?z' : str}, False),
+             ([('?y', '=', '?z')], {'?y' : int, '?z' : int}, True),
+             ([], {}, True)]
+    for (conditions, types, expected) in tests:
+        result = isSatisfiable(conditions, types)
+        print(conditions, '->', result)
+        assert result is expected, (conditions, types, expected)
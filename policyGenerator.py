@@ -0,0 +1,281 @@
+#!/usr/bin/python3
+
+import argparse
+import os
+import random
+import re
+
+"""
+Generator of random (but valid) TACQ policies over the ISSDA vocabulary
+
+usage: policyGenerator.py [-h|--help] [-n|--queries <N>] [-g|--gp <N>] [-f|--filters <N>] [-j|--joins <N>]
+                          [-O|--outputs <ratio>] [-a|--aggregates <ratio>] [-w|--window <N>] [-P|--predicates <N>] [-s|--seed <N>]
+                          [-o|--output <file>]
+
+arguments:
+  -h | --help       : Show this help and exit
+  -n | --queries    : number of queries, default value is 10
+  -g | --gp         : number of triples in each graph pattern, default value is 3
+  -f | --filters    : number of filter conditions in each query, default value is 1
+  -j | --joins      : number of triples joined to a variable of a previous triple, default value is gp-1 (connected patterns)
+  -O | --outputs    : ratio of variables selected as outputs, default value is 0.5
+  -a | --aggregates : ratio of queries computing an aggregate, default value is 0.3
+  -w | --window     : maximal size of time windows, default value is 12
+  -P | --predicates : number of predicates of the vocabulary to use (0 = all), default value is 0
+  -s | --seed       : seed of the random generator, default value is 1
+  -o | --output     : output file, default is the standard output
+"""
+
+
+SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'issda_schema.ttl')
+
+PREFIX = 'PREFIX issda:<http://example.org/>\n\n'
+
+STRINGS = ['low', 'medium', 'high', 'electric', 'gas', 'oil', 'renewable']  # values of string properties
+
+
+
+class Vocabulary(object):
+    """
+    Class storing the properties of the ISSDA vocabulary, with their domain and range.
+    """
+
+    # Attributes of a Vocabulary
+    properties = {}   # dictionary {property : (domain root class, range)}, range being a root class or an xsd type
+    timestamped = []  # list of dynamic properties, whose triples have a timestamp
+
+    def __init__(self, schema=SCHEMA):
+        self.properties = {}
+        self.timestamped = []
+
+        # read the schema without comments
+        inputFile = open(schema)
+        content = ''.join([l for l in inputFile.readlines() if not l.strip().startswith('#')])
+        inputFile.close()
+
+        # classes are replaced by their root class
+        parents = {}
+        blocks = re.findall(r'(?ms)^\s*issda:(\w+)\b(.*?)\.[ \t]*$', content)
+        for (name, body) in blocks:
+            sup = re.search(r'rdfs:subClassOf\s+issda:(\w+)', body)
+            if sup:
+                parents[name] = sup.group(1)
+
+        def root(c):
+            while c in parents:
+                c = parents[c]
+            return c
+
+        for (name, body) in blocks:
+            domain = re.search(r'rdfs:domain\s+issda:(\w+)', body)
+            rng = re.search(r'rdfs:range\s+([\w:]+)', body)
+            if not domain or not rng:
+                continue
+            rng = rng.group(1)
+            if rng.startswith('issda:'):
+                rng = root(rng[6:])
+            self.properties['issda:' + name] = (root(domain.group(1)), rng)
+            if 'timestamp' in body:
+                self.timestamped.append('issda:' + name)
+
+
+
+    def restrict(self, number, rand):
+        """
+        Keeps only some randomly chosen properties.
+
+        inputs: - number -> number of properties to keep (0 = all)
+                - rand   -> random generator
+        output: - None
+        """
+        if number <= 0 or number >= len(self.properties):
+            return
+        names = sorted(self.properties.keys())
+        rand.shuffle(names)
+        kept = names[:number]
+        self.properties = {p : self.properties[p] for p in kept}
+        self.timestamped = [p for p in self.timestamped if p in kept]
+
+
+
+def constant(rng, rand):
+    """
+    Builds a random constant of a datatype.
+
+    inputs: - rng  -> xsd range of the property
+            - rand -> random generator
+    output: - the constant as written in a query
+    """
+    if rng == 'xsd:integer':
+        return str(rand.randint(0, 100))
+    if rng == 'xsd:boolean':
+        return rand.choice(['true', 'false'])
+    if rng == 'xsd:dateTime':
+        return f"2020-{rand.randint(1, 12):02}-{rand.randint(1, 28):02}"
+    return rand.choice(STRINGS)
+
+
+
+def generateQuery(vocabulary, rand, gp=3, filters=1, joins=None, outputs=0.5, aggregate=False, window=12):
+    """
+    Generates a random TACQ.
+
+    inputs: - vocabulary -> a Vocabulary
+            - rand       -> random generator
+            - gp         -> number of triples in the graph pattern
+            - filters    -> number of filter conditions
+            - joins      -> number of triples sharing a variable with a previous one (None = gp-1)
+            - outputs    -> ratio of variables selected as outputs
+            - aggregate  -> if true, compute an aggregate over time windows
+            - window     -> maximal size of time windows
+    output: - the query as a string
+    """
+    if joins is None:
+        joins = gp - 1
+
+    properties = sorted(vocabulary.properties.keys())
+    nodes = []      # variables that can be subjects [(variable, class)]
+    literals = []   # datatype variables [(variable, range)]
+    timestamps = [] # timestamp variables
+    triples = []
+    numVar = 1
+
+    def newVar():
+        nonlocal numVar
+        v = f"?x{numVar}"
+        numVar = numVar + 1
+        return v
+
+    for t in range(max(gp, 1)):
+        # start from a previous variable (join) or from a new one
+        choices = []
+        if t > 0 and t <= joins:
+            choices = [(v, c) for (v, c) in nodes if [p for p in properties if vocabulary.properties[p][0] == c]]
+        if choices:
+            (subject, cls) = rand.choice(choices)
+            candidates = [p for p in properties if vocabulary.properties[p][0] == cls]
+        else:
+            candidates = properties
+            subject = None
+        p = rand.choice(candidates)
+        (domain, rng) = vocabulary.properties[p]
+        if subject is None:
+            subject = newVar()
+            nodes.append((subject, domain))
+        obj = newVar()
+        if rng.startswith('xsd:'):
+            literals.append((obj, rng))
+        else:
+            nodes.append((obj, rng))
+        if p in vocabulary.timestamped:
+            ts = newVar()
+            timestamps.append(ts)
+            triples.append(f"({subject} {p} {obj}, {ts})")
+        else:
+            triples.append(f"{subject} {p} {obj}")
+
+    # filter conditions over datatype variables
+    conditions = []
+    for f in range(filters):
+        if not literals:
+            break
+        (v, rng) = rand.choice(literals)
+        if rng == 'xsd:integer':
+            comp = rand.choice(['<', '<=', '>', '>=', '=', '!='])
+        else:
+            comp = rand.choice(['=', '!='])
+        conditions.append(f"{v} {comp} {constant(rng, rand)}")
+
+    # aggregate over a numeric variable
+    numeric = [v for (v, rng) in literals if rng == 'xsd:integer']
+    aggregate = aggregate and numeric
+    variables = [v for (v, c) in nodes] + [v for (v, r) in literals] + timestamps
+    if aggregate:
+        var = rand.choice(numeric)
+        select = ['?timeWindowEnd'] + [v for v in variables if v != var and rand.random() < outputs]
+        function = rand.choice(['SUM', 'COUNT', 'MIN', 'MAX'])
+        query = 'SELECT ' + ' '.join(select) + f" {function}({var})\n"
+    else:
+        select = [v for v in variables if rand.random() < outputs]
+        if not select:
+            select = [rand.choice(variables)]
+        query = 'SELECT ' + ' '.join(select) + '\n'
+
+    query = query + 'WHERE { ' + ' . '.join(triples)
+    if conditions:
+        query = query + ' . FILTER(' + ' && '.join(conditions) + ')'
+    query = query + ' }\n'
+
+    if aggregate:
+        query = query + 'GROUP BY ' + ' '.join(select) + '\n'
+        step = rand.randint(1, max(1, window // 2))
+        size = step * rand.randint(1, max(1, window // step))
+        query = query + f"TIMEWINDOW ({size}, {step})\n"
+
+    return query
+
+
+
+def generateQueries(queries=10, gp=3, filters=1, joins=None, outputs=0.5, aggregates=0.3, window=12, predicates=0, seed=1):
+    """
+    Generates a list of random TACQs.
+
+    inputs: - queries    -> number of queries
+            - gp         -> number of triples in each graph pattern
+            - filters    -> number of filter conditions in each query
+            - joins      -> number of triples sharing a variable with a previous one (None = gp-1)
+            - outputs    -> ratio of variables selected as outputs
+            - aggregates -> ratio of queries computing an aggregate
+            - window     -> maximal size of time windows
+            - predicates -> number of predicates of the vocabulary to use (0 = all)
+            - seed       -> seed of the random generator
+    output: - list of queries as strings
+    """
+    rand = random.Random(seed)
+    vocabulary = Vocabulary()
+    vocabulary.restrict(predicates, rand)
+    return [generateQuery(vocabulary, rand, gp, filters, joins, outputs, rand.random() < aggregates, window) for q in range(queries)]
+
+
+
+def generatePolicy(*args, **kwargs):
+    """
+    Generates a random policy, i.e. a prefix declaration followed by random TACQs.
+
+    inputs: - same as generateQueries()
+    output: - the policy as a string
+    """
+    return PREFIX + '\n'.join(generateQueries(*args, **kwargs))
+
+
+
+def get_cmd_line_args():
+    """
+    Parse the command line to get parameters.
+
+    input:  - none
+    output: - a Namespace containing parameter values
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--queries', help = 'number of queries', type = int, default = 10)
+    parser.add_argument('-g', '--gp', help = 'number of triples in each graph pattern', type = int, default = 3)
+    parser.add_argument('-f', '--filters', help = 'number of filter conditions in each query', type = int, default = 1)
+    parser.add_argument('-j', '--joins', help = 'number of triples joined to a previous one', type = int, default = None)
+    parser.add_argument('-O', '--outputs', help = 'ratio of variables selected as outputs', type = float, default = 0.5)
+    parser.add_argument('-a', '--aggregates', help = 'ratio of queries computing an aggregate', type = float, default = 0.3)
+    parser.add_argument('-w', '--window', help = 'maximal size of time windows', type = int, default = 12)
+    parser.add_argument('-P', '--predicates', help = 'number of predicates of the vocabulary to use (0 = all)', type = int, default = 0)
+    parser.add_argument('-s', '--seed', help = 'seed of the random generator', type = int, default = 1)
+    parser.add_argument('-o', '--output', help = 'output file', default = None)
+    return parser.parse_args()
+
+
+
+if __name__ == '__main__':
+    args = get_cmd_line_args()
+    policy = generatePolicy(args.queries, args.gp, args.filters, args.joins, args.outputs, args.aggregates, args.window, args.predicates, args.seed)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(policy)
+    else:
+        print(policy, end='')
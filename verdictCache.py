@@ -0,0 +1,185 @@
+"""
+Persistent cache of the verdicts of privacy queries.
+
+Verdicts are stored in a SQLite database of a local directory, keyed by a
+hash of the rewritten and reified privacy query and of a context (the
+utility policy, the options and the source of the checker, see sourceStamp()),
+so that re-runs only check
+privacy queries that changed. Each entry keeps the verdict, the reasons and
+the mappings found by the checks. The least recently used entries are
+evicted when the cache grows beyond its size.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+
+VERSION = '1'   # version of the format of the entries
+
+
+
+class VerdictCache(object):
+    """
+    Class storing verdicts of privacy queries in a SQLite database.
+    """
+
+    # Attributes of a VerdictCache
+    directory = None   # directory of the database
+    context = ''       # hash of the utility policy and the options
+    size = 10000       # maximal number of entries
+    connection = None  # connection to the database
+
+    def __init__(self, directory, context, size=10000):
+        if not isinstance(directory, str):
+            raise TypeError('The parameter "directory" of VerdictCache() must be a string !')
+        if not isinstance(context, str):
+            raise TypeError('The parameter "context" of VerdictCache() must be a string !')
+        if not isinstance(size, int) or size < 0:
+            raise TypeError('The parameter "size" of VerdictCache() must be a positive integer !')
+
+        self.directory = directory
+        self.context = hashlib.sha256((VERSION + '\n' + context).encode()).hexdigest()
+        self.size = size
+        os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(directory, 'verdicts.sqlite'))
+        self.connection.execute('CREATE TABLE IF NOT EXISTS verdicts '
+                                '(key TEXT PRIMARY KEY, verdict TEXT, reasons TEXT, mappings TEXT, used REAL)')
+
+
+
+    def key(self, query):
+        """
+        Computes the key of a privacy query in the context of the cache.
+
+        inputs: - query -> canonical expression of the rewritten and reified privacy query
+        output: - the key (hexadecimal string)
+        """
+        return hashlib.sha256((self.context + '\n' + query).encode()).hexdigest()
+
+
+
+    def get(self, key):
+        """
+        Looks for the verdict of a privacy query, marking it as used.
+
+        inputs: - key -> key of the privacy query
+        output: - a dictionary {verdict, reasons, mappings}, None if the verdict is unknown
+        """
+        row = self.connection.execute('SELECT verdict, reasons, mappings FROM verdicts WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        self.connection.execute('UPDATE verdicts SET used = ? WHERE key = ?', (time.time(), key))
+        return {'verdict' : row[0], 'reasons' : json.loads(row[1]), 'mappings' : json.loads(row[2])}
+
+
+
+    def put(self, key, verdict, reasons, mappings):
+        """
+        Stores the verdict of a privacy query.
+
+        inputs: - key      -> key of the privacy query
+                - verdict  -> 'True', 'Maybe' or 'False'
+                - reasons  -> list of reasons (strings)
+                - mappings -> mappings of variables found by the filter check (JSON serializable)
+        output: - None
+        """
+        self.connection.execute('INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?)',
+                                (key, verdict, json.dumps(reasons), json.dumps(mappings), time.time()))
+
+
+
+    def evict(self):
+        """
+        Removes the least recently used entries beyond the size of the cache.
+
+        inputs: - None
+        output: - number of removed entries
+        """
+        cursor = self.connection.execute('DELETE FROM verdicts WHERE key IN '
+                                         '(SELECT key FROM verdicts ORDER BY used DESC LIMIT -1 OFFSET ?)', (self.size,))
+        return cursor.rowcount
+
+
+
+    def close(self):
+        """
+        Evicts old entries and saves the cache.
+
+        inputs: - None
+        output: - None
+        """
+        self.evict()
+        self.connection.commit()
+        self.connection.close()
+
+
+
+def sourceStamp(files):
+    """
+    Hashes source files, so that verdicts computed by another version of the checks are not read.
+    Files are hashed with their base name, missing files by their name only.
+
+    inputs: - files -> list of file names
+    output: - the hash (hexadecimal string)
+    """
+    digest = hashlib.sha256()
+    for f in files:
+        digest.update(os.path.basename(f).encode() + b'\n')
+        if os.path.isfile(f):
+            with open(f, 'rb') as source:
+                digest.update(source.read())
+    return digest.hexdigest()
+
+
+
+# some simple tests
+if __name__ == '__main__':
+    import tempfile
+
+    print('-----------------------')
+    print('Test of VerdictCache():')
+    print('-----------------------')
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = VerdictCache(tmp, 'UQ1 UQ2', size=2)
+        for (q, v) in [('Q1', 'True'), ('Q2', 'False'), ('Q3', 'True')]:
+            cache.put(cache.key(q), v, [f"reason of {q}"], {'1' : {'?a' : '?b'}})
+            time.sleep(0.01)
+        cache.get(cache.key('Q1'))
+        evicted = cache.evict()
+        print('evicted:', evicted)
+        assert evicted == 1
+        for q in ['Q1', 'Q2', 'Q3']:
+            print(q, cache.get(cache.key(q)))
+        # Q2 is the least recently used entry
+        assert cache.get(cache.key('Q1')) == {'verdict' : 'True', 'reasons' : ['reason of Q1'], 'mappings' : {'1' : {'?a' : '?b'}}}
+        assert cache.get(cache.key('Q2')) is None
+        assert cache.get(cache.key('Q3'))['verdict'] == 'True'
+        cache.close()
+        same = VerdictCache(tmp, 'UQ1 UQ2')
+        print('same context, after closing:', same.get(same.key('Q3')))
+        assert same.get(same.key('Q3'))['verdict'] == 'True'
+        same.close()
+        other = VerdictCache(tmp, 'UQ1 UQ3')
+        print('other context:', other.get(other.key('Q1')))
+        assert other.get(other.key('Q1')) is None
+        other.close()
+
+    print('----------------------')
+    print('Test of sourceStamp():')
+    print('----------------------')
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'checks.py')
+        with open(source, 'w') as f:
+            f.write('x = 1\n')
+        stamp = sourceStamp([source])
+        print('source stamp:', stamp[:16])
+        assert sourceStamp([source]) == stamp
+        with open(source, 'w') as f:
+            f.write('x = 2\n')
+        assert sourceStamp([source]) != stamp
+        # a missing file changes the stamp instead of raising
+        missing = os.path.join(tmp, 'missing.py')
+        assert sourceStamp([source, missing]) != sourceStamp([source])